@@ -0,0 +1,94 @@
+"""
+Time-sliced enemy AI.
+
+Every enemy group is registered with a Behaviour. Each frame, enemies near
+the view run their full behaviour. Enemies further away think only every
+far_interval frames, staggered so they do not all think on the same frame,
+and in between coast along the velocity of their last decision.
+
+Thinking costs CPU time, coasting almost none. Once budget_ms of AI work
+has been spent in a frame, due far enemies coast as well and think on the
+next frame instead. Near enemies always think, as they can reach the
+player.
+"""
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import pygame
+import telemetry
+from camera import Camera
+
+# (enemy, player, delta_time)
+Think = Callable[[Any, Any, float], None]
+
+
+def coast(enemy: Any, delta_time: float) -> None:
+    """
+    Keep moving along the velocity set by the enemy's last decision.
+    """
+    enemy.world_position.x += enemy.velocity_x * delta_time
+    enemy.rect.center = enemy.world_position  # type: ignore
+
+
+class Behaviour(NamedTuple):
+    near: Think  # full update for an enemy near the view
+    far: Think  # cheaper decision for a distant enemy
+    coast: Callable[[Any, float], None] = coast
+
+
+class AIScheduler:
+    def __init__(self, camera: Camera, budget_ms: float = 2.0, far_interval: int = 4):
+        self.camera = camera
+        self.budget: float = budget_ms / 1000 if budget_ms > 0 else float("inf")
+        self.far_interval = max(1, far_interval)
+        self.groups: List[Tuple[pygame.sprite.AbstractGroup, Behaviour]] = []
+        # enemy -> frames since it last thought
+        self.waiting: Dict[pygame.sprite.Sprite, int] = {}
+        self.next_phase: int = 0
+        self.deferred: int = 0  # far thinks pushed back by the budget last frame
+
+    def register(self, group: pygame.sprite.AbstractGroup, behaviour: Behaviour) -> None:
+        self.groups.append((group, behaviour))
+
+    def reset(self) -> None:
+        self.waiting.clear()
+        self.next_phase = 0
+
+    def update(self, player: Any, delta_time: float) -> None:
+        start = time.perf_counter()
+        deadline = start + self.budget
+        is_near = self.camera.is_near
+        waiting = self.waiting
+        interval = self.far_interval
+        deferred = 0
+        seen = 0
+        for group, behaviour in self.groups:
+            # Thinking may kill the enemy, which changes the group
+            for enemy in group.sprites():
+                seen += 1
+                frames = waiting.get(enemy)
+                if frames is None:
+                    # Stagger first thoughts across the interval
+                    frames = self.next_phase % interval
+                    self.next_phase += 1
+                frames += 1
+                if is_near(enemy.rect):
+                    behaviour.near(enemy, player, delta_time)
+                    frames = 0
+                elif frames >= interval:
+                    if time.perf_counter() < deadline:
+                        behaviour.far(enemy, player, delta_time)
+                        frames = 0
+                    else:
+                        behaviour.coast(enemy, delta_time)
+                        deferred += 1
+                else:
+                    behaviour.coast(enemy, delta_time)
+                waiting[enemy] = frames
+
+        if len(waiting) > seen:
+            for enemy in [enemy for enemy in waiting if not enemy.alive()]:
+                del waiting[enemy]
+        self.deferred = deferred
+        if deferred:
+            telemetry.count("ai_deferred", deferred)
@@ -0,0 +1,128 @@
+"""
+Allocation profiler.
+
+Run the game with --profile-allocations to trace every frame. While a frame
+runs, each executed line is charged with the memory tracemalloc saw it
+allocate above the previous line, temporaries included (a snapshot diff
+would only show blocks that are still alive at the end of the frame).
+Every report_interval frames the call sites allocating the most per frame
+are logged. Tracing makes the game run many times slower.
+"""
+import logging
+import sys
+import tracemalloc
+from types import CodeType, FrameType
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger("tiny_titan.allocations")
+
+# Smaller charges are noise from the tracer itself; no Python object fits
+MIN_ALLOCATION: int = 16
+
+
+class AllocationSite(NamedTuple):
+    location: str  # file:line (function)
+    bytes_per_frame: float
+    frames: int  # frames in which the site allocated
+
+
+class AllocationProfiler:
+    def __init__(self, report_interval: int = 300, top: int = 15, nframe: int = 1):
+        self.report_interval = report_interval
+        self.top = top
+        self.nframe = nframe
+        # (code, line) -> [bytes, frames], summed since the last report
+        self.sites: Dict[Tuple[CodeType, int], List[int]] = {}
+        self.frame_sites: Dict[Tuple[CodeType, int], int] = {}
+        self.frame_bytes: List[int] = []
+        self.current_site: Optional[Tuple[CodeType, int]] = None
+        self.baseline: int = 0
+        self.frames: int = 0
+        # Bound once: returning a fresh bound method from the trace function
+        # on every line would itself show up as an allocation
+        self.tracer = self._trace
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframe)
+
+    def stop(self) -> None:
+        sys.settrace(None)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _trace(self, frame: FrameType, event: str, arg: Any):
+        current, peak = tracemalloc.get_traced_memory()
+        allocated = peak - self.baseline
+        if event == "call":
+            # Tracing makes CPython allocate a frame object for every call;
+            # it is not the calling line's doing
+            allocated -= sys.getsizeof(frame)
+        if self.current_site is not None and allocated >= MIN_ALLOCATION:
+            site = self.current_site
+            self.frame_sites[site] = self.frame_sites.get(site, 0) + allocated
+        if event == "return":
+            # The rest of the caller's line is charged to the caller
+            frame = frame.f_back  # type: ignore
+        if frame is None:
+            self.current_site = None
+        else:
+            self.current_site = (frame.f_code, frame.f_lineno)
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return self.tracer
+
+    def begin_frame(self) -> None:
+        self.frame_sites.clear()
+        self.current_site = None
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        sys.settrace(self.tracer)
+
+    def end_frame(self) -> None:
+        sys.settrace(None)
+        total = 0
+        for site, size in self.frame_sites.items():
+            totals = self.sites.get(site)
+            if totals is None:
+                totals = self.sites[site] = [0, 0]
+            totals[0] += size
+            totals[1] += 1
+            total += size
+        self.frame_bytes.append(total)
+        self.frames += 1
+        if self.frames >= self.report_interval:
+            self.log_report()
+
+    def report(self) -> List[AllocationSite]:
+        """
+        Return the call sites allocating the most per frame, largest first.
+        """
+        frames = max(self.frames, 1)
+        ranked = sorted(self.sites.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            AllocationSite(
+                f"{code.co_filename}:{line} ({code.co_name})", size / frames, hits
+            )
+            for (code, line), (size, hits) in ranked[: self.top]
+        ]
+
+    def log_report(self) -> None:
+        frames = max(self.frames, 1)
+        clean = sum(1 for size in self.frame_bytes if size == 0)
+        logger.info(
+            "Allocations over %d frames: %.0f bytes per frame, %d frames allocated nothing",
+            self.frames,
+            sum(self.frame_bytes) / frames,
+            clean,
+        )
+        for site in self.report():
+            logger.info(
+                "  %8.1f B/frame in %4d frames  %s",
+                site.bytes_per_frame,
+                site.frames,
+                site.location,
+            )
+        self.sites.clear()
+        self.frame_bytes.clear()
+        self.frames = 0
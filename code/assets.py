@@ -0,0 +1,218 @@
+"""
+Shared asset cache with memory accounting.
+
+Every asset is stored under a key whose first part, up to a "." or "/",
+names its owner, e.g. "player.frames" or "audio/hit.mp3". When an asset
+loads, its size is measured: the pixel bytes of every surface it holds,
+and the decoded sample bytes of every sound. Subsurfaces share their
+parent's pixels and count nothing, and so does anything already counted
+for another asset, e.g. the untinted frames inside a table of tinted
+variants. Reports group the sizes by owner and category (images or
+sounds).
+
+With a budget, every load and every state change (see state_manager.py)
+trims the cache: whole owners, least recently used first, whose assets
+nothing but the cache references any more are dropped until the total
+fits. A dropped asset is loaded again the next time it is asked for.
+"""
+import re
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Set, Tuple, TypeVar
+
+import pygame
+import telemetry
+
+T = TypeVar("T")
+
+MB: int = 1024 * 1024
+
+
+class AssetUsage(NamedTuple):
+    owner: str
+    category: str  # "images" or "sounds"
+    size: int  # bytes
+    assets: int
+
+
+class Entry:
+    def __init__(
+        self, value: Any, owner: str, category: str, size: int, counted: Set[int], used: int
+    ):
+        self.value = value
+        self.owner = owner
+        self.category = category
+        self.size = size
+        self.counted = counted  # ids of the surfaces and sounds in size
+        self.last_used = used
+
+
+def owner_of(key: str) -> str:
+    return re.split(r"[./]", key, 1)[0]
+
+
+def measure(value: Any, skip: Set[int]) -> Tuple[int, int, Set[int]]:
+    """
+    Bytes of surface pixels and of sound samples held by value, a surface,
+    a sound or nested dicts, lists and tuples of them, leaving out the
+    objects whose ids are in skip. Also returns the ids of those counted.
+    """
+    image_bytes = 0
+    sound_bytes = 0
+    seen: Set[int] = set()
+    counted: Set[int] = set()
+    pending = [value]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or id(item) in skip:
+            continue
+        seen.add(id(item))
+        if isinstance(item, pygame.Surface):
+            if item.get_parent() is None:
+                image_bytes += item.get_pitch() * item.get_height()
+                counted.add(id(item))
+        elif isinstance(item, pygame.mixer.Sound):
+            counted.add(id(item))
+            mixer = pygame.mixer.get_init()
+            if mixer is not None:
+                frequency, sample_format, channels = mixer
+                samples = round(item.get_length() * frequency)
+                sound_bytes += samples * channels * (abs(sample_format) // 8)
+        elif isinstance(item, dict):
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+    return image_bytes, sound_bytes, counted
+
+
+class AssetRegistry:
+    def __init__(self):
+        self.entries: Dict[str, Entry] = {}
+        # ids of every surface and sound counted by an entry
+        self.counted: Set[int] = set()
+        self.budget: int = 0  # bytes, 0 = no limit
+        self.clock: int = 0  # counts lookups, for least recently used
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def cached(self, key: str, loader: Callable[[], T]) -> T:
+        self.clock += 1
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry.last_used = self.clock
+            return entry.value
+        self.misses += 1
+        value = loader()
+        image_bytes, sound_bytes, counted = measure(value, self.counted)
+        self.counted |= counted
+        category = "sounds" if sound_bytes > image_bytes else "images"
+        self.entries[key] = Entry(
+            value, owner_of(key), category, image_bytes + sound_bytes, counted, self.clock
+        )
+        self.trim()
+        return value
+
+    def total(self) -> int:
+        return sum(entry.size for entry in self.entries.values())
+
+    def in_use(self, entry: Entry) -> bool:
+        # References from the entry and from getrefcount's argument
+        return sys.getrefcount(entry.value) > 2
+
+    def trim(self) -> int:
+        """
+        Drop unused owners until the total fits the budget. Returns the
+        bytes freed.
+        """
+        total = self.total()
+        if not self.budget or total <= self.budget:
+            return 0
+        owners: Dict[str, List[str]] = {}
+        for key, entry in self.entries.items():
+            owners.setdefault(entry.owner, []).append(key)
+        candidates = [
+            (max(self.entries[key].last_used for key in keys), owner, keys)
+            for owner, keys in owners.items()
+            if not any(self.in_use(self.entries[key]) for key in keys)
+        ]
+        freed = 0
+        for _, owner, keys in sorted(candidates):
+            if total - freed <= self.budget:
+                break
+            size = 0
+            for key in keys:
+                entry = self.entries.pop(key)
+                self.counted -= entry.counted
+                size += entry.size
+            freed += size
+            self.evictions += len(keys)
+            telemetry.event(
+                telemetry.INFO, "assets_evicted", owner=owner, kb=size // 1024
+            )
+        telemetry.gauge("asset_mb", round((total - freed) / MB, 1))
+        return freed
+
+    def report(self) -> List[AssetUsage]:
+        """
+        Loaded bytes by owner and category, largest first.
+        """
+        usage: Dict[Tuple[str, str], List[int]] = {}
+        for entry in self.entries.values():
+            row = usage.setdefault((entry.owner, entry.category), [0, 0])
+            row[0] += entry.size
+            row[1] += 1
+        return sorted(
+            (AssetUsage(owner, category, size, count)
+             for (owner, category), (size, count) in usage.items()),
+            key=lambda row: row.size,
+            reverse=True,
+        )
+
+    def log_report(self) -> None:
+        telemetry.event(
+            telemetry.INFO,
+            "asset_report",
+            total_kb=self.total() // 1024,
+            budget_kb=self.budget // 1024,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            **{
+                f"{row.owner}_{row.category}_kb": row.size // 1024
+                for row in self.report()
+            },
+        )
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.counted.clear()
+
+
+# Loaded surfaces, frame tables and sounds, shared by every scene and sprite.
+_registry = AssetRegistry()
+
+
+def get_registry() -> AssetRegistry:
+    return _registry
+
+
+def cached(key: str, loader: Callable[[], T]) -> T:
+    """
+    Return the asset stored under key, loading it with loader on first use
+    or after it was dropped. Cached assets are shared and must not be
+    modified by the caller.
+    """
+    return _registry.cached(key, loader)
+
+
+def set_budget(budget_mb: int) -> None:
+    _registry.budget = budget_mb * MB
+
+
+def trim() -> int:
+    return _registry.trim()
+
+
+def clear() -> None:
+    _registry.clear()
@@ -1,12 +1,31 @@
 import pygame
 import os
 import random
-from settings import GROUND_LEVEL
+from settings import GROUND_LEVEL, HIT_FLASH_MS
 from timer_counter import Timer
+from ai_scheduler import Behaviour, coast
 from player import Player
 from typing import Dict, List, Optional
-from utilities import RESOURCES_PATH, get_current_direction, extract_frames
+from utilities import (
+    RESOURCES_PATH,
+    SpriteSheet,
+    distance_squared,
+    get_current_action,
+    get_current_direction,
+    get_state,
+    load_sound,
+)
 from settings import EnemyStates
+import telemetry
+from assets import cached
+from tints import FLASH, NORMAL, list_variants
+
+
+def load_bird_frames() -> List[pygame.Surface]:
+    enemy_sprite_path = os.path.join(RESOURCES_PATH, "enemies", "bird.png")
+    enemy_sprite_sheet = pygame.image.load(enemy_sprite_path)
+    sheet = SpriteSheet(enemy_sprite_sheet, 68, 68, 3)
+    return sheet.clip(0, sheet.count)
 
 
 class Bird(pygame.sprite.Sprite):
@@ -18,10 +37,10 @@ class Bird(pygame.sprite.Sprite):
         speed: Optional[float] = None,
     ):
         super().__init__(group)
-        enemy_sprite_path = os.path.join(RESOURCES_PATH, "enemies", "bird.png")
-        enemy_sprite_sheet = pygame.image.load(enemy_sprite_path)
-        self.frames: List[pygame.Surface] = extract_frames(
-            enemy_sprite_sheet, 68, 68, 3
+        self.frames: List[pygame.Surface] = cached("bird.frames", load_bird_frames)
+        # Normal and white hit-flash frames, indexed by tints variant
+        self.frame_variants: List[List[pygame.Surface]] = cached(
+            "bird.frame_variants", lambda: list_variants(self.frames, (FLASH,))
         )
 
         self.channel = pygame.mixer.Channel(4)
@@ -36,6 +55,8 @@ class Bird(pygame.sprite.Sprite):
             else self.possible_speed[round(random.uniform(0, 3))]
         )
         self.world_position = pygame.math.Vector2(position)
+        # Horizontal speed chosen by the last steer(), in px/s
+        self.velocity_x: float = 0.0
         self.health: int = health
         self.timers = {
             "hit_timer": Timer(1300),
@@ -47,6 +68,9 @@ class Bird(pygame.sprite.Sprite):
         """
         Animate player player based on delta_time.
         """
+        hit_timer = self.timers["hit_timer"]
+        flashing = hit_timer.active and hit_timer.elapsed() < HIT_FLASH_MS
+        self.frames = self.frame_variants[FLASH if flashing else NORMAL]
         number_of_sprites = len(self.frames)
 
         # Accumulative fraction value
@@ -54,14 +78,27 @@ class Bird(pygame.sprite.Sprite):
         if self.current_frame > number_of_sprites:
             self.current_frame = 0
         try:
-            self.image = self.frames[int(self.current_frame)]
-            # Account for the differences in surface size
-            self.rect = self.image.get_rect(center=self.rect.center)
+            image = self.frames[int(self.current_frame)]
+            if image is not self.image:
+                # Account for the differences in surface size, resizing the
+                # rect around its center instead of building a new one
+                self.image = image
+                rect = self.rect
+                centerx, centery = rect.centerx, rect.centery
+                rect.size = image.get_size()
+                rect.centerx, rect.centery = centerx, centery
         except IndexError:
-            print(f"Frame missed: {
-                  self.current_frame}\nPlayer state: {self.state}")
+            telemetry.event(
+                telemetry.DEBUG,
+                "frame_missed",
+                sprite="bird",
+                state=self.state,
+                frame=self.current_frame,
+            )
         except KeyError:
-            print(f"Critical error. No frame found. Missing: {self.state}")
+            telemetry.event(
+                telemetry.ERROR, "frame_table_missing", sprite="bird", state=self.state
+            )
 
     def change_status(self) -> None:
         if not self.timers["hit_timer"].active:
@@ -70,48 +107,60 @@ class Bird(pygame.sprite.Sprite):
             self.state = "death_left"
         if self.health <= 0:
             direction = get_current_direction(self.state)
-            self.state = f"death_{direction}"
+            self.state = get_state("death", direction)
 
     def damage_player_if_close(self, player: Player):
-        distance = pygame.math.Vector2(
-            self.rect.center).distance_to(player.rect.center)
-        if distance < 40:
+        if distance_squared(self.rect, player.rect) < 40 * 40:
             if (
                 not self.timers["damage_timer"].active
                 and not self.timers["hit_timer"].active
             ):
                 player.health -= 5
+                telemetry.count("damage_taken", 5)
                 player.timers["shake_timer"].activate()
                 self.timers["damage_timer"].activate()
                 self.channel.set_volume(0.5)
-                self.channel.play(
-                    pygame.mixer.Sound(os.path.join(
-                        RESOURCES_PATH, "audio", "hurt.mp3"))
-                )
+                self.channel.play(load_sound("hurt.mp3"))
 
-    def take_damage(self, amount: int):
+    def take_damage(self, amount: int) -> bool:
+        """
+        Apply a hit. Returns True if the hit landed.
+        """
         if self.timers["death_timer"].active:
-            return
+            return False
         if not self.timers["hit_timer"].active:
             self.health -= amount
+            telemetry.event(
+                telemetry.DEBUG,
+                "enemy_hit",
+                enemy="bird",
+                damage=amount,
+                health=self.health,
+            )
             self.state = EnemyStates.HIT_RIGHT.value
             self.timers["hit_timer"].activate()
+            return True
+        return False
+
+    def steer(self, player_state: str) -> None:
+        speed_multiplier = 0.5 if get_current_direction(
+            player_state) == "left" else 1.0
+        self.velocity_x = -self.speed * speed_multiplier
 
     def position_calculator(
         self,
         delta_time: float,
         player_state: str,
     ):
-        speed_multiplier = 0.5 if get_current_direction(
-            player_state) == "left" else 1.0
-
-        # Move the enemy
-        self.world_position.x -= self.speed * delta_time * speed_multiplier
-        self.rect.center = self.world_position  # type: ignore
+        self.steer(player_state)
+        coast(self, delta_time)
 
     def die(self) -> None:
         self.kill()
-        pygame.event.post(pygame.event.Event(pygame.USEREVENT, {"points": 5}))
+        telemetry.count("kills")
+        pygame.event.post(
+            pygame.event.Event(pygame.USEREVENT, {"points": 5, "enemy": "bird"})
+        )
 
     def update_timer(self) -> None:
         for timer in self.timers.values():
@@ -123,5 +172,28 @@ class Bird(pygame.sprite.Sprite):
         self.change_status()
         self.update_timer()
 
-        if self.state.split("_")[0] == "death":
+        if get_current_action(self.state) == "death":
             self.die()
+
+    def update_far(self, player_state: str, delta_time: float):
+        """
+        Cheap update for a bird far outside the view: no animation.
+        """
+        self.position_calculator(delta_time, player_state)
+        self.change_status()
+        self.update_timer()
+
+        if get_current_action(self.state) == "death":
+            self.die()
+
+
+def think_near(bird: Bird, player: Player, delta_time: float) -> None:
+    bird.update(player.state, delta_time)
+    bird.damage_player_if_close(player)
+
+
+def think_far(bird: Bird, player: Player, delta_time: float) -> None:
+    bird.update_far(player.state, delta_time)
+
+
+BIRD_BEHAVIOUR = Behaviour(think_near, think_far)
@@ -20,7 +20,10 @@ class Button:
         self.hovering_color = hovering_color
         self.aa = antialias
         self.text_input = text_input
-        self.text = self.font.render(self.text_input, self.aa, self.base_color)
+        # Both colors are rendered once; hovering only swaps the surface
+        self.base_text = self.font.render(self.text_input, self.aa, self.base_color)
+        self.hover_text = self.font.render(self.text_input, self.aa, self.hovering_color)
+        self.text = self.base_text
         if self.image is None:
             self.rect = self.text.get_rect(center=(self.x_pos, self.y_pos))
         else:
@@ -33,14 +36,12 @@ class Button:
         screen.blit(self.text, self.text_rect)
 
     def check_input(self, position: tuple[int, int]):
-        isInVertical: bool = position[0] in range(self.rect.left, self.rect.right)
-        isInHorizontal: bool = position[1] in range(self.rect.top, self.rect.bottom)
-        return True if (isInVertical and isInHorizontal) else False
+        return self.rect.collidepoint(position)
 
     def changeColor(self, position: tuple[int, int]):
         if self.check_input(position):
-            self.text = self.font.render(self.text_input, self.aa, self.hovering_color)
+            self.text = self.hover_text
         else:
-            self.text = self.font.render(self.text_input, self.aa, self.base_color)
+            self.text = self.base_text
     
     
\ No newline at end of file
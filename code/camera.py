@@ -0,0 +1,89 @@
+import pygame
+from typing import Iterable, List, Optional, Tuple
+from settings import CULL_MARGIN, LOD_MARGIN, WINDOW_HEIGHT, WINDOW_WIDTH
+
+
+class Camera:
+    """
+    Owns the world-to-screen transform.
+
+    offset is the world position of the screen's top-left corner, and view
+    is the part of the world currently on screen. scroll is the horizontal
+    distance the camera has travelled, which drives the parallax layers.
+    The camera only ever scrolls forward, to the right.
+    """
+
+    def __init__(self, size: Tuple[int, int] = (WINDOW_WIDTH, WINDOW_HEIGHT)):
+        self.offset = pygame.math.Vector2()
+        self.view = pygame.Rect((0, 0), size)
+        self.scroll: float = 0
+        # Views grown by the cull and LOD margins, rebuilt when the camera moves
+        self.cull_rect = self.view.inflate(CULL_MARGIN * 2, CULL_MARGIN * 2)
+        self.lod_rect = self.view.inflate(LOD_MARGIN * 2, LOD_MARGIN * 2)
+        self.batch: List[Tuple[pygame.Surface, Tuple[int, int]]] = []
+
+    def move_to(self, x: float, y: float) -> None:
+        self.offset.update(x, y)
+        self.view.topleft = (round(x), round(y))
+        self.cull_rect.center = self.view.center
+        self.lod_rect.center = self.view.center
+
+    def follow(self, x: float, lead: float) -> None:
+        """
+        Scroll right so that world position x is at most lead px from the
+        left edge of the view.
+        """
+        left = x - lead
+        if left > self.offset.x:
+            self.move_to(left, self.offset.y)
+            self.scroll = left
+
+    def reset(self) -> None:
+        self.scroll = 0
+        self.move_to(0, 0)
+
+    def to_screen(self, position: Tuple[float, float]) -> Tuple[int, int]:
+        return (
+            round(position[0] - self.offset.x),
+            round(position[1] - self.offset.y),
+        )
+
+    def is_visible(self, rect: pygame.Rect) -> bool:
+        return self.cull_rect.colliderect(rect)
+
+    def is_near(self, rect: pygame.Rect) -> bool:
+        """
+        True if rect is on screen or close enough to deserve full updates.
+        """
+        return self.lod_rect.colliderect(rect)
+
+    def collect(
+        self,
+        sprites: Iterable[pygame.sprite.Sprite],
+        batch: Optional[List[Tuple[pygame.Surface, Tuple[int, int]]]] = None,
+    ) -> List[Tuple[pygame.Surface, Tuple[int, int]]]:
+        """
+        Append (image, screen position) for every visible sprite to batch,
+        a new list if None, and return it.
+        """
+        if batch is None:
+            batch = []
+        offset_x = round(self.offset.x)
+        offset_y = round(self.offset.y)
+        cull_rect = self.cull_rect
+        for sprite in sprites:
+            rect = sprite.rect
+            if cull_rect.colliderect(rect):
+                batch.append((sprite.image, (rect.x - offset_x, rect.y - offset_y)))
+        return batch
+
+    def draw(self, screen: pygame.Surface, sprites: Iterable[pygame.sprite.Sprite]) -> int:
+        """
+        Blit every visible sprite in one batch. Returns how many were drawn.
+        """
+        batch = self.batch
+        batch.clear()
+        self.collect(sprites, batch)
+        if batch:
+            screen.blits(batch, doreturn=False)
+        return len(batch)
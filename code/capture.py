@@ -0,0 +1,250 @@
+"""
+Screenshots and gameplay clips, encoded off the main thread.
+
+The game thread only copies the frame's pixels (well under a millisecond)
+and queues them. A worker thread compresses and writes them, using zlib,
+which releases the GIL, so encoding does not stall the game loop. If the
+worker falls behind, captured frames are dropped, never game frames.
+
+With clip_seconds > 0 every frame is recorded at CLIP_FPS into a rolling
+buffer of compressed frames, bounded by both clip_seconds and the memory
+budget. Saving a clip writes the buffer as a numbered PNG sequence.
+"""
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+import pygame
+import telemetry
+from config import get_config_path
+
+SCREENSHOT_KEY: int = pygame.K_F12
+CLIP_KEY: int = pygame.K_F11
+CLIP_FPS: int = 30
+# Fast levels: the buffer favours keeping up over size, files favour size
+BUFFER_COMPRESSION: int = 1
+PNG_COMPRESSION: int = 6
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class Frame(NamedTuple):
+    time: float  # perf_counter when captured
+    size: Tuple[int, int]
+    pitch: int  # bytes per row, including padding
+    offsets: Tuple[int, int, int]  # byte offset of R, G and B in a pixel
+    pixels: bytes  # 4 bytes per pixel, zlib-compressed in the clip buffer
+
+
+def get_capture_path() -> str:
+    return os.path.join(os.path.dirname(get_config_path()), "captures")
+
+
+def grab(surface: pygame.Surface) -> Frame:
+    """
+    Copy the pixels of surface. This is the only work done on the game thread.
+    """
+    if surface.get_bytesize() == 4:
+        pixels = surface.get_buffer().raw
+        # A channel's shift gives its byte offset within the pixel
+        r, g, b, _ = surface.get_shifts()
+        if sys.byteorder == "little":
+            offsets = (r // 8, g // 8, b // 8)
+        else:
+            offsets = (3 - r // 8, 3 - g // 8, 3 - b // 8)
+        pitch = surface.get_pitch()
+    else:
+        pixels = pygame.image.tobytes(surface, "RGBX")
+        offsets = (0, 1, 2)
+        pitch = surface.get_width() * 4
+    return Frame(time.perf_counter(), surface.get_size(), pitch, offsets, pixels)
+
+
+def background_priority() -> None:
+    """
+    Lower the priority of the calling thread. Encoding can wait; on Linux,
+    let the game thread win the CPU.
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except OSError:
+            pass
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data))
+    )
+
+
+def encode_png(frame: Frame, pixels: Optional[bytes] = None) -> bytes:
+    """
+    Encode frame as an 8-bit RGB PNG. pixels replaces frame.pixels, e.g.
+    with its decompressed copy.
+    """
+    width, height = frame.size
+    pixels = frame.pixels if pixels is None else pixels
+    row = width * 4
+    if frame.pitch != row:
+        pixels = b"".join(
+            pixels[y * frame.pitch : y * frame.pitch + row] for y in range(height)
+        )
+    rgb = bytearray(width * height * 3)
+    for channel, offset in enumerate(frame.offsets):
+        rgb[channel::3] = pixels[offset::4]
+    stride = width * 3
+    # Every scanline starts with its filter type, 0 (none)
+    scanlines = b"".join(
+        b"\0" + rgb[y * stride : (y + 1) * stride] for y in range(height)
+    )
+    return (
+        PNG_SIGNATURE
+        + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + _chunk(b"IDAT", zlib.compress(scanlines, PNG_COMPRESSION))
+        + _chunk(b"IEND", b"")
+    )
+
+
+class FrameCapture:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        clip_seconds: float = 0,
+        budget_mb: int = 64,
+        queue_size: int = 4,
+    ):
+        self.directory = directory or get_capture_path()
+        self.clip_seconds = clip_seconds
+        self.budget: int = budget_mb * 1024 * 1024
+        self.interval: float = 1 / CLIP_FPS
+        self.next_record: float = 0.0
+        # Frames with compressed pixels, oldest first; worker thread only
+        self.clip: Deque[Frame] = deque()
+        self.clip_bytes: int = 0
+        # (job, frame): "record", "screenshot" or "clip"; None stops the worker
+        self.jobs: "queue.Queue[Optional[Tuple[str, Optional[Frame]]]]" = queue.Queue(
+            queue_size
+        )
+        self.thread: Optional[threading.Thread] = None
+        self.dropped: int = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.clip_seconds > 0
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Finish the queued work, e.g. a screenshot taken just before quitting.
+        """
+        if self.thread is None:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def _submit(self, job: str, frame: Optional[Frame]) -> bool:
+        if self.thread is None:
+            self.start()
+        try:
+            self.jobs.put_nowait((job, frame))
+        except queue.Full:
+            self.dropped += 1
+            telemetry.count("capture_dropped")
+            return False
+        return True
+
+    def on_frame(self, surface: pygame.Surface) -> None:
+        """
+        Call once per presented frame to feed the rolling clip buffer.
+        """
+        if not self.recording:
+            return
+        now = time.perf_counter()
+        if now < self.next_record:
+            return
+        self.next_record = max(self.next_record + self.interval, now)
+        self._submit("record", grab(surface))
+
+    def screenshot(self, surface: pygame.Surface) -> bool:
+        return self._submit("screenshot", grab(surface))
+
+    def save_clip(self) -> bool:
+        if not self.recording:
+            return False
+        return self._submit("clip", None)
+
+    def _run(self) -> None:
+        background_priority()
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job, frame = item
+            try:
+                if job == "record":
+                    self._record(frame)  # type: ignore
+                elif job == "screenshot":
+                    self._save_screenshot(frame)  # type: ignore
+                else:
+                    self._save_clip()
+            except OSError as error:
+                telemetry.event(telemetry.ERROR, "capture_failed", job=job, error=str(error))
+
+    def _record(self, frame: Frame) -> None:
+        compressed = frame._replace(
+            pixels=zlib.compress(frame.pixels, BUFFER_COMPRESSION)
+        )
+        clip = self.clip
+        clip.append(compressed)
+        self.clip_bytes += len(compressed.pixels)
+        oldest = frame.time - self.clip_seconds
+        while clip and (self.clip_bytes > self.budget or clip[0].time < oldest):
+            self.clip_bytes -= len(clip.popleft().pixels)
+
+    def _save_screenshot(self, frame: Frame) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        milliseconds = int(time.time() * 1000) % 1000
+        path = os.path.join(
+            self.directory,
+            f"screenshot-{time.strftime('%Y%m%d-%H%M%S')}-{milliseconds:03d}.png",
+        )
+        with open(path, "wb") as file:
+            file.write(encode_png(frame))
+        telemetry.event(telemetry.INFO, "screenshot_saved", path=path)
+
+    def _save_clip(self) -> None:
+        frames: List[Frame] = list(self.clip)
+        if not frames:
+            return
+        directory = os.path.join(
+            self.directory, time.strftime("clip-%Y%m%d-%H%M%S")
+        )
+        os.makedirs(directory, exist_ok=True)
+        start = frames[0].time
+        timestamps: List[str] = []
+        for index, frame in enumerate(frames):
+            png = encode_png(frame, zlib.decompress(frame.pixels))
+            with open(os.path.join(directory, f"frame-{index:05d}.png"), "wb") as file:
+                file.write(png)
+            timestamps.append(f"{(frame.time - start) * 1000:.1f}")
+        # Capture times in ms, to spot hitches between frames
+        with open(os.path.join(directory, "timestamps.txt"), "w") as file:
+            file.write("\n".join(timestamps) + "\n")
+        telemetry.event(
+            telemetry.INFO, "clip_saved", path=directory, frames=len(frames)
+        )
@@ -0,0 +1,278 @@
+"""
+Runtime performance presets.
+
+Settings are resolved once at startup from, in increasing priority:
+the built-in preset, the user config file and command-line overrides.
+The result is an immutable RuntimeConfig returned by get_config().
+
+User file (tiny_titan.json next to the game, or --config PATH):
+
+    {
+        "preset": "potato",
+        "presets": {"kiosk": {"base": "balanced", "max_enemies": 6}},
+        "overrides": {"frame_cap": 50}
+    }
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from settings import MAX_FRAME_RATE
+from utilities import BASE_GAME_PATH
+
+CONFIG_FILE_NAME = "tiny_titan.json"
+DEFAULT_PRESET = "balanced"
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class RuntimeConfig(NamedTuple):
+    preset: str
+    frame_cap: int  # 0 = uncapped
+    frame_pacing: str  # sleep, hybrid or vsync
+    hitch_ms: int  # frames longer than this are reported as hitches
+    vsync: bool
+    render_scale: float  # window size relative to the 1366x768 frame
+    parallax_layers: int  # 2 = sky and ground only, 4 = every layer
+    max_enemies: int
+    max_birds: int
+    spawn_interval: int  # ms
+    audio_voices: int  # mixer channels, the first 5 are reserved by the game
+    effect_budget: int  # live particles
+    ai_budget_ms: float  # enemy AI time per frame before far enemies wait, 0 = no limit
+    ai_far_interval: int  # frames between decisions of enemies far from the view
+    rewind_seconds: int  # 0 disables rewind
+    tint_effects: bool  # hit-flash and damage tints, about 25 MB of frames
+    clip_seconds: int  # gameplay kept for F11 clips, 0 disables recording
+    capture_budget_mb: int  # memory for the clip buffer
+    pipelined: bool  # simulate on a worker thread, one frame ahead of drawing
+    spectator_port: int  # local port streaming the game to viewers, 0 = off
+    asset_budget_mb: int  # loaded images and sounds before unused ones are dropped, 0 = no limit
+
+
+# Allowed type and inclusive range of every setting
+FIELDS: Dict[str, tuple] = {
+    "frame_cap": (int, 0, 1000),
+    "frame_pacing": (str, ("sleep", "hybrid", "vsync"), None),
+    "hitch_ms": (int, 1, 1000),
+    "vsync": (bool, None, None),
+    "render_scale": (float, 0.25, 4.0),
+    "parallax_layers": (int, 2, 4),
+    "max_enemies": (int, 0, 64),
+    "max_birds": (int, 0, 32),
+    "spawn_interval": (int, 250, 60000),
+    "audio_voices": (int, 5, 64),
+    "effect_budget": (int, 0, 65535),
+    "ai_budget_ms": (float, 0.0, 100.0),
+    "ai_far_interval": (int, 1, 60),
+    "rewind_seconds": (int, 0, 60),
+    "tint_effects": (bool, None, None),
+    "clip_seconds": (int, 0, 120),
+    "capture_budget_mb": (int, 8, 4096),
+    "pipelined": (bool, None, None),
+    "spectator_port": (int, 0, 65535),
+    "asset_budget_mb": (int, 0, 4096),
+}
+
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "potato": {
+        "frame_cap": 30,
+        "frame_pacing": "sleep",
+        "hitch_ms": 50,
+        "vsync": False,
+        "render_scale": 1.0,
+        "parallax_layers": 2,
+        "max_enemies": 3,
+        "max_birds": 1,
+        "spawn_interval": 5000,
+        "audio_voices": 5,
+        "effect_budget": 128,
+        "ai_budget_ms": 1.0,
+        "ai_far_interval": 6,
+        "rewind_seconds": 0,
+        "tint_effects": False,
+        "clip_seconds": 0,
+        "capture_budget_mb": 32,
+        "pipelined": False,
+        "spectator_port": 0,
+        "asset_budget_mb": 64,
+    },
+    "balanced": {
+        "frame_cap": MAX_FRAME_RATE,
+        "frame_pacing": "hybrid",
+        "hitch_ms": 25,
+        "vsync": False,
+        "render_scale": 1.0,
+        "parallax_layers": 4,
+        "max_enemies": 4,
+        "max_birds": 2,
+        "spawn_interval": 4000,
+        "audio_voices": 8,
+        "effect_budget": 512,
+        "ai_budget_ms": 2.0,
+        "ai_far_interval": 4,
+        "rewind_seconds": 5,
+        "tint_effects": True,
+        "clip_seconds": 0,
+        "capture_budget_mb": 64,
+        "pipelined": False,
+        "spectator_port": 0,
+        "asset_budget_mb": 128,
+    },
+    "high": {
+        "frame_cap": 0,
+        "frame_pacing": "vsync",
+        "hitch_ms": 20,
+        "vsync": True,
+        "render_scale": 1.0,
+        "parallax_layers": 4,
+        "max_enemies": 6,
+        "max_birds": 3,
+        "spawn_interval": 3000,
+        "audio_voices": 16,
+        "effect_budget": 2048,
+        "ai_budget_ms": 4.0,
+        "ai_far_interval": 2,
+        "rewind_seconds": 10,
+        "tint_effects": True,
+        "clip_seconds": 0,
+        "capture_budget_mb": 256,
+        "pipelined": False,
+        "spectator_port": 0,
+        "asset_budget_mb": 0,
+    },
+}
+
+
+def get_config_path() -> str:
+    if getattr(sys, "frozen", False):
+        return os.path.join(os.path.dirname(sys.executable), CONFIG_FILE_NAME)
+    return os.path.join(BASE_GAME_PATH, CONFIG_FILE_NAME)
+
+
+def _coerce(key: str, value: Any) -> Any:
+    if key not in FIELDS:
+        raise ConfigError(f"Unknown setting '{key}'. Known: {', '.join(FIELDS)}")
+    kind, low, high = FIELDS[key]
+    if kind is bool:
+        if isinstance(value, str):
+            if value.lower() not in ("1", "0", "true", "false", "yes", "no", "on", "off"):
+                raise ConfigError(f"'{key}' expects a boolean, got '{value}'")
+            return value.lower() in ("1", "true", "yes", "on")
+        if not isinstance(value, (bool, int)):
+            raise ConfigError(f"'{key}' expects a boolean, got {value!r}")
+        return bool(value)
+    if kind is str:
+        if value not in low:
+            raise ConfigError(f"'{key}' must be one of {', '.join(low)}, got {value!r}")
+        return value
+    try:
+        converted = kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"'{key}' expects {kind.__name__}, got {value!r}") from None
+    if isinstance(value, bool) or (kind is int and isinstance(value, float) and not value.is_integer()):
+        raise ConfigError(f"'{key}' expects {kind.__name__}, got {value!r}")
+    if not low <= converted <= high:
+        raise ConfigError(f"'{key}' must be between {low} and {high}, got {converted}")
+    return converted
+
+
+def _resolve_preset(name: str, presets: Dict[str, Dict[str, Any]], seen: tuple = ()) -> Dict[str, Any]:
+    if name not in presets:
+        raise ConfigError(f"Unknown preset '{name}'. Known: {', '.join(presets)}")
+    if name in seen:
+        raise ConfigError(f"Preset '{name}' inherits from itself")
+    values = dict(presets[name])
+    base = values.pop("base", None)
+    if base is None:
+        resolved = dict(PRESETS[DEFAULT_PRESET]) if name not in PRESETS else {}
+    else:
+        resolved = _resolve_preset(base, presets, seen + (name,))
+    resolved.update(values)
+    return resolved
+
+
+def resolve(
+    preset: Optional[str] = None,
+    user_data: Optional[Dict[str, Any]] = None,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> RuntimeConfig:
+    """
+    Merge preset, user file data and overrides into a validated config.
+    """
+    user_data = user_data or {}
+    unknown = set(user_data) - {"preset", "presets", "overrides"}
+    if unknown:
+        raise ConfigError(f"Unknown config file keys: {', '.join(sorted(unknown))}")
+
+    presets: Dict[str, Dict[str, Any]] = {name: dict(values) for name, values in PRESETS.items()}
+    for name, values in user_data.get("presets", {}).items():
+        if name in presets:
+            presets[name].update(values)
+        else:
+            presets[name] = dict(values)
+
+    name = preset or user_data.get("preset") or DEFAULT_PRESET
+    values = _resolve_preset(name, presets)
+    values.update(user_data.get("overrides", {}))
+    values.update(overrides or {})
+    for key in values:
+        if key not in FIELDS:
+            raise ConfigError(f"Unknown setting '{key}'. Known: {', '.join(FIELDS)}")
+    config = RuntimeConfig(
+        preset=name,
+        **{key: _coerce(key, values[key]) for key in FIELDS},
+    )
+    if config.frame_pacing == "vsync" and not config.vsync:
+        # Nothing would wait for the display, and frame_cap would be ignored
+        raise ConfigError("'frame_pacing' vsync requires 'vsync' to be true")
+    return config
+
+
+def load(argv: Optional[List[str]] = None) -> RuntimeConfig:
+    """
+    Parse the command line and config file and activate the result.
+    Unrecognised arguments are left for other parsers.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--preset")
+    parser.add_argument("--config", dest="config_path")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE")
+    args, _ = parser.parse_known_args(argv)
+
+    path = args.config_path or get_config_path()
+    user_data: Dict[str, Any] = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as file:
+                user_data = json.load(file)
+        except json.JSONDecodeError as error:
+            raise ConfigError(f"{path}: {error}") from None
+    elif args.config_path:
+        raise ConfigError(f"Config file not found: {path}")
+
+    overrides: Dict[str, Any] = {}
+    for item in args.set:
+        key, separator, value = item.partition("=")
+        if not separator:
+            raise ConfigError(f"--set expects KEY=VALUE, got '{item}'")
+        overrides[key.strip()] = value.strip()
+
+    activate(resolve(args.preset, user_data, overrides))
+    return _active
+
+
+def activate(config: RuntimeConfig) -> None:
+    global _active
+    _active = config
+
+
+def get_config() -> RuntimeConfig:
+    return _active
+
+
+_active: RuntimeConfig = resolve()
@@ -0,0 +1,160 @@
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import pygame
+from settings import ATTACK_BUFFER_WINDOW, Actions
+
+DEFAULT_KEY_BINDINGS: Dict[int, str] = {
+    pygame.K_LEFT: Actions.MOVE_LEFT.value,
+    pygame.K_RIGHT: Actions.MOVE_RIGHT.value,
+    pygame.K_SPACE: Actions.JUMP.value,
+    pygame.K_f: Actions.ATTACK.value,
+    pygame.K_r: Actions.WEAPON.value,
+    pygame.K_1: Actions.TOOL_1.value,
+    pygame.K_2: Actions.TOOL_2.value,
+    pygame.K_3: Actions.TOOL_3.value,
+    pygame.K_F3: Actions.DEBUG.value,
+    pygame.K_BACKSPACE: Actions.REWIND.value,
+    pygame.K_F5: Actions.RETRY.value,
+}
+
+
+class InputEvent(NamedTuple):
+    action: str
+    pressed: bool
+    timestamp: float  # seconds, from InputHandler.clock
+
+
+class InputHandler:
+    """
+    Buffers key events as timestamped actions.
+
+    Events are fed in once per frame with process_events() before the
+    simulation runs, so a key tapped for less than a frame is still seen
+    as a press, and a movement key released in the same frame is still
+    held for that frame. After the frame is on screen, mark_presented()
+    records the input-to-present latency of every press consumed during
+    that frame.
+
+    Presses are stamped with the time their frame took them off the event
+    queue (see StateManager.events_time): pygame events carry no time of
+    their own, so the latency leaves out the wait in the queue, at most
+    one frame.
+    """
+
+    def __init__(
+        self,
+        bindings: Optional[Dict[int, str]] = None,
+        buffer_window: int = ATTACK_BUFFER_WINDOW,
+        history: int = 120,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.bindings: Dict[int, str] = (
+            dict(bindings) if bindings is not None else dict(DEFAULT_KEY_BINDINGS)
+        )
+        self.clock: Callable[[], float] = clock
+        self.buffer_window: float = buffer_window / 1000
+        self.held: Set[str] = set()
+        # Pressed and released within one batch; held until end_frame()
+        self.tapped: Set[str] = set()
+        self.presses: List[InputEvent] = []
+        self.consumed_timestamps: List[float] = []
+        self.latencies: Deque[float] = deque(maxlen=history)
+
+    def process_events(
+        self, events: Iterable[pygame.event.Event], timestamp: Optional[float] = None
+    ) -> None:
+        """
+        Feed one frame's events, dequeued at timestamp (default: now).
+        """
+        now = self.clock() if timestamp is None else timestamp
+        pressed: Set[str] = set()
+        for event in events:
+            if event.type != pygame.KEYDOWN and event.type != pygame.KEYUP:
+                continue
+            action = self.bindings.get(event.key)
+            if action is None:
+                continue
+            if event.type == pygame.KEYDOWN:
+                self.held.add(action)
+                pressed.add(action)
+                self.presses.append(InputEvent(action, True, now))
+            else:
+                self.held.discard(action)
+                if action in pressed:
+                    self.tapped.add(action)
+
+    def press(self, action: str) -> None:
+        """
+        Inject a press without a keyboard, e.g. from a bot.
+        """
+        self.presses.append(InputEvent(action, True, self.clock()))
+
+    def hold(self, action: str, held: bool = True) -> None:
+        if held:
+            self.held.add(action)
+        else:
+            self.held.discard(action)
+
+    def is_held(self, action: str) -> bool:
+        return action in self.held or action in self.tapped
+
+    def consume(self, action: str, window: Optional[float] = None) -> bool:
+        """
+        Take the oldest buffered press of action that is still inside the
+        buffer window. Returns False if there is none.
+        """
+        if not self.presses:
+            return False
+        window = self.buffer_window if window is None else window
+        now = self.clock()
+        for index, event in enumerate(self.presses):
+            if event.action == action and now - event.timestamp <= window:
+                del self.presses[index]
+                self.consumed_timestamps.append(event.timestamp)
+                return True
+        return False
+
+    def end_frame(self) -> None:
+        """
+        Drop presses that were not consumed within the buffer window.
+        """
+        if self.tapped:
+            self.tapped.clear()
+        if not self.presses:
+            return
+        oldest_allowed = self.clock() - self.buffer_window
+        self.presses = [
+            event for event in self.presses if event.timestamp >= oldest_allowed
+        ]
+
+    def mark_presented(self) -> None:
+        """
+        Call right after the frame has been flipped to the display.
+        """
+        if not self.consumed_timestamps:
+            return
+        now = self.clock()
+        for timestamp in self.consumed_timestamps:
+            self.latencies.append((now - timestamp) * 1000)
+        self.consumed_timestamps.clear()
+
+    def latency_ms(self) -> tuple[float, float, float]:
+        """
+        Return the (last, average, worst) input-to-present latency in
+        milliseconds over the recent history.
+        """
+        if not self.latencies:
+            return 0.0, 0.0, 0.0
+        return (
+            self.latencies[-1],
+            sum(self.latencies) / len(self.latencies),
+            max(self.latencies),
+        )
+
+    def reset(self) -> None:
+        self.held.clear()
+        self.tapped.clear()
+        self.presses.clear()
+        self.consumed_timestamps.clear()
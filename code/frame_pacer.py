@@ -0,0 +1,236 @@
+import time
+from array import array
+from collections import deque
+from typing import Deque, Dict, NamedTuple, Optional
+
+import telemetry
+from settings import MAX_DELTA_TIME
+
+STRATEGIES = ("sleep", "hybrid", "vsync")
+# The hybrid strategy sleeps until this many seconds before the deadline
+# and busy-waits the rest, which avoids the OS oversleeping the frame.
+SPIN_MARGIN: float = 0.002
+STATS_LOG_INTERVAL: float = 10.0
+
+
+class Hitch(NamedTuple):
+    frame: int
+    frame_ms: float
+    subsystem: str
+    subsystem_ms: float
+
+
+class _Section:
+    """
+    Reusable context manager that adds its elapsed time to a subsystem.
+    Time spent in a nested section is only counted for the inner one.
+    """
+
+    __slots__ = ("pacer", "name", "start", "parent")
+
+    def __init__(self, pacer: "FramePacer", name: str):
+        self.pacer = pacer
+        self.name = name
+        self.start = 0.0
+        self.parent: Optional[str] = None
+
+    def __enter__(self) -> "_Section":
+        self.parent = self.pacer.active
+        self.pacer.active = self.name
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.pacer.active = self.parent
+        self.pacer.add_time(self.name, elapsed)
+
+
+class FramePacer:
+    """
+    Waits for the next frame, and turns raw frame times into a steady dt.
+
+    Strategies:
+    - sleep: sleep until the frame deadline.
+    - hybrid: sleep until shortly before the deadline, then spin.
+    - vsync: do not wait; the display flip already blocks.
+
+    While throttled (see throttle()) frames are spaced by sleeping, whatever
+    the strategy, and left out of the statistics.
+
+    The returned dt is clamped to MAX_DELTA_TIME and smoothed, so a single
+    long frame does not throw entities across the screen. Frames longer
+    than hitch_ms are recorded as hitches together with the subsystem
+    (see measure()) that took the most time in that frame.
+    """
+
+    def __init__(
+        self,
+        frame_cap: int,
+        strategy: str = "hybrid",
+        hitch_ms: float = 33.0,
+        smoothing: float = 0.25,
+        max_delta: float = MAX_DELTA_TIME,
+        history: int = 600,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown frame pacing strategy '{strategy}'")
+        self.strategy = strategy
+        self.period: float = 1 / frame_cap if frame_cap > 0 else 0.0
+        self.hitch_ms = hitch_ms
+        self.smoothing = smoothing
+        self.max_delta = max_delta
+        self.frame_times = array("f", bytes(4 * history))
+        self.frame_count: int = 0
+        self.hitches: Deque[Hitch] = deque(maxlen=64)
+        self.sections: Dict[str, float] = {}
+        self.last_sections: Dict[str, float] = {}
+        self._section_cache: Dict[str, _Section] = {}
+        self.active: Optional[str] = None  # innermost running section
+        self.raw_delta: float = 0.0
+        self.delta_time: float = self.period or 1 / 60
+        self.last_time: Optional[float] = None
+        self.deadline: float = 0.0
+        self.throttle_period: float = 0.0
+        self.last_log: float = time.perf_counter()
+
+    def measure(self, subsystem: str) -> _Section:
+        """
+        with pacer.measure("update"): ...
+        """
+        section = self._section_cache.get(subsystem)
+        if section is None:
+            section = self._section_cache[subsystem] = _Section(self, subsystem)
+        return section
+
+    def add_time(self, subsystem: str, seconds: float) -> None:
+        """
+        Charge time to a subsystem in the current frame, e.g. from a
+        callback. The time is taken out of the enclosing section.
+        """
+        sections = self.sections
+        sections[subsystem] = sections.get(subsystem, 0.0) + seconds
+        if self.active is not None:
+            sections[self.active] = sections.get(self.active, 0.0) - seconds
+
+    def throttle(self, frame_rate: int) -> None:
+        """
+        Cap frames at frame_rate, e.g. while the window is in the
+        background; 0 restores normal pacing.
+        """
+        period = 1 / frame_rate if frame_rate > 0 else 0.0
+        if period != self.throttle_period:
+            self.throttle_period = period
+            # Neither the throttled frame nor the next normal one is a hitch
+            self.last_time = None
+
+    def _wait(self) -> None:
+        # A minimized window may not block on vsync, so throttling sleeps
+        period = self.throttle_period or self.period
+        strategy = "sleep" if self.throttle_period else self.strategy
+        if strategy == "vsync" or period == 0:
+            return
+        now = time.perf_counter()
+        if self.deadline < now - period:
+            # Fell more than a frame behind; do not try to catch up
+            self.deadline = now
+        remaining = self.deadline - now
+        if strategy == "sleep":
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            if remaining > SPIN_MARGIN:
+                time.sleep(remaining - SPIN_MARGIN)
+            while time.perf_counter() < self.deadline:
+                pass
+        self.deadline += period
+
+    def tick(self) -> float:
+        """
+        Wait for the next frame and return the delta time in seconds.
+        """
+        self._wait()
+        now = time.perf_counter()
+        if self.last_time is None:
+            self.last_time = now
+            self.deadline = now + (self.throttle_period or self.period)
+            self._clear_sections(self.sections)
+            return self.delta_time
+        self.raw_delta = now - self.last_time
+        self.last_time = now
+        frame_ms = self.raw_delta * 1000
+        if self.throttle_period:
+            self._clear_sections(self.sections)
+            self.delta_time = min(self.raw_delta, self.max_delta)
+            return self.delta_time
+
+        self.frame_times[self.frame_count % len(self.frame_times)] = frame_ms
+        telemetry.gauge("frame_ms", frame_ms)
+        self.frame_count += 1
+        if frame_ms > self.hitch_ms:
+            self._record_hitch(frame_ms)
+        self.last_sections, self.sections = self.sections, self.last_sections
+        self._clear_sections(self.sections)
+
+        clamped = min(self.raw_delta, self.max_delta)
+        self.delta_time += (clamped - self.delta_time) * self.smoothing
+        if now - self.last_log >= STATS_LOG_INTERVAL:
+            self.last_log = now
+            self.log_stats()
+        return self.delta_time
+
+    @staticmethod
+    def _clear_sections(sections: Dict[str, float]) -> None:
+        # Zeroed rather than cleared, so the dict is not rebuilt every frame
+        for name in sections:
+            sections[name] = 0.0
+
+    def _record_hitch(self, frame_ms: float) -> None:
+        subsystem, subsystem_ms = "unknown", 0.0
+        if self.sections:
+            slowest = max(self.sections, key=self.sections.__getitem__)
+            if self.sections[slowest] > 0:
+                subsystem, subsystem_ms = slowest, self.sections[slowest] * 1000
+        hitch = Hitch(self.frame_count, frame_ms, subsystem, subsystem_ms)
+        self.hitches.append(hitch)
+        telemetry.count("hitches")
+        telemetry.event(
+            telemetry.WARNING,
+            "frame_hitch",
+            frame=hitch.frame,
+            frame_ms=round(frame_ms, 1),
+            subsystem=subsystem,
+            subsystem_ms=round(subsystem_ms, 1),
+        )
+
+    def percentiles(self) -> Dict[str, float]:
+        """
+        Return p50/p95/p99/max frame times in ms and the average fps over
+        the recorded history.
+        """
+        count = min(self.frame_count, len(self.frame_times))
+        if count == 0:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "fps": 0.0}
+        samples = sorted(self.frame_times[:count])
+        total = sum(samples)
+        return {
+            "p50": samples[int(0.50 * (count - 1))],
+            "p95": samples[int(0.95 * (count - 1))],
+            "p99": samples[int(0.99 * (count - 1))],
+            "max": samples[-1],
+            "fps": 1000 * count / total if total else 0.0,
+        }
+
+    def log_stats(self) -> None:
+        if not telemetry.get_telemetry().running:
+            return
+        stats = {key: round(value, 2) for key, value in self.percentiles().items()}
+        telemetry.gauge("frame_ms_p95", stats["p95"])
+        telemetry.gauge("fps", stats["fps"])
+        telemetry.event(
+            telemetry.INFO, "frame_stats", hitches=len(self.hitches), **stats
+        )
+
+    def reset_stats(self) -> None:
+        self.frame_count = 0
+        self.hitches.clear()
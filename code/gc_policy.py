@@ -0,0 +1,128 @@
+"""
+Garbage collector policy.
+
+Full (generation 2) collections walk every tracked object and can stall a
+frame for several milliseconds. The policy moves them to moments the
+player does not notice:
+
+- after assets load, and on every menu or game-over screen, a full
+  collection runs and the survivors are frozen (gc.freeze), so later
+  collections no longer walk the loaded assets;
+- during a round, thresholds are raised so that only the young
+  generations are collected.
+
+Every collection is timed through gc.callbacks and charged to the "gc"
+subsystem of the frame pacer, so hitches caused by the collector are
+reported as such. Collections triggered by other threads, such as the
+pipelined simulation worker, are counted but not charged to the frame.
+"""
+import gc
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import telemetry
+from frame_pacer import FramePacer
+
+# Fewer young collections, and no full ones, while a round is running
+GAMEPLAY_THRESHOLDS: Tuple[int, int, int] = (2000, 25, 1_000_000)
+# Telemetry counter of each generation
+COUNTERS: Tuple[str, str, str] = ("gc_gen0", "gc_gen1", "gc_gen2")
+
+
+class GCPolicy:
+    def __init__(self):
+        self.pacer: Optional[FramePacer] = None
+        self.default_thresholds: Tuple[int, int, int] = gc.get_threshold()
+        self.start: float = 0.0
+        # generation -> [collections, total seconds, longest seconds]
+        self.pauses: Dict[int, List[float]] = {
+            generation: [0, 0.0, 0.0] for generation in range(3)
+        }
+        # [collections, total seconds, longest seconds] of every generation
+        # since the round started
+        self.round_pauses: List[float] = [0, 0.0, 0.0]
+        self.installed: bool = False
+
+    def install(self, pacer: Optional[FramePacer] = None) -> None:
+        self.pacer = pacer
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+
+    def uninstall(self) -> None:
+        if self.installed:
+            gc.callbacks.remove(self._callback)
+            self.installed = False
+        gc.set_threshold(*self.default_thresholds)
+
+    def _callback(self, phase: str, info: Dict[str, int]) -> None:
+        if phase == "start":
+            self.start = time.perf_counter()
+            return
+        elapsed = time.perf_counter() - self.start
+        generation = info["generation"]
+        pauses = self.pauses[generation]
+        pauses[0] += 1
+        pauses[1] += elapsed
+        if elapsed > pauses[2]:
+            pauses[2] = elapsed
+        round_pauses = self.round_pauses
+        round_pauses[0] += 1
+        round_pauses[1] += elapsed
+        if elapsed > round_pauses[2]:
+            round_pauses[2] = elapsed
+        # The pacer's sections belong to the main thread
+        if self.pacer is not None and threading.current_thread() is threading.main_thread():
+            self.pacer.add_time("gc", elapsed)
+        telemetry.count(COUNTERS[generation])
+        if generation == 2:
+            telemetry.event(
+                telemetry.DEBUG,
+                "gc_full",
+                pause_ms=round(elapsed * 1000, 2),
+                collected=info["collected"],
+            )
+
+    def settle(self) -> None:
+        """
+        Collect everything now and freeze what survives. Call while nothing
+        is animating, e.g. after loading or on a menu.
+        """
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+    def idle(self) -> None:
+        gc.set_threshold(*self.default_thresholds)
+        self.settle()
+
+    def gameplay(self) -> None:
+        gc.set_threshold(*GAMEPLAY_THRESHOLDS)
+        self.round_pauses = [0, 0.0, 0.0]
+
+    def longest_pause_ms(self, generation: int) -> float:
+        return self.pauses[generation][2] * 1000
+
+
+_policy = GCPolicy()
+
+
+def get_policy() -> GCPolicy:
+    return _policy
+
+
+def install(pacer: Optional[FramePacer] = None) -> None:
+    _policy.install(pacer)
+
+
+def settle() -> None:
+    _policy.settle()
+
+
+def idle() -> None:
+    _policy.idle()
+
+
+def gameplay() -> None:
+    _policy.gameplay()
@@ -1,23 +1,79 @@
+import argparse
+import logging
 import pygame
 import os
-from settings import WINDOW_WIDTH, WINDOW_HEIGHT
+import sys
+import round_metrics
+import telemetry
+from alloc_profiler import AllocationProfiler
+from config import ConfigError, load as load_config
+from settings import RESERVED_CHANNELS
+from spectator import watch
 from ui import main_menu
-from utilities import RESOURCES_PATH
+from utilities import RESOURCES_PATH, load_sound
+from window import create_window
 
-pygame.init()
-screen: pygame.Surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-game_background: pygame.Surface = pygame.image.load(
-    os.path.join(RESOURCES_PATH, "background", "background_misty_rocks.png")
+try:
+    config = load_config()
+except ConfigError as error:
+    sys.exit(f"Invalid configuration: {error}")
+
+parser = argparse.ArgumentParser(add_help=False)
+parser.add_argument(
+    "--profile-allocations",
+    nargs="?",
+    type=int,
+    const=300,
+    default=None,
+    metavar="FRAMES",
+    help="Trace allocations and report the top call sites every FRAMES frames",
+)
+parser.add_argument(
+    "--telemetry",
+    metavar="PATH",
+    help="Write telemetry events and metrics to PATH as JSON lines",
+)
+parser.add_argument(
+    "--telemetry-level",
+    choices=list(telemetry.LEVEL_NAMES),
+    default="warning",
+)
+parser.add_argument(
+    "--spectate",
+    metavar="[HOST:]PORT",
+    help="Watch the game streaming on PORT (see spectator_port) instead of playing",
 )
+parser.add_argument(
+    "--round-metrics",
+    metavar="PATH",
+    default=round_metrics.get_metrics_path(),
+    help="Append one JSON line of metrics per round to PATH, or 'off' (default: %(default)s)",
+)
+args, _ = parser.parse_known_args()
+
+logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(message)s")
+profiler = None
+if args.profile_allocations is not None:
+    profiler = AllocationProfiler(args.profile_allocations)
+    logging.getLogger("tiny_titan.allocations").setLevel(logging.INFO)
+telemetry.start(telemetry.LEVEL_NAMES[args.telemetry_level], args.telemetry)
+round_metrics.start(None if args.round_metrics == "off" else args.round_metrics)
+# Animation glitches repeat every frame until the state changes
+telemetry.get_telemetry().set_rate_limit("frame_missed", 2)
+pygame.init()
+screen: pygame.Surface = create_window(config)
 icon = pygame.transform.scale2x(
     pygame.image.load(os.path.join(RESOURCES_PATH, "icon", "title.png"))
 )
 pygame.display.set_icon(icon)
-bg_music = pygame.mixer.Sound(
-    os.path.join(RESOURCES_PATH, "audio", "alexander-nakarada-chase.mp3")
-)
-pygame.mixer.set_reserved(1)
+if args.spectate is not None:
+    watch(screen, args.spectate)
+    pygame.quit()
+    sys.exit()
+bg_music = load_sound("alexander-nakarada-chase.mp3")
+pygame.mixer.set_num_channels(config.audio_voices)
+pygame.mixer.set_reserved(RESERVED_CHANNELS)
 bg_channel = pygame.mixer.Channel(0)
 bg_channel.set_volume(0.1)
 bg_channel.play(bg_music, loops=-1)
-main_menu(screen, game_background, 0)
+main_menu(screen, None, 0, profiler)
@@ -1,32 +1,51 @@
 import pygame
 import os
 from typing import (
-    Dict
+    Dict,
+    Optional,
 )
 from utilities import (
+    CachedText,
     construct_dir,
     extract_overlay_tool,
-    get_font
 )
 from settings import (
     OVERLAY_POSITIONS,
 )
 from player import Player
+from assets import cached
+from window import get_screen
 
 class Overlay:
     def __init__(self, player: Player):
-        self.display_surface: pygame.Surface = pygame.display.get_surface()
-        self.overlay_item_surf = extract_overlay_tool(16, 16, 6)
+        self.display_surface: pygame.Surface = get_screen()
+        self.overlay_item_surf = cached(
+            "overlay.items", lambda: extract_overlay_tool(16, 16, 6)
+        )
 
         self.player = player
+        # Positions never change, so the rects are built once
+        self.tool_rects: Dict[str, pygame.Rect] = {
+            name: surface.get_rect(center=OVERLAY_POSITIONS["tool"])
+            for name, surface in self.overlay_item_surf.items()
+        }
+        self.health_rect: pygame.Rect = self.overlay_item_surf["health"].get_rect(
+            center=OVERLAY_POSITIONS["health"]
+        )
+        self.health_text = CachedText(
+            50, "{}", False, "White", center=OVERLAY_POSITIONS["health_num"]
+        )
 
-    def display(self) -> None:
-        tool_surf = self.overlay_item_surf[self.player.selected_tool]
-        tool_rect = tool_surf.get_rect(center=OVERLAY_POSITIONS["tool"])
+    def display(self, tool: Optional[str] = None, health: Optional[int] = None) -> None:
+        """
+        Draw the selected tool and health, the player's current ones unless
+        given (e.g. from a render snapshot).
+        """
+        tool = self.player.selected_tool if tool is None else tool
+        health = self.player.health if health is None else health
+        tool_surf = self.overlay_item_surf[tool]
         health_surf = self.overlay_item_surf["health"]
-        health_rect = health_surf.get_rect(center=OVERLAY_POSITIONS["health"])
-        menu_text = get_font(50).render(str(self.player.health), False, "White")
-        menu_rect = menu_text.get_rect(center=OVERLAY_POSITIONS["health_num"])
-        self.display_surface.blit(tool_surf, tool_rect)
-        self.display_surface.blit(health_surf, health_rect)
-        self.display_surface.blit(menu_text, menu_rect)
\ No newline at end of file
+        menu_text = self.health_text.update(health)
+        self.display_surface.blit(tool_surf, self.tool_rects[tool])
+        self.display_surface.blit(health_surf, self.health_rect)
+        self.display_surface.blit(menu_text, self.health_text.rect)
@@ -0,0 +1,234 @@
+import math
+import random
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pygame
+from settings import COLOR_PALETTE, PARTICLE_BUDGET
+
+# Number of pre-faded copies of every particle sprite. A particle picks the
+# copy matching its remaining life instead of changing alpha at runtime.
+FADE_STEPS: int = 6
+LAYERS: Tuple[str, ...] = ("back", "front")
+
+
+class EmitterPreset(NamedTuple):
+    colors: Tuple[str, ...]
+    size: Tuple[int, int]
+    count: int
+    speed: Tuple[float, float]  # pixels per second
+    angle: Tuple[float, float]  # degrees, 0 = right, -90 = up
+    life: Tuple[float, float]  # seconds
+    gravity: float  # pixels per second^2
+    damping: float  # fraction of velocity kept after one second
+    layer: str
+
+
+EMITTER_PRESETS: Dict[str, EmitterPreset] = {
+    "spark": EmitterPreset(
+        colors=("#FFFFFF", COLOR_PALETTE[5], COLOR_PALETTE[6]),
+        size=(4, 4),
+        count=10,
+        speed=(150, 380),
+        angle=(-170, -10),
+        life=(0.15, 0.35),
+        gravity=600,
+        damping=0.05,
+        layer="front",
+    ),
+    "bone": EmitterPreset(
+        colors=("#E8E2D0", "#C9C0A8"),
+        size=(10, 5),
+        count=8,
+        speed=(120, 300),
+        angle=(-150, -30),
+        life=(0.5, 0.9),
+        gravity=900,
+        damping=0.3,
+        layer="front",
+    ),
+    "feather": EmitterPreset(
+        colors=(COLOR_PALETTE[0], COLOR_PALETTE[3], "#FFFFFF"),
+        size=(8, 4),
+        count=7,
+        speed=(40, 140),
+        angle=(-180, 0),
+        life=(0.8, 1.4),
+        gravity=90,
+        damping=0.02,
+        layer="back",
+    ),
+}
+
+
+def _build_sprites(preset: EmitterPreset) -> List[List[pygame.Surface]]:
+    """
+    Render each preset color once per fade step.
+    """
+    sprites: List[List[pygame.Surface]] = []
+    for color in preset.colors:
+        # Opaque surfaces with a surface alpha blit faster than per-pixel alpha
+        base = pygame.Surface(preset.size)
+        base.fill(color)
+        if pygame.display.get_surface() is not None:
+            base = base.convert()
+        steps = []
+        for step in range(FADE_STEPS):
+            faded = base.copy()
+            faded.set_alpha(round(255 * (step + 1) / FADE_STEPS))
+            steps.append(faded)
+        sprites.append(steps)
+    return sprites
+
+
+class ParticleSystem:
+    """
+    Fixed-capacity particle pool stored in flat arrays.
+
+    Live particles are packed at the front of the arrays. A dead particle
+    is removed by moving the last live one into its slot, so removal never
+    shifts the arrays. Drawing issues a single batched blit per layer.
+    """
+
+    def __init__(self, budget: int = PARTICLE_BUDGET):
+        self.budget = budget
+        self.count = 0
+        # Own generator, so cosmetic effects never shift the gameplay RNG
+        self.random = random.Random()
+        self.x = array("f", bytes(4 * budget))
+        self.y = array("f", bytes(4 * budget))
+        self.vx = array("f", bytes(4 * budget))
+        self.vy = array("f", bytes(4 * budget))
+        self.life = array("f", bytes(4 * budget))
+        self.max_life = array("f", bytes(4 * budget))
+        self.gravity = array("f", bytes(4 * budget))
+        self.damping = array("f", bytes(4 * budget))
+        self.sprite = array("H", bytes(2 * budget))
+        self.layer = array("B", bytes(budget))
+        # Flat sprite table: sprite index * FADE_STEPS + fade step
+        self.surfaces: List[pygame.Surface] = []
+        self.preset_sprites: Dict[str, List[int]] = {}
+        self.presets: Dict[str, EmitterPreset] = {}
+        self.layer_index: Dict[str, int] = {name: i for i, name in enumerate(LAYERS)}
+        self.batches: List[List[Tuple[pygame.Surface, Tuple[int, int]]]] = [
+            [] for _ in LAYERS
+        ]
+        for name, preset in EMITTER_PRESETS.items():
+            self.register_preset(name, preset)
+
+    def register_preset(self, name: str, preset: EmitterPreset) -> None:
+        self.presets[name] = preset
+        indices = []
+        for steps in _build_sprites(preset):
+            indices.append(len(self.surfaces) // FADE_STEPS)
+            self.surfaces.extend(steps)
+        self.preset_sprites[name] = indices
+
+    def emit(self, preset_name: str, position: Tuple[float, float], count: int = 0) -> int:
+        """
+        Spawn count particles (the preset's count by default) at position.
+        Particles that do not fit in the budget are dropped. Returns the
+        number actually emitted.
+        """
+        preset = self.presets[preset_name]
+        sprites = self.preset_sprites[preset_name]
+        layer = self.layer_index[preset.layer]
+        count = min(count or preset.count, self.budget - self.count)
+        half_width = preset.size[0] / 2
+        half_height = preset.size[1] / 2
+        for _ in range(count):
+            i = self.count
+            angle = math.radians(self.random.uniform(*preset.angle))
+            speed = self.random.uniform(*preset.speed)
+            life = self.random.uniform(*preset.life)
+            self.x[i] = position[0] - half_width
+            self.y[i] = position[1] - half_height
+            self.vx[i] = math.cos(angle) * speed
+            self.vy[i] = math.sin(angle) * speed
+            self.life[i] = life
+            self.max_life[i] = life
+            self.gravity[i] = preset.gravity
+            self.damping[i] = preset.damping
+            self.sprite[i] = self.random.choice(sprites)
+            self.layer[i] = layer
+            self.count += 1
+        return count
+
+    def _remove(self, i: int) -> None:
+        last = self.count - 1
+        if i != last:
+            self.x[i] = self.x[last]
+            self.y[i] = self.y[last]
+            self.vx[i] = self.vx[last]
+            self.vy[i] = self.vy[last]
+            self.life[i] = self.life[last]
+            self.max_life[i] = self.max_life[last]
+            self.gravity[i] = self.gravity[last]
+            self.damping[i] = self.damping[last]
+            self.sprite[i] = self.sprite[last]
+            self.layer[i] = self.layer[last]
+        self.count = last
+
+    def update(self, delta_time: float) -> None:
+        x, y, vx, vy = self.x, self.y, self.vx, self.vy
+        life, gravity, damping = self.life, self.gravity, self.damping
+        i = 0
+        while i < self.count:
+            remaining = life[i] - delta_time
+            if remaining <= 0:
+                # The swapped-in particle is updated on this same index
+                self._remove(i)
+                continue
+            life[i] = remaining
+            kept = damping[i] ** delta_time
+            vx[i] *= kept
+            vy[i] = vy[i] * kept + gravity[i] * delta_time
+            x[i] += vx[i] * delta_time
+            y[i] += vy[i] * delta_time
+            i += 1
+
+    def collect(
+        self,
+        layer: str,
+        offset: Tuple[float, float] = (0, 0),
+        batch: Optional[List[Tuple[pygame.Surface, Tuple[int, int]]]] = None,
+    ) -> List[Tuple[pygame.Surface, Tuple[int, int]]]:
+        """
+        Append (surface, screen position) for every live particle of layer
+        to batch, a new list if None, and return it.
+        """
+        layer_id = self.layer_index[layer]
+        if batch is None:
+            batch = []
+        append = batch.append
+        surfaces = self.surfaces
+        x, y, life, max_life = self.x, self.y, self.life, self.max_life
+        sprite, layers = self.sprite, self.layer
+        last_step = FADE_STEPS - 1
+        offset_x, offset_y = round(offset[0]), round(offset[1])
+        for i in range(self.count):
+            if layers[i] != layer_id:
+                continue
+            # life < max_life always holds after the first update
+            step = int(life[i] / max_life[i] * last_step)
+            append((surfaces[sprite[i] * FADE_STEPS + step], (int(x[i]) - offset_x, int(y[i]) - offset_y)))
+        return batch
+
+    def draw(
+        self,
+        screen: pygame.Surface,
+        layer: str,
+        offset: Tuple[float, float] = (0, 0),
+    ) -> None:
+        batch = self.batches[self.layer_index[layer]]
+        batch.clear()
+        self.collect(layer, offset, batch)
+        if not batch:
+            return
+        if hasattr(screen, "fblits"):
+            screen.fblits(batch)
+        else:
+            screen.blits(batch, doreturn=False)
+
+    def clear(self) -> None:
+        self.count = 0
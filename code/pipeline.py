@@ -0,0 +1,104 @@
+"""
+Simulation on its own thread, one tick ahead of rendering.
+
+Each frame the main thread hands the next tick to the worker and then draws
+the snapshot of the tick before, so simulating tick N overlaps with drawing
+and presenting tick N - 1. Snapshots are double-buffered: the worker only
+writes the back buffer and the main thread only reads the front one, and
+they are swapped when a tick is collected. The main thread must not touch
+the simulated state while a tick is in flight: anything outside the
+frame loop that reads or changes it calls sync() first (see
+Gameplay.live_scene in ui.py).
+
+Blits and the display flip release the GIL, which is where the overlap
+comes from. The price is one frame of extra latency.
+"""
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class SimulationPipeline:
+    def __init__(self, step: Callable[..., Any], first: Any):
+        """
+        step(*args) runs one tick on the worker and returns its snapshot;
+        first is shown until the first tick is collected.
+        """
+        self.step = step
+        self.buffers: List[Any] = [first, first]
+        self.front: int = 0
+        self.args: Tuple[Any, ...] = ()
+        self.requested = threading.Event()
+        self.done = threading.Event()
+        self.in_flight: bool = False
+        self.error: Optional[BaseException] = None
+        self.stopping: bool = False
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.stopping = False
+            self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Finish the tick in flight and end the worker.
+        """
+        if self.thread is None:
+            return
+        try:
+            self.sync()
+        finally:
+            self.stopping = True
+            self.requested.set()
+            self.thread.join()
+            self.thread = None
+
+    def latest(self) -> Any:
+        return self.buffers[self.front]
+
+    def sync(self) -> None:
+        """
+        Wait for the tick in flight, if any, and make its snapshot the
+        latest. Errors raised by the tick are raised again here.
+        """
+        if not self.in_flight:
+            return
+        self.done.wait()
+        self.done.clear()
+        self.in_flight = False
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        self.front ^= 1
+
+    def submit(self, *args: Any) -> None:
+        """
+        Collect the previous tick and start the next one with args.
+        """
+        self.sync()
+        if self.thread is None:
+            self.start()
+        self.args = args
+        self.in_flight = True
+        self.requested.set()
+
+    def reset(self, snapshot: Any) -> None:
+        """
+        Finish the tick in flight, then show snapshot, e.g. when a round starts.
+        """
+        self.sync()
+        self.buffers = [snapshot, snapshot]
+        self.front = 0
+
+    def _run(self) -> None:
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+            if self.stopping:
+                return
+            try:
+                self.buffers[self.front ^ 1] = self.step(*self.args)
+            except BaseException as error:
+                self.error = error
+            self.done.set()
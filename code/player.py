@@ -1,48 +1,127 @@
 import pygame
 import os
 import random
-from typing import List, Dict
-from timer_counter import Timer
+from typing import List, Dict, Optional
+from timer_counter import Timer, get_ticks
+from controls import InputHandler
 from settings import (
-    GROUND_LEVEL, 
     JUMP_FORCE, 
     GRAVITY_ACCELERATION, 
+    LOW_HEALTH,
+    LOW_HEALTH_PULSE_MS,
+    MAX_FRAME_RATE,
+    PLAYER_BOUNDS,
+    Actions,
     PlayerStates
 )
+import telemetry
+from assets import cached
+from tiles import BODY_SIZE, FOOT_OFFSET, Solid, flat, sweep_x, sweep_y
+from tints import DAMAGE, LOW_HEALTH as LOW_HEALTH_TINT, NORMAL, frame_variants
 from utilities import (
     RESOURCES_PATH,
     extract_frames_character,
+    distance_squared,
     extract_frames_tool,
+    get_current_action,
     get_current_direction,
-    is_on_ground
+    get_state,
+    is_on_ground,
+    load_sound
 )
 
+TOOL_ACTIONS: tuple[tuple[str, int], ...] = (
+    (Actions.TOOL_1.value, 0),
+    (Actions.TOOL_2.value, 1),
+    (Actions.TOOL_3.value, 2),
+)
+
+# State the player settles into once it stops moving on the ground
+IDLE_STATES: Dict[str, str] = {
+    PlayerStates.JUMP_RIGHT.value: PlayerStates.IDLE_RIGHT.value,
+    PlayerStates.JUMP_LEFT.value: PlayerStates.IDLE_LEFT.value,
+    PlayerStates.MOVE_RIGHT.value: PlayerStates.IDLE_RIGHT.value,
+    PlayerStates.MOVE_LEFT.value: PlayerStates.IDLE_LEFT.value,
+}
+
+# Enum .value goes through a descriptor on every access, so the per-frame
+# code compares against these plain strings instead
+ACTION_ATTACK: str = Actions.ATTACK.value
+ACTION_JUMP: str = Actions.JUMP.value
+ACTION_MOVE_LEFT: str = Actions.MOVE_LEFT.value
+ACTION_MOVE_RIGHT: str = Actions.MOVE_RIGHT.value
+ACTION_WEAPON: str = Actions.WEAPON.value
+STATE_IDLE_LEFT: str = PlayerStates.IDLE_LEFT.value
+STATE_IDLE_RIGHT: str = PlayerStates.IDLE_RIGHT.value
+STATE_JUMP_LEFT: str = PlayerStates.JUMP_LEFT.value
+STATE_JUMP_RIGHT: str = PlayerStates.JUMP_RIGHT.value
+STATE_MOVE_LEFT: str = PlayerStates.MOVE_LEFT.value
+STATE_MOVE_RIGHT: str = PlayerStates.MOVE_RIGHT.value
+
+# Frame events, reported in Player.events when their frame is shown
+IMPACT: str = "impact"  # the blow of a swing lands
+# Clip -> {frame index: event}. Every swing lands on the frame that draws
+# its swoosh; the sword timer only shows the first half of its clip.
+CLIP_EVENTS: Dict[str, Dict[int, str]] = {
+    get_state(action, direction): {1: IMPACT}
+    for action in ("pickaxe", "axe", "shovel", "sword")
+    for direction in ("right", "left")
+}
+
+
+def load_player_frames() -> Dict[str, List[pygame.Surface]]:
+    player_sprite_path = os.path.join(RESOURCES_PATH, "player", "player.png")
+    player_sprite_sheet = pygame.image.load(player_sprite_path).convert_alpha()
+    return extract_frames_character(player_sprite_sheet, 32, 32, 5)
+
+
+def load_player_action_frames() -> Dict[str, List[pygame.Surface]]:
+    actions_sprite_path = os.path.join(RESOURCES_PATH, "player", "player_actions.png")
+    action_sprite_sheet = pygame.image.load(actions_sprite_path).convert_alpha()
+    return extract_frames_tool(action_sprite_sheet, 48, 48, 4.7)
+
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, position: tuple[int, int], group: pygame.sprite.Group):
+    def __init__(
+        self,
+        position: tuple[int, int],
+        group: pygame.sprite.Group,
+        controls: Optional[InputHandler] = None,
+    ):
         super().__init__(group)
+        self.controls: InputHandler = controls if controls is not None else InputHandler()
         self.channel = pygame.mixer.Channel(1)
         self.channel.set_volume(1)
-        # Set up resources
-        player_sprite_path = os.path.join(RESOURCES_PATH, "player", "player.png")
-        player_sprite_sheet = pygame.image.load(player_sprite_path).convert_alpha()
-
-        self.frames: Dict[str, List[pygame.Surface]] = extract_frames_character(
-            player_sprite_sheet, 32, 32, 5
+        # Set up resources (loaded once, shared by every round)
+        self.frames: Dict[str, List[pygame.Surface]] = cached(
+            "player.frames", load_player_frames
         )
         if len(self.frames) < 4:
             raise Exception("Critical Error. Failed to extract sprite.")
 
-        actions_sprite_path = os.path.join(RESOURCES_PATH, "player", "player_actions.png")
-        action_sprite_sheet = pygame.image.load(actions_sprite_path).convert_alpha()
-        self.action_frames: Dict[str, List[pygame.Surface]] = extract_frames_tool(
-            action_sprite_sheet, 48, 48, 4.7
+        self.action_frames: Dict[str, List[pygame.Surface]] = cached(
+            "player.action_frames", load_player_action_frames
+        )
+        # Damage and low-health tinted tables, indexed by tints variant
+        self.frame_variants: List[Dict[str, List[pygame.Surface]]] = cached(
+            "player.frame_variants",
+            lambda: frame_variants(self.frames, (DAMAGE, LOW_HEALTH_TINT)),
         )
+        self.action_frame_variants: List[Dict[str, List[pygame.Surface]]] = cached(
+            "player.action_frame_variants",
+            lambda: frame_variants(self.action_frames, (DAMAGE, LOW_HEALTH_TINT)),
+        )
+        self.variant: int = NORMAL
 
         # Set up player
-        self.state: str = PlayerStates.IDLE_RIGHT.value  # Default state
+        self.state: str = STATE_IDLE_RIGHT  # Default state
         self.current_frame: int = 0
         self.image: pygame.Surface = self.frames[self.state][self.current_frame]
+        # Clip and frame index shown by the last animate, and the frame
+        # events reached since the one before
+        self.shown_state: str = self.state
+        self.shown_frame: int = 0
+        self.events: List[str] = []
         self.rect: pygame.Rect = self.image.get_rect(center=position)
         self.health: int = 100
 
@@ -51,6 +130,12 @@ class Player(pygame.sprite.Sprite):
         self.pos = pygame.math.Vector2(self.rect.center)
         self.on_ground: bool = is_on_ground(self.pos.y)
         self.speed: int = 200
+        # World x range the player can walk in, kept inside the view
+        self.min_x: float = PLAYER_BOUNDS[0]
+        self.max_x: float = PLAYER_BOUNDS[1]
+        # Collision tiles, set by the scene; only the floor without them
+        self.terrain: Solid = flat
+        self.blocked: bool = False  # a tile stopped the last horizontal move
         self.last_update_time: int = pygame.time.get_ticks()
         self.gravity: float = 0
 
@@ -76,11 +161,12 @@ class Player(pygame.sprite.Sprite):
         }
 
         self.tool_sound = {
-            "pickaxe": pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "axe.mp3")),
-            "axe": pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "axe.mp3")),
-            "shovel": pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "shovel.mp3")),
-            "sword": pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "sword.mp3"))
+            "pickaxe": load_sound("axe.mp3"),
+            "axe": load_sound("axe.mp3"),
+            "shovel": load_sound("shovel.mp3"),
+            "sword": load_sound("sword.mp3")
         }
+        self.hit_sound = load_sound("hit.mp3")
 
         # Timer
         self.timers: Dict[str, Timer] = {
@@ -93,11 +179,35 @@ class Player(pygame.sprite.Sprite):
 
         self.shake_offset = pygame.math.Vector2(0, 0)
 
+    def reset(self, position: tuple[int, int]) -> None:
+        """
+        Put the player back in its starting state for a new round.
+        """
+        self.state = STATE_IDLE_RIGHT
+        self.current_frame = 0
+        self.select_variant(NORMAL)
+        self.image = self.frames[self.state][self.current_frame]
+        self.shown_state = self.state
+        self.shown_frame = 0
+        self.events.clear()
+        self.rect = self.image.get_rect(center=position)
+        self.health = 100
+        self.direction.update(0, 0)
+        self.pos.update(self.rect.center)
+        self.on_ground = is_on_ground(self.pos.y)
+        self.gravity = 0
+        self.min_x, self.max_x = PLAYER_BOUNDS
+        self.tool_index = 0
+        self.selected_tool = self.possible_tools[self.tool_index]
+        for timer in self.timers.values():
+            timer.deactivate()
+        self.shake_offset.update(0, 0)
+
     def animate(self, delta_time: float) -> None:
         """
         Animate player player based on delta_time.
         """
-        isToolUsed = self.state.split("_")[0] in self.possible_tools
+        isToolUsed = get_current_action(self.state) in self.possible_tools
 
         number_of_sprites = (
             len(self.action_frames[self.state])
@@ -109,17 +219,58 @@ class Player(pygame.sprite.Sprite):
         self.current_frame += number_of_sprites * delta_time  # type: ignore
         if self.current_frame > number_of_sprites:
             self.current_frame = 0
+        self.fire_events(int(self.current_frame), number_of_sprites)
         try:
             if isToolUsed:
-                self.image = self.action_frames[self.state][int(self.current_frame)]
+                image = self.action_frames[self.state][int(self.current_frame)]
             else:
-                self.image = self.frames[self.state][int(self.current_frame)]
-            # Account for the differences in surface size
-            self.rect = self.image.get_rect(center=self.rect.center)
+                image = self.frames[self.state][int(self.current_frame)]
+            if image is not self.image:
+                # Account for the differences in surface size, resizing the
+                # rect around its center instead of building a new one
+                self.image = image
+                rect = self.rect
+                centerx, centery = rect.centerx, rect.centery
+                rect.size = image.get_size()
+                rect.centerx, rect.centery = centerx, centery
         except IndexError:
-            print(f"Frame missed: {self.current_frame}\nPlayer state: {self.state}")
+            telemetry.event(
+                telemetry.DEBUG,
+                "frame_missed",
+                sprite="player",
+                state=self.state,
+                frame=self.current_frame,
+            )
         except KeyError:
-            print(f"Critical error. No frame found. Missing: {self.state}")
+            telemetry.event(
+                telemetry.ERROR, "frame_table_missing", sprite="player", state=self.state
+            )
+
+    def fire_events(self, frame: int, number_of_sprites: int) -> None:
+        """
+        Collect the events of every frame of the clip reached since the last
+        call, including frames skipped by a long delta_time, so each marker
+        fires exactly once per loop of its clip.
+        """
+        events = self.events
+        events.clear()
+        if self.state != self.shown_state:
+            self.shown_state = self.state
+            self.shown_frame = -1
+        shown = self.shown_frame
+        self.shown_frame = frame
+        markers = CLIP_EVENTS.get(self.state)
+        if markers is None or frame == shown:
+            return
+        if frame > shown:
+            reached = range(shown + 1, frame + 1)
+        else:
+            # Wrapped around to the start of the clip
+            reached = [*range(shown + 1, number_of_sprites), *range(frame + 1)]
+        for index in reached:
+            event = markers.get(index)
+            if event is not None:
+                events.append(event)
 
     def change_status(self) -> None:
         """
@@ -127,114 +278,127 @@ class Player(pygame.sprite.Sprite):
         """
 
         # Movement
-        if self.direction.x == 0 and self.direction.y == 0 and is_on_ground(self.pos.y):
+        if self.direction.x == 0 and self.direction.y == 0 and self.on_ground:
             # Check last status
-            idle_mapping = {
-                PlayerStates.JUMP_RIGHT.value: PlayerStates.IDLE_RIGHT.value,
-                PlayerStates.JUMP_LEFT.value: PlayerStates.IDLE_LEFT.value,
-                PlayerStates.MOVE_RIGHT.value: PlayerStates.IDLE_RIGHT.value,
-                PlayerStates.MOVE_LEFT.value: PlayerStates.IDLE_LEFT.value
-            }
-            self.state = idle_mapping.get(self.state, self.state)
-
-        current_item = self.state.split("_")[0]
+            self.state = IDLE_STATES.get(self.state, self.state)
+
+        current_item = get_current_action(self.state)
         current_direction = get_current_direction(self.state)
         if self.timers["tool_use"].active:
-            self.state = "_".join([self.selected_tool, current_direction])
+            self.state = get_state(self.selected_tool, current_direction)
         elif self.timers["weapon_use"].active:
-            self.state = "_".join([current_item, current_direction])
+            self.state = get_state(current_item, current_direction)
         else:
             # Change the player status to idle to prevent unlimited action duration
             if current_item in self.possible_tools or current_item in "sword":
-                self.state = "_".join(["idle", current_direction])
+                self.state = get_state("idle", current_direction)
 
     def input_handler(self):
         """
-        Handle player input.
+        Handle player input from the buffered controls.
         """
-        keys = pygame.key.get_pressed()
-
         if not self.timers["tool_use"].active and not self.timers["weapon_use"].active:
-            self.handle_movement(keys)
-            self.handle_tool_switch(keys)
+            self.handle_movement()
+            self.handle_tool_switch()
 
-        self.handle_weapon_use(keys)
-        self.handle_tool_use(keys)
+        self.handle_weapon_use()
+        self.handle_tool_use()
 
-    def handle_movement(self, keys: pygame.key.ScancodeWrapper):
+    def handle_movement(self):
         # on_ground: bool = is_on_ground(self.pos.y)
-        if keys[pygame.K_SPACE] and self.on_ground:
+        if self.on_ground and (
+            self.controls.consume(ACTION_JUMP)
+            or self.controls.is_held(ACTION_JUMP)
+        ):
             self.gravity = JUMP_FORCE
-            if self.state == PlayerStates.MOVE_LEFT.value or self.state == PlayerStates.IDLE_LEFT.value:
-                self.state = PlayerStates.JUMP_LEFT.value
-            elif self.state == PlayerStates.MOVE_RIGHT.value or self.state == PlayerStates.IDLE_RIGHT.value:
-                self.state = PlayerStates.JUMP_RIGHT.value
+            if self.state == STATE_MOVE_LEFT or self.state == STATE_IDLE_LEFT:
+                self.state = STATE_JUMP_LEFT
+            elif self.state == STATE_MOVE_RIGHT or self.state == STATE_IDLE_RIGHT:
+                self.state = STATE_JUMP_RIGHT
 
         # Horizontal
-        if keys[pygame.K_LEFT]:
+        if self.controls.is_held(ACTION_MOVE_LEFT):
             self.direction.x = -1
-            self.state = PlayerStates.MOVE_LEFT.value if self.on_ground else PlayerStates.JUMP_LEFT.value
-        elif keys[pygame.K_RIGHT]:
+            self.state = STATE_MOVE_LEFT if self.on_ground else STATE_JUMP_LEFT
+        elif self.controls.is_held(ACTION_MOVE_RIGHT):
             self.direction.x = 1
-            self.state = PlayerStates.MOVE_RIGHT.value if self.on_ground else PlayerStates.JUMP_RIGHT.value
+            self.state = STATE_MOVE_RIGHT if self.on_ground else STATE_JUMP_RIGHT
         else:
             self.direction.x = 0
 
-    def handle_tool_use(self, keys):
-        # Tool use
-        if keys[pygame.K_f] and not self.timers["tool_use"].active:
+    def handle_tool_use(self):
+        # Tool use. A press made shortly before the previous swing ends stays
+        # buffered and fires as soon as the tool is ready again.
+        if self.timers["tool_use"].active:
+            return
+        if self.controls.consume(ACTION_ATTACK) or self.controls.is_held(
+            ACTION_ATTACK
+        ):
             self.timers["tool_use"].activate()
             self.channel.play(self.tool_sound[self.selected_tool])
             if self.on_ground:
-                self.direction = pygame.math.Vector2()
+                self.direction.update(0, 0)
             self.current_frame = 0
+            # A new swing, even of the same clip
+            self.shown_frame = -1
 
-    def handle_tool_switch(self, keys):
+    def handle_tool_switch(self):
         """
         Handle the use of tool. Player cannot move when use tool.
         """
-        # Change tool
-        tool_keys = [
-            pygame.K_1,
-            pygame.K_2,
-            pygame.K_3,
-        ]
-
-        for key in tool_keys:
-            if keys[key]:
-                self.tool_index = tool_keys.index(key)
+        for action, index in TOOL_ACTIONS:
+            if self.controls.consume(action) or self.controls.is_held(action):
+                self.tool_index = index
                 self.selected_tool = self.possible_tools[self.tool_index]
                 break
 
-    def handle_weapon_use(self, keys):
+    def handle_weapon_use(self):
         """
         Handle the use of sword. Player cannot move when use sword.
         """
-        if keys[pygame.K_r] and not self.timers["weapon_use"].active:
+        if self.timers["weapon_use"].active:
+            return
+        if self.controls.consume(ACTION_WEAPON) or self.controls.is_held(
+            ACTION_WEAPON
+        ):
             self.timers["weapon_use"].activate()
             self.channel.play(self.tool_sound["sword"])
-            self.state = "_".join(["sword", get_current_direction(self.state)])
+            self.state = get_state("sword", get_current_direction(self.state))
             if self.on_ground:
-                self.direction = pygame.math.Vector2()
+                self.direction.update(0, 0)
             self.current_frame = 0
+            # A new swing, even of the same clip
+            self.shown_frame = -1
 
     def position_calculator(self, delta_time: float):
-        self.on_ground = is_on_ground(self.pos.y)
         # Normalize the direction vector to ensure consistent speed
-        if self.direction.length() > 0:
-            self.direction = self.direction.normalize()
+        if self.direction.x or self.direction.y:
+            self.direction.normalize_ip()
+
+        # horizontal movement, kept inside the view
+        target_x = self.pos.x + self.direction.x * self.speed * delta_time
+        if target_x < self.min_x:
+            target_x = self.min_x
+        if target_x > self.max_x:
+            target_x = self.max_x
+        width, height = BODY_SIZE
+        left = self.pos.x - width / 2
+        top = self.pos.y + FOOT_OFFSET - height
+        left, self.blocked = sweep_x(
+            left, top, width, height, target_x - self.pos.x, self.terrain
+        )
 
+        # vertical movement; gravity is tuned as pixels per frame at MAX_FRAME_RATE
         self.gravity += GRAVITY_ACCELERATION * delta_time
-        self.pos.y += self.gravity
-        if self.pos.y >= GROUND_LEVEL:
-            self.pos.y = GROUND_LEVEL
-
-        # horizontal movement
-        self.pos.x += self.direction.x * self.speed * delta_time
-        if self.pos.x < 60:
-            self.pos.x = 60
-        if self.pos.x > 1300:
-            self.pos.x = 1300
+        top, landed = sweep_y(
+            left, top, width, height,
+            self.gravity * delta_time * MAX_FRAME_RATE, self.terrain,
+        )
+        self.on_ground = landed and self.gravity > 0
+        if landed:
+            # Standing, or bumped into a ledge from below
+            self.gravity = 0
+        self.pos.update(left + width / 2, top + height - FOOT_OFFSET)
         self.rect.centerx = round(self.pos.x) # type: ignore
         
         # vertical movement
@@ -246,20 +410,33 @@ class Player(pygame.sprite.Sprite):
         # print("rect_y:" + str(self.rect.centery))
         # print("gravity:" + str(self.gravity))
 
-    def deal_damage(self, enemies: pygame.sprite.Group):
-        if self.state.split("_")[0] == "sword":
-            current_tool = "sword"
-        else:
-            current_tool = self.selected_tool
-        # print(current_tool)
+    def attack_tool(self) -> str:
+        """
+        The tool the current swing is made with.
+        """
+        if get_current_action(self.state) == "sword":
+            return "sword"
+        return self.selected_tool
+
+    def deal_damage(self, enemies: pygame.sprite.Group) -> List[pygame.sprite.Sprite]:
+        """
+        Hit every enemy in range of the current tool and return the ones
+        the hit landed on. Called once per swing, on its IMPACT frame.
+        """
+        current_tool = self.attack_tool()
         damage: int = self.tool_damage.get(current_tool, 0)
         weapon_range: int = self.tool_range.get(current_tool, 0)
+        range_squared = weapon_range * weapon_range
+        hits: List[pygame.sprite.Sprite] = []
         for enemy in enemies:
-            distance = pygame.math.Vector2(self.rect.center).distance_to(enemy.rect.center)
-            if distance <= weapon_range:
-                pygame.mixer.Channel(2).play(pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "hit.mp3")))
+            if distance_squared(self.rect, enemy.rect) <= range_squared:
+                # Overlapping hits use spare voices when the config provides them
+                channel = pygame.mixer.find_channel() or pygame.mixer.Channel(2)
+                channel.play(self.hit_sound)
 
-                enemy.take_damage(damage)
+                if enemy.take_damage(damage):
+                    hits.append(enemy)
+        return hits
 
     def apply_shake(self):
         if self.timers["shake_timer"].active:
@@ -269,6 +446,24 @@ class Player(pygame.sprite.Sprite):
             self.shake_offset.x = 0
             self.shake_offset.y = 0
 
+    def select_variant(self, variant: int) -> None:
+        if variant != self.variant:
+            self.variant = variant
+            self.frames = self.frame_variants[variant]
+            self.action_frames = self.action_frame_variants[variant]
+
+    def apply_tint(self) -> None:
+        """
+        Tint the player red while shaken by a hit, and pulse a pale tint
+        while health is low.
+        """
+        if self.timers["shake_timer"].active:
+            self.select_variant(DAMAGE)
+        elif self.health <= LOW_HEALTH and (get_ticks() // LOW_HEALTH_PULSE_MS) % 2:
+            self.select_variant(LOW_HEALTH_TINT)
+        else:
+            self.select_variant(NORMAL)
+
     def update_timers(self):
         for timer in self.timers.values():
             timer.update()
@@ -282,4 +477,5 @@ class Player(pygame.sprite.Sprite):
         self.change_status()
         self.apply_shake()
         self.update_timers()
+        self.apply_tint()
         self.animate(delta_time)
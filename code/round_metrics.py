@@ -0,0 +1,275 @@
+"""
+Per-round gameplay metrics.
+
+Every round played in the game appends one JSON line to a local file
+(rounds.jsonl next to the game, see main.py --round-metrics): frame time
+percentiles, peak enemies, spawns, kills per enemy type, damage dealt per
+tool, garbage collector pauses and asset cache hit rates, together with
+the preset the round was played on.
+
+Run as a script to summarize the records collected over many sessions,
+per preset and per day:
+
+    python code/round_metrics.py rounds.jsonl --by preset --period day
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import telemetry
+from config import get_config_path
+
+# Where records are appended; None writes nothing
+_path: Optional[str] = None
+
+
+class RoundMetrics:
+    """
+    Counters of one round, kept by the scene.
+    """
+
+    def __init__(self):
+        self.peak_enemies: int = 0
+        self.spawns: Dict[str, int] = {}
+        self.kills: Dict[str, int] = {}
+        self.damage_dealt: Dict[str, int] = {}
+
+    def reset(self) -> None:
+        self.peak_enemies = 0
+        self.spawns.clear()
+        self.kills.clear()
+        self.damage_dealt.clear()
+
+    def spawned(self, kind: str) -> None:
+        self.spawns[kind] = self.spawns.get(kind, 0) + 1
+
+    def killed(self, kind: str) -> None:
+        self.kills[kind] = self.kills.get(kind, 0) + 1
+
+    def dealt(self, tool: str, damage: int) -> None:
+        self.damage_dealt[tool] = self.damage_dealt.get(tool, 0) + damage
+
+    def enemies(self, count: int) -> None:
+        if count > self.peak_enemies:
+            self.peak_enemies = count
+
+    def counts(self) -> Dict[str, Any]:
+        return {
+            "peak_enemies": self.peak_enemies,
+            "spawns": dict(self.spawns),
+            "kills": dict(self.kills),
+            "damage_dealt": dict(self.damage_dealt),
+        }
+
+
+def get_metrics_path() -> str:
+    return os.path.join(os.path.dirname(get_config_path()), "rounds.jsonl")
+
+
+def start(path: Optional[str]) -> None:
+    global _path
+    _path = path
+
+
+def append(record: Dict[str, Any]) -> None:
+    if _path is None:
+        return
+    try:
+        with open(_path, "a") as file:
+            file.write(json.dumps(record, separators=(",", ":")) + "\n")
+    except OSError as error:
+        telemetry.event(telemetry.ERROR, "round_metrics_failed", error=str(error))
+
+
+# Fields summarize_group() reads: top level, then inside nested records
+REQUIRED: Tuple[str, ...] = ("time", "seconds", "score", "hitches", "peak_enemies")
+REQUIRED_NESTED: Dict[str, Tuple[str, ...]] = {
+    "frame_ms": ("p50", "p95", "p99"),
+    "gc": ("longest_ms",),
+    "assets": ("hits", "misses"),
+}
+OPTIONAL_NESTED: Tuple[str, ...] = ("spawns", "kills", "damage_dealt")
+
+
+def is_record(value: Any) -> bool:
+    """
+    Whether value has every field of a round record, with numbers where
+    the summary expects them.
+    """
+    if not isinstance(value, dict):
+        return False
+    fields = [value.get(key) for key in REQUIRED]
+    for key, names in REQUIRED_NESTED.items():
+        nested = value.get(key)
+        if not isinstance(nested, dict):
+            return False
+        fields.extend(nested.get(name) for name in names)
+    for key in OPTIONAL_NESTED:
+        nested = value.get(key, {})
+        if not isinstance(nested, dict):
+            return False
+        fields.extend(nested.values())
+    return all(
+        isinstance(field, (int, float)) and not isinstance(field, bool) for field in fields
+    )
+
+
+def load_records(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Records of every readable file in paths; files that cannot be read
+    and lines that are not round records are reported on stderr and
+    skipped.
+    """
+    records: List[Dict[str, Any]] = []
+    for path in paths:
+        try:
+            file = open(path)
+        except OSError as error:
+            print(f"Skipping {path}: {error.strerror}", file=sys.stderr)
+            continue
+        skipped = 0
+        with file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    record = None
+                if is_record(record):
+                    records.append(record)
+                else:
+                    skipped += 1
+        if skipped:
+            print(
+                f"Skipping {skipped} lines of {path} that are not round records",
+                file=sys.stderr,
+            )
+    return records
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile, as reported by the frame pacer.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def _mean(values: List[float]) -> float:
+    return statistics.fmean(values) if values else 0.0
+
+
+def _mean_by_key(records: List[Dict[str, Any]], field: str) -> Dict[str, float]:
+    keys = sorted({key for record in records for key in record.get(field, {})})
+    return {
+        key: round(_mean([record.get(field, {}).get(key, 0) for record in records]), 2)
+        for key in keys
+    }
+
+
+def summarize_group(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Statistics over the rounds of one group. Frame times are the median of
+    the rounds' p50 and p95, and the p95 of their p99, so a few bad rounds
+    show up in the tail.
+    """
+    frames = [record["frame_ms"] for record in records]
+    hits = sum(record["assets"]["hits"] for record in records)
+    lookups = hits + sum(record["assets"]["misses"] for record in records)
+    return {
+        "rounds": len(records),
+        "seconds": round(_mean([record["seconds"] for record in records]), 1),
+        "score": round(_mean([record["score"] for record in records]), 1),
+        "frame_ms": {
+            "p50": round(percentile([frame["p50"] for frame in frames], 0.5), 2),
+            "p95": round(percentile([frame["p95"] for frame in frames], 0.5), 2),
+            "p99": round(percentile([frame["p99"] for frame in frames], 0.95), 2),
+        },
+        "hitches": round(_mean([record["hitches"] for record in records]), 1),
+        "peak_enemies": {
+            "mean": round(_mean([record["peak_enemies"] for record in records]), 1),
+            "max": max(record["peak_enemies"] for record in records),
+        },
+        "spawns": _mean_by_key(records, "spawns"),
+        "kills": _mean_by_key(records, "kills"),
+        "damage_dealt": _mean_by_key(records, "damage_dealt"),
+        "gc_longest_ms": round(max(record["gc"]["longest_ms"] for record in records), 2),
+        "asset_hit_rate": round(hits / lookups, 3) if lookups else 1.0,
+    }
+
+
+def _period(timestamp: float, period: str) -> str:
+    if period == "all":
+        return "all"
+    if period == "week":
+        return time.strftime("%G-W%V", time.localtime(timestamp))
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+def summarize(
+    records: List[Dict[str, Any]], by: str = "preset", period: str = "day"
+) -> List[Dict[str, Any]]:
+    """
+    One summary per value of the record field by and per period, oldest
+    period first, so trends read top to bottom.
+    """
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for record in records:
+        key = (_period(record["time"], period), str(record.get(by, "")))
+        groups.setdefault(key, []).append(record)
+    return [
+        {"period": key[0], by: key[1], **summarize_group(groups[key])}
+        for key in sorted(groups)
+    ]
+
+
+def format_summary(summary: List[Dict[str, Any]], by: str) -> str:
+    lines = [
+        f"{'period':<10} {by:<10} {'rounds':>6} {'secs':>6} {'score':>6} "
+        f"{'p50':>6} {'p95':>6} {'p99':>6} {'peak':>5} {'gc ms':>6} {'hits':>5}  kills / damage"
+    ]
+    for row in summary:
+        frame = row["frame_ms"]
+        kills = " ".join(f"{kind}:{count:g}" for kind, count in row["kills"].items())
+        damage = " ".join(f"{tool}:{amount:g}" for tool, amount in row["damage_dealt"].items())
+        lines.append(
+            f"{row['period']:<10} {row[by]:<10} {row['rounds']:>6} {row['seconds']:>6.0f} "
+            f"{row['score']:>6.0f} {frame['p50']:>6.1f} {frame['p95']:>6.1f} "
+            f"{frame['p99']:>6.1f} {row['peak_enemies']['max']:>5} "
+            f"{row['gc_longest_ms']:>6.1f} {row['asset_hit_rate']:>5.0%}  {kills} / {damage}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Summarize Tiny Titan round metrics.")
+    parser.add_argument("paths", nargs="*", help="Record files, rounds.jsonl by default.")
+    parser.add_argument("--by", default="preset", help="Record field to group by, e.g. max_enemies.")
+    parser.add_argument("--period", choices=("day", "week", "all"), default="day")
+    parser.add_argument("--output", help="Also write the summary as JSON to this path.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    records = load_records(args.paths or [get_metrics_path()])
+    if not records:
+        sys.exit("No round records found")
+    summary = summarize(records, args.by, args.period)
+    print(format_summary(summary, args.by))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,338 @@
 import pygame
 import os
 import random
-from player import Player
-from typing import List
-from settings import GROUND_LEVEL, MAX_FRAME_RATE
+from player import IMPACT, Player
+from round_metrics import RoundMetrics
+from typing import List, NamedTuple, Optional, Tuple
+from settings import CAMERA_LEAD, GROUND_LEVEL, MAX_FRAME_RATE, PLAYER_BOUNDS, Actions
+from controls import InputHandler
+from particles import ParticleSystem
+from camera import Camera
+from ai_scheduler import AIScheduler
+from config import get_config
+from frame_pacer import FramePacer
+from snapshot import RewindBuffer, capture, restore
+from window import get_screen
+from world import DESPAWN_DISTANCE, World
 from overlay import Overlay
-from skeleton import Skeleton
-from bird import Bird
+from skeleton import SKELETON_BEHAVIOUR, Skeleton
+from bird import BIRD_BEHAVIOUR, Bird
 from timer_counter import Timer
-from utilities import RESOURCES_PATH, get_font, load_high_score
+from utilities import RESOURCES_PATH, CachedText, get_font, load_high_score
 from settings import COLOR_PALETTE
+import gc_policy
+import telemetry
+import assets
+from assets import cached
+
+Blit = Tuple[pygame.Surface, Tuple[int, int]]
+
+
+class RenderFrame(NamedTuple):
+    """
+    Everything needed to draw one simulated tick, detached from the live
+    scene so another thread can keep simulating while it is drawn.
+    """
+
+    background_positions: Tuple[float, ...]
+    terrain: Tuple[Blit, ...]  # pre-rendered world chunks
+    back_particles: Tuple[Blit, ...]
+    sprites: Tuple[Blit, ...]  # birds, player, skeletons, in drawing order
+    front_particles: Tuple[Blit, ...]
+    score: int
+    high_score: int
+    health: int
+    tool: str
+    debug_lines: Tuple[str, ...]  # empty unless the debug overlay is shown
+
+
+SCROLL_SPEEDS: tuple[float, ...] = (0.1, 0.5, 0.8, 1)  # Farthest to closest layers
+ACTION_DEBUG: str = Actions.DEBUG.value
+ACTION_REWIND: str = Actions.REWIND.value
+ACTION_RETRY: str = Actions.RETRY.value
+
+
+def load_backgrounds() -> List[pygame.Surface]:
+    backgrounds: List[pygame.Surface] = []
+    for i in range(4):
+        bg_image = pygame.image.load(
+            os.path.join(RESOURCES_PATH, "background", f"BG-{i}.png")
+        ).convert_alpha()
+        if i != 0:
+            bg_image = pygame.transform.scale_by(bg_image, 0.5).convert_alpha()
+        if i == 3:
+            bg_image = pygame.transform.scale(bg_image, (1366, 768))
+        backgrounds.append(bg_image)
+    return backgrounds
 
 
 class Scene:
 
     def __init__(self, score: int):
-        self.screen: pygame.Surface = pygame.display.get_surface()
+        config = get_config()
+        self.screen: pygame.Surface = get_screen()
         self.all_sprites: pygame.sprite.Group = pygame.sprite.Group()
         self.skeletons: pygame.sprite.Group = pygame.sprite.Group()
         self.birds: pygame.sprite.Group = pygame.sprite.Group()
-        self.enemy_spawn_timer: Timer = Timer(4000)
-        self.max_enemies: int = 4
+        self.enemy_spawn_timer: Timer = Timer(config.spawn_interval)
+        self.max_enemies: int = config.max_enemies
+        self.max_birds: int = config.max_birds
         self.score = 0
         self.high_score = load_high_score()
-        self.backgrounds: List[pygame.Surface] = []
-        self.background_positions: List[float] = []
-        for i in range(4):
-            bg_image = pygame.image.load(
-                os.path.join(RESOURCES_PATH, "background", f"BG-{i}.png")
-            ).convert_alpha()
-            if i != 0:
-                bg_image = pygame.transform.scale_by(bg_image, 0.5).convert_alpha()
-            if i == 3:
-                bg_image = pygame.transform.scale(bg_image, (1366, 768))
-
-            self.backgrounds.append(bg_image)
-            self.background_positions.append(0)
+        self.controls: InputHandler = InputHandler()
+        self.show_debug: bool = False
+        self.particles: ParticleSystem = ParticleSystem(config.effect_budget)
+        # Frame statistics shown on the debug overlay, set by the game loop
+        self.pacer: Optional[FramePacer] = None
+        self.backgrounds: List[pygame.Surface] = cached(
+            "scene.backgrounds", load_backgrounds
+        )
+        self.background_positions: List[float] = [0] * len(self.backgrounds)
         self.background_width: int = self.backgrounds[0].get_width()
+        # Sky (0) and ground (3) are always drawn, middle layers are optional
+        self.drawn_layers: List[int] = [
+            i
+            for i in range(len(self.backgrounds))
+            if i in (0, len(self.backgrounds) - 1) or i <= config.parallax_layers - 2
+        ]
+        self.sky_flipped: pygame.Surface = cached(
+            "scene.sky_flipped",
+            lambda: pygame.transform.flip(self.backgrounds[0], True, False),
+        )
+        self.camera: Camera = Camera()
+        # Chunks around the view, generated from a new seed every round
+        self.world: World = World()
+        self.world.reset(random.getrandbits(32), self.camera.view)
+        self.metrics: RoundMetrics = RoundMetrics()
+        self.ai: AIScheduler = AIScheduler(
+            self.camera, config.ai_budget_ms, config.ai_far_interval
+        )
+        self.ai.register(self.skeletons, SKELETON_BEHAVIOUR)
+        self.ai.register(self.birds, BIRD_BEHAVIOUR)
+        self.score_text = CachedText(50, "Score:{}", True, "White")
+        self.high_score_text = CachedText(50, "High Score:{}", True, COLOR_PALETTE[6])
+        # Snapshots of the last rewind_seconds of play, taken every frame
+        self.rewind: Optional[RewindBuffer] = (
+            RewindBuffer(config.rewind_seconds, MAX_FRAME_RATE)
+            if config.rewind_seconds > 0
+            else None
+        )
         self.setup()
+        # Round start, restored by the retry key
+        self.checkpoint: bytes = self.snapshot()
 
     def setup(self) -> None:
-        self.player = Player((300, GROUND_LEVEL), self.all_sprites)
+        self.player = Player((300, GROUND_LEVEL), self.all_sprites, self.controls)
+        self.player.terrain = self.world.is_solid
         self.overlay: Overlay = Overlay(self.player)
 
-    def draw_background(self) -> float:
-        player_movement = self.player.direction.x * self.player.speed / MAX_FRAME_RATE
-        if self.player.pos.x <= 300 or self.player.pos.x >= 1300:
-            player_movement = 0
+    def reset(self) -> None:
+        """
+        Restart the round in place, keeping every loaded asset.
+        """
+        self.skeletons.empty()
+        self.birds.empty()
+        self.enemy_spawn_timer.deactivate()
+        self.score = 0
+        self.high_score = load_high_score()
+        for i in range(len(self.background_positions)):
+            self.background_positions[i] = 0
+        self.camera.reset()
+        self.world.reset(random.getrandbits(32), self.camera.view)
+        self.metrics.reset()
+        self.ai.reset()
+        self.controls.reset()
+        self.particles.clear()
+        self.player.reset((300, GROUND_LEVEL))
+        if self.rewind is not None:
+            self.rewind.clear()
+        self.checkpoint = self.snapshot()
+
+    def snapshot(self) -> bytes:
+        """
+        Capture the simulation state; see snapshot.py.
+        """
+        return capture(self)
 
-        scroll_speeds: List[float] = [0.1, 0.5, 0.8, 1]  # Farthest to closest layers
+    def restore(self, data: bytes) -> None:
+        restore(self, data)
+        self.particles.clear()
+
+    def draw_background(self, draw: bool = True) -> None:
+        player = self.player
+        camera = self.camera
+        camera.follow(player.pos.x, CAMERA_LEAD)
+        player.min_x = camera.view.left + PLAYER_BOUNDS[0]
+        player.max_x = camera.view.left + PLAYER_BOUNDS[1]
 
         for i, image in enumerate(self.backgrounds):
-            self.background_positions[i] -= player_movement * scroll_speeds[i]
+            # Layers are placed from the camera scroll, wrapped to one tile
+            self.background_positions[i] = -(
+                (self.camera.scroll * SCROLL_SPEEDS[i]) % self.background_width
+            )
 
-            if self.background_positions[i] <= -self.background_width:
-                self.background_positions[i] += self.background_width
-            elif self.background_positions[i] >= self.background_width:
-                self.background_positions[i] -= self.background_width
+        if draw:
+            self.draw_layers(self.background_positions)
+            self.screen.blits(self.world.collect(camera.view), doreturn=False)
 
+    def draw_layers(self, positions: List[float]) -> None:
+        for i, image in enumerate(self.backgrounds):
+            if i not in self.drawn_layers:
+                continue
+            position = positions[i]
             if i == 0:
-                self.screen.blit(image, (self.background_positions[i], 0))
+                self.screen.blit(image, (position, 0))
                 self.screen.blit(
-                    pygame.transform.flip(image, True, False),
-                    (self.background_positions[i] + self.background_width, 0),
+                    self.sky_flipped, (position + self.background_width, 0)
                 )
             elif i != 3:
-                self.screen.blit(image, (self.background_positions[i], 0))
-                self.screen.blit(
-                    image, (self.background_positions[i] + self.background_width, 0)
-                )
+                self.screen.blit(image, (position, 0))
+                self.screen.blit(image, (position + self.background_width, 0))
             else:
+                self.screen.blit(image, (position, GROUND_LEVEL + 30))
                 self.screen.blit(
-                    image, (self.background_positions[i], GROUND_LEVEL + 30)
-                )
-                self.screen.blit(
-                    image,
-                    (
-                        self.background_positions[i] + self.background_width,
-                        GROUND_LEVEL + 30,
-                    ),
+                    image, (position + self.background_width, GROUND_LEVEL + 30)
                 )
-        return player_movement
 
-    def spawn_enemy(self):
+    def spawn_x(self) -> int:
+        """
+        World x off-screen to the right for a timed spawn, at the chunk's
+        next spawn point when there is one close enough.
+        """
+        spawn_x = random.randint(
+            self.camera.view.right + 50, self.camera.view.right + 150
+        )
+        point = self.world.spawn_point(spawn_x)
+        if point is not None and point - spawn_x < 300:
+            return point
+        return spawn_x
+
+    def spawn_skeleton(self, spawn_x: int) -> None:
         if len(self.skeletons) < self.max_enemies:
-            # Spawn enemy off-screen to the right
-            spawn_x = random.randint(
-                self.screen.get_width() + 50, self.screen.get_width() + 150
+            Skeleton(
+                (spawn_x, GROUND_LEVEL),
+                100,
+                self.skeletons,
+                self.player.pos,
+                terrain=self.world.is_solid,
             )
-            Skeleton((spawn_x, GROUND_LEVEL), 100, self.skeletons, self.player.pos)
+            self.metrics.spawned("skeleton")
+            telemetry.event(telemetry.DEBUG, "enemy_spawned", enemy="skeleton", x=spawn_x)
 
-        if len(self.birds) < 2:
-            spawn_x = random.randint(
-                self.screen.get_width() + 50, self.screen.get_width() + 150
-            )
+    def spawn_bird(self, spawn_x: int) -> None:
+        if len(self.birds) < self.max_birds:
             Bird((spawn_x, GROUND_LEVEL - 100), 10, self.birds)
-            print("bird")
+            self.metrics.spawned("bird")
+            telemetry.event(telemetry.DEBUG, "enemy_spawned", enemy="bird", x=spawn_x)
+
+    def spawn_enemy(self):
+        # Spawn enemies off-screen to the right
+        self.spawn_skeleton(self.spawn_x())
+        self.spawn_bird(self.spawn_x())
+
+    def stream_world(self) -> None:
+        """
+        Keep the chunks around the view, release the waves it reached and
+        drop enemies left far behind.
+        """
+        view = self.camera.view
+        self.world.stream(view)
+        for wave in self.world.due_waves(view):
+            for i in range(wave.skeletons):
+                self.spawn_skeleton(wave.x + 60 * i)
+            for i in range(wave.birds):
+                self.spawn_bird(wave.x + 90 * i)
+        behind = view.left - DESPAWN_DISTANCE
+        for group in (self.skeletons, self.birds):
+            for enemy in group.sprites():
+                if enemy.rect.right < behind:
+                    enemy.kill()
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.USEREVENT:
                 self.score += event.points
+                self.metrics.killed(event.enemy)
 
     def check_high_score(self):
         if self.score > self.high_score:
             self.high_score = self.score
 
-    def display_score(self):
-        font = pygame.font.Font(None, 36)
-        score_text = get_font(50).render(f"Score:{self.score}", True, "White")
-        high_score_text = get_font(50).render(
-            f"High Score:{self.high_score}", True, COLOR_PALETTE[6]
+    def display_score(self, score: int, high_score: int):
+        self.screen.blit(self.score_text.update(score), (10, 10))
+        self.screen.blit(self.high_score_text.update(high_score), (10, 70))
+
+    def debug_lines(self) -> List[str]:
+        last, average, worst = self.controls.latency_ms()
+        lines = [
+            f"Input latency ms  last:{last:.1f} avg:{average:.1f} max:{worst:.1f}",
+            f"Particles {self.particles.count}/{self.particles.budget}",
+        ]
+        if self.pacer is not None:
+            stats = self.pacer.percentiles()
+            lines.append(
+                f"Frame ms  p50:{stats['p50']:.1f} p95:{stats['p95']:.1f} "
+                f"p99:{stats['p99']:.1f}  {stats['fps']:.0f} fps  "
+                f"hitches:{len(self.pacer.hitches)}"
+            )
+        pauses = gc_policy.get_policy().pauses
+        lines.append(
+            f"GC collections  gen0:{pauses[0][0]} gen1:{pauses[1][0]} "
+            f"gen2:{pauses[2][0]}  longest ms:{pauses[1][2] * 1000:.1f} "
+            f"{pauses[2][2] * 1000:.1f}"
+        )
+        registry = assets.get_registry()
+        largest = "  ".join(
+            f"{row.owner}:{row.size / assets.MB:.1f}" for row in registry.report()[:4]
         )
-        self.screen.blit(score_text, (10, 10))
-        self.screen.blit(high_score_text, (10, 70))
+        lines.append(
+            f"Assets MB {registry.total() / assets.MB:.1f}/"
+            f"{registry.budget / assets.MB:.0f}  {largest}"
+        )
+        return lines
+
+    def display_debug(self, lines: List[str]):
+        font = get_font(20)
+        for i, line in enumerate(lines):
+            self.screen.blit(font.render(line, True, "White"), (10, 130 + 25 * i))
+
+    def render_frame(self) -> RenderFrame:
+        """
+        Capture what the current tick looks like, for drawing with render().
+        """
+        camera = self.camera
+        offset = camera.offset
+        terrain = self.world.collect(camera.view)
+        sprites = camera.collect(self.birds)
+        camera.collect(self.all_sprites, sprites)
+        camera.collect(self.skeletons, sprites)
+        return RenderFrame(
+            tuple(self.background_positions),
+            tuple(terrain),
+            tuple(self.particles.collect("back", offset)),
+            tuple(sprites),
+            tuple(self.particles.collect("front", offset)),
+            self.score,
+            self.high_score,
+            self.player.health,
+            self.player.selected_tool,
+            tuple(self.debug_lines()) if self.show_debug else (),
+        )
+
+    def render(self, frame: RenderFrame) -> None:
+        """
+        Draw a tick captured by render_frame(); the scene itself is not read.
+        """
+        screen = self.screen
+        self.draw_layers(frame.background_positions)
+        screen.blits(frame.terrain, doreturn=False)
+        screen.blits(frame.back_particles, doreturn=False)
+        screen.blits(frame.sprites, doreturn=False)
+        screen.blits(frame.front_particles, doreturn=False)
+        self.display_score(frame.score, frame.high_score)
+        self.overlay.display(frame.tool, frame.health)
+        if frame.debug_lines:
+            self.display_debug(frame.debug_lines)
 
     def update(
         self,
@@ -121,44 +340,84 @@ class Scene:
         player_direction: str,
         delta_time: float,
         player: Player,
+        draw: bool = True,
     ):
-        # Update enemies
-        for skeleton in self.skeletons:
-            skeleton.update(player_position, player_direction, delta_time)
-            skeleton.damage_player_if_close(player)
+        # Update enemies. Enemies far outside the view are not animated,
+        # cannot reach the player and only decide every few frames.
+        self.ai.update(player, delta_time)
 
-        for bird in self.birds:
-            bird.update(self.player.state, delta_time)
-            bird.damage_player_if_close(player)
+        enemies = len(self.skeletons) + len(self.birds)
+        self.metrics.enemies(enemies)
+        telemetry.gauge("enemies", enemies)
+        telemetry.gauge("particles", self.particles.count)
 
+        self.stream_world()
         # Spawn new enemies if necessary
         self.enemy_spawn_timer.update()
         if not self.enemy_spawn_timer.active:
             self.enemy_spawn_timer.activate()
             self.spawn_enemy()
 
-        # Draw everything
-        self.skeletons.draw(self.screen)
-        self.birds.draw(self.screen)
+        # Draw everything on screen
+        if draw:
+            self.camera.draw(self.screen, self.birds)
 
-    def run(self, delta_time: float) -> None:
+    def run(self, delta_time: float, draw: bool = True) -> None:
+        """
+        Advance the round by one frame. With draw=False nothing is blitted,
+        which lets headless simulations run the same logic without a window.
+        """
+        if self.controls.consume(ACTION_DEBUG):
+            self.show_debug = not self.show_debug
+        if self.controls.consume(ACTION_RETRY):
+            self.restore(self.checkpoint)
+            if self.rewind is not None:
+                self.rewind.clear()
+        # While rewinding, the restored snapshot replaces the simulation step
+        rewinding = (
+            self.rewind is not None
+            and self.controls.is_held(ACTION_REWIND)
+            and self.rewind.step_back(self)
+        )
         # Background
-        self.draw_background()
+        self.draw_background(draw)
+        if draw:
+            self.particles.draw(self.screen, "back", self.camera.offset)
         # Adjust enemy position
-        self.update(self.player.pos, self.player.state, delta_time, self.player)
+        if not rewinding:
+            self.update(self.player.pos, self.player.state, delta_time, self.player, draw)
+        elif draw:
+            self.camera.draw(self.screen, self.birds)
         # Draw sprites on screen
-        self.all_sprites.draw(self.screen)
-        self.skeletons.draw(self.screen)
+        if draw:
+            self.camera.draw(self.screen, self.all_sprites)
+            self.camera.draw(self.screen, self.skeletons)
+            self.particles.draw(self.screen, "front", self.camera.offset)
         # Update
-        self.all_sprites.update(delta_time)
+        if not rewinding:
+            self.all_sprites.update(delta_time)
         # self.handle_events()
         self.check_high_score()
-        self.display_score()
-        self.overlay.display()
-        # Handle attack
-        if (
-            self.player.timers["tool_use"].active
-            or self.player.timers["weapon_use"].active
-        ):
-            self.player.deal_damage(self.skeletons)
-            self.player.deal_damage(self.birds)
+        if draw:
+            self.display_score(self.score, self.high_score)
+            self.overlay.display()
+            if self.show_debug:
+                self.display_debug(self.debug_lines())
+        # A swing hits once, when its animation reaches the impact frame
+        if not rewinding and IMPACT in self.player.events:
+            hits = 0
+            for skeleton in self.player.deal_damage(self.skeletons):
+                hits += 1
+                self.particles.emit("spark", skeleton.rect.center)
+                if skeleton.health <= 0:
+                    self.particles.emit("bone", skeleton.rect.center)
+            for bird in self.player.deal_damage(self.birds):
+                hits += 1
+                self.particles.emit("feather", bird.rect.center)
+            if hits:
+                tool = self.player.attack_tool()
+                self.metrics.dealt(tool, hits * self.player.tool_damage.get(tool, 0))
+        self.particles.update(delta_time)
+        if self.rewind is not None and not rewinding:
+            self.rewind.record(self, delta_time)
+        self.controls.end_frame()
@@ -1,10 +1,16 @@
 from enum import Enum
 import os
 
-MAX_FRAME_RATE = 60
+MAX_FRAME_RATE = 60  # reference rate the per-frame physics was tuned for
+RESERVED_CHANNELS: int = 5  # music, player, hit, skeleton, bird
+MAX_DELTA_TIME: float = 0.1  # s, longest step the simulation takes after a hitch
+BACKGROUND_FRAME_RATE: int = 10  # while the window is unfocused or minimized
+IDLE_WAIT_MS: int = 500  # longest an event-driven screen blocks waiting for input
 WINDOW_WIDTH: int = 1366
 WINDOW_HEIGHT: int = 768
 GROUND_LEVEL: int = 500
+PLAYER_BOUNDS: tuple[int, int] = (60, 1300)  # px from the view's left edge
+CAMERA_LEAD: int = 500  # px from the view's left edge where the camera follows
 OVERLAY_POSITIONS = {
     "tool": (60, WINDOW_HEIGHT - 60),
     "health_num": (WINDOW_WIDTH - 162, WINDOW_HEIGHT - 60),
@@ -12,6 +18,13 @@ OVERLAY_POSITIONS = {
 }
 JUMP_FORCE = -8
 GRAVITY_ACCELERATION = 15
+ATTACK_BUFFER_WINDOW: int = 150  # ms an early attack press stays queued
+HIT_FLASH_MS: int = 120  # ms an enemy is drawn white after a hit
+LOW_HEALTH: int = 30  # player health at which the low-health tint pulses
+LOW_HEALTH_PULSE_MS: int = 400  # ms per half period of that pulse
+PARTICLE_BUDGET: int = 512
+CULL_MARGIN: int = 0  # px around the view still drawn
+LOD_MARGIN: int = 32  # px around the view where enemies get full updates
 CENTER_SCREEN: tuple[int, int] = (683, 384)
 COLOR_PALETTE: tuple[str, str, str, str, str, str, str, str] = (
     "#91A281",
@@ -50,3 +63,17 @@ class EnemyStates(Enum):
     HIT_LEFT = "hit_left"
     DEATH_RIGHT = "death_right"
     DEATH_LEFT = "death_left"
+
+
+class Actions(Enum):
+    MOVE_LEFT = "move_left"
+    MOVE_RIGHT = "move_right"
+    JUMP = "jump"
+    ATTACK = "attack"
+    WEAPON = "weapon"
+    TOOL_1 = "tool_1"
+    TOOL_2 = "tool_2"
+    TOOL_3 = "tool_3"
+    DEBUG = "debug"
+    REWIND = "rewind"
+    RETRY = "retry"
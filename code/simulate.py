@@ -0,0 +1,349 @@
+"""
+Headless batch runner for balance simulations.
+
+Plays complete rounds with a bot in place of the keyboard, across a
+process pool, and writes per-configuration statistics to a summary file:
+
+    python code/simulate.py --games 200 --policy scripted \
+        --sweep sword.damage=40,60,80 --sweep axe.range=60,70,90
+
+Each configuration overrides entries of Player.tool_damage and
+Player.tool_range. Rounds run on a virtual clock, so they are not limited
+to real time.
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pygame
+from settings import MAX_FRAME_RATE, WINDOW_HEIGHT, WINDOW_WIDTH, Actions
+from config import PRESETS, activate, resolve
+from timer_counter import set_clock
+
+TOOL_ACTIONS: Dict[str, str] = {
+    "axe": Actions.TOOL_1.value,
+    "pickaxe": Actions.TOOL_2.value,
+    "shovel": Actions.TOOL_3.value,
+}
+
+
+class VirtualClock:
+    """
+    Millisecond clock that only moves when the simulation steps it.
+    """
+
+    def __init__(self):
+        self.ticks: int = 0
+
+    def get_ticks(self) -> int:
+        return self.ticks
+
+    def advance(self, milliseconds: float) -> None:
+        self.ticks += round(milliseconds)
+
+
+def random_policy(scene, rng: random.Random) -> None:
+    controls = scene.player.controls
+    if rng.random() < 0.1:
+        direction = rng.choice(
+            [Actions.MOVE_LEFT.value, Actions.MOVE_RIGHT.value, None]
+        )
+        controls.hold(Actions.MOVE_LEFT.value, direction == Actions.MOVE_LEFT.value)
+        controls.hold(Actions.MOVE_RIGHT.value, direction == Actions.MOVE_RIGHT.value)
+    if rng.random() < 0.05:
+        controls.press(
+            rng.choice(
+                [
+                    Actions.JUMP.value,
+                    Actions.ATTACK.value,
+                    Actions.WEAPON.value,
+                    Actions.TOOL_1.value,
+                    Actions.TOOL_2.value,
+                    Actions.TOOL_3.value,
+                ]
+            )
+        )
+
+
+def scripted_policy(scene, rng: random.Random) -> None:
+    """
+    Walk toward the closest enemy and hit it with whichever weapon reaches.
+    """
+    player = scene.player
+    controls = player.controls
+    enemies = list(scene.skeletons) + list(scene.birds)
+    controls.hold(Actions.MOVE_LEFT.value, False)
+    controls.hold(Actions.MOVE_RIGHT.value, False)
+    if not enemies:
+        return
+    target = min(enemies, key=lambda enemy: abs(enemy.rect.centerx - player.rect.centerx))
+    distance = pygame.math.Vector2(player.rect.center).distance_to(target.rect.center)
+
+    best_tool = max(TOOL_ACTIONS, key=lambda tool: player.tool_range[tool])
+    if player.selected_tool != best_tool:
+        controls.press(TOOL_ACTIONS[best_tool])
+    if distance <= player.tool_range["sword"]:
+        controls.press(Actions.WEAPON.value)
+    elif distance <= player.tool_range[player.selected_tool]:
+        controls.press(Actions.ATTACK.value)
+    elif target.rect.centerx < player.rect.centerx:
+        controls.hold(Actions.MOVE_LEFT.value)
+    else:
+        controls.hold(Actions.MOVE_RIGHT.value)
+
+    if target.rect.bottom < player.rect.top and rng.random() < 0.1:
+        controls.press(Actions.JUMP.value)
+    elif player.blocked:
+        # Jump over the obstacle in the way
+        controls.press(Actions.JUMP.value)
+
+
+POLICIES: Dict[str, Callable[[Any, random.Random], None]] = {
+    "random": random_policy,
+    "scripted": scripted_policy,
+}
+
+
+# One Scene per worker process, reset between rounds.
+_scene = None
+_DEFAULT_TOOL_DAMAGE: Dict[str, int] = {}
+_DEFAULT_TOOL_RANGE: Dict[str, int] = {}
+
+
+def _init_worker(preset: str) -> None:
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    # Let Pool.terminate() stop the worker instead of SDL turning SIGTERM
+    # into a QUIT event nobody reads.
+    os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+    pygame.init()
+    pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    # Simulated rounds never rewind, and a wall-clock AI budget would make
+    # results depend on machine load
+    activate(resolve(preset, overrides={"rewind_seconds": 0, "ai_budget_ms": 0}))
+
+    from scene import Scene
+
+    global _scene
+    _scene = Scene(0)
+    _DEFAULT_TOOL_DAMAGE.update(_scene.player.tool_damage)
+    _DEFAULT_TOOL_RANGE.update(_scene.player.tool_range)
+
+
+def play_game(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Play one round to the end and return its statistics.
+    """
+    clock = VirtualClock()
+    set_clock(clock.get_ticks)
+    random.seed(job["seed"])
+    rng = random.Random(job["seed"])
+    policy = POLICIES[job["policy"]]
+
+    scene = _scene
+    scene.reset()
+    scene.controls.clock = lambda: clock.ticks / 1000
+    scene.player.tool_damage.update(_DEFAULT_TOOL_DAMAGE)
+    scene.player.tool_damage.update(job["tool_damage"])
+    scene.player.tool_range.update(_DEFAULT_TOOL_RANGE)
+    scene.player.tool_range.update(job["tool_range"])
+
+    frame_ms = 1000 / job["fps"]
+    delta_time = frame_ms / 1000
+    max_ticks = job["max_seconds"] * 1000
+    kills: Dict[str, int] = {"skeleton": 0, "bird": 0}
+    damage_taken = 0
+    pygame.event.clear()
+    while scene.player.health > 0 and clock.ticks < max_ticks:
+        clock.advance(frame_ms)
+        policy(scene, rng)
+        health_before = scene.player.health
+        scene.run(delta_time, draw=False)
+        damage_taken += max(0, health_before - scene.player.health)
+        for event in pygame.event.get():
+            if event.type != pygame.USEREVENT:
+                continue
+            scene.score += event.points
+            kind = getattr(event, "enemy", None)
+            if kind is not None:
+                kills[kind] = kills.get(kind, 0) + 1
+
+    return {
+        "config": job["config"],
+        "seed": job["seed"],
+        "survival_time": clock.ticks / 1000,
+        "score": scene.score,
+        "kills": kills,
+        "damage_taken": damage_taken,
+    }
+
+
+def _parse_overrides(values: List[str]) -> Dict[str, int]:
+    overrides: Dict[str, int] = {}
+    for value in values:
+        tool, _, amount = value.partition("=")
+        overrides[tool] = int(amount)
+    return overrides
+
+
+def build_configs(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Expand the base overrides and every --sweep axis into a list of named
+    configurations (the cartesian product of all sweep axes).
+    """
+    if args.config_file:
+        with open(args.config_file, "r") as file:
+            configs = json.load(file)
+        for config in configs:
+            config.setdefault("tool_damage", {})
+            config.setdefault("tool_range", {})
+        return configs
+
+    base_damage = _parse_overrides(args.tool_damage)
+    base_range = _parse_overrides(args.tool_range)
+    axes = []
+    for sweep in args.sweep:
+        key, _, values = sweep.partition("=")
+        tool, _, stat = key.partition(".")
+        if stat not in ("damage", "range"):
+            raise ValueError(f"Invalid sweep '{sweep}', expected TOOL.damage=... or TOOL.range=...")
+        axes.append([(tool, stat, int(value)) for value in values.split(",")])
+
+    configs = []
+    for combination in itertools.product(*axes):
+        tool_damage = dict(base_damage)
+        tool_range = dict(base_range)
+        name_parts = []
+        for tool, stat, value in combination:
+            (tool_damage if stat == "damage" else tool_range)[tool] = value
+            name_parts.append(f"{tool}.{stat}={value}")
+        configs.append(
+            {
+                "name": ",".join(name_parts) or "default",
+                "tool_damage": tool_damage,
+                "tool_range": tool_range,
+            }
+        )
+    return configs
+
+
+def summarize(config: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def stats(values: List[float]) -> Dict[str, float]:
+        return {
+            "mean": statistics.fmean(values),
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+            "stdev": statistics.pstdev(values),
+        }
+
+    kinds = sorted({kind for result in results for kind in result["kills"]})
+    return {
+        "config": config["name"],
+        "tool_damage": config["tool_damage"],
+        "tool_range": config["tool_range"],
+        "games": len(results),
+        "survival_time": stats([result["survival_time"] for result in results]),
+        "score": stats([result["score"] for result in results]),
+        "kills": {
+            kind: stats([result["kills"].get(kind, 0) for result in results])
+            for kind in kinds
+        },
+        "damage_taken": stats([result["damage_taken"] for result in results]),
+    }
+
+
+def write_summary(path: str, summary: List[Dict[str, Any]]) -> None:
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(
+                ["config", "games", "survival_mean", "score_mean",
+                 "skeleton_kills_mean", "bird_kills_mean", "damage_taken_mean"]
+            )
+            for row in summary:
+                writer.writerow(
+                    [
+                        row["config"],
+                        row["games"],
+                        round(row["survival_time"]["mean"], 2),
+                        round(row["score"]["mean"], 2),
+                        round(row["kills"].get("skeleton", {}).get("mean", 0), 2),
+                        round(row["kills"].get("bird", {}).get("mean", 0), 2),
+                        round(row["damage_taken"]["mean"], 2),
+                    ]
+                )
+    else:
+        with open(path, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tiny Titan headless balance simulations.")
+    parser.add_argument("--games", type=int, default=20, help="Rounds per configuration.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="scripted")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-seconds", type=float, default=300, help="Cap on simulated round length.")
+    parser.add_argument("--fps", type=int, default=MAX_FRAME_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="balanced", help="Enemy caps and spawn rate.")
+    parser.add_argument("--tool-damage", action="append", default=[], metavar="TOOL=VALUE")
+    parser.add_argument("--tool-range", action="append", default=[], metavar="TOOL=VALUE")
+    parser.add_argument("--sweep", action="append", default=[], metavar="TOOL.damage|range=V1,V2,...")
+    parser.add_argument("--config-file", help="JSON list of {name, tool_damage, tool_range}.")
+    parser.add_argument("--output", default="simulation_summary.json", help=".json or .csv")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configs = build_configs(args)
+    jobs = [
+        {
+            "config": index,
+            "seed": args.seed + game,
+            "policy": args.policy,
+            "fps": args.fps,
+            "max_seconds": args.max_seconds,
+            "tool_damage": config["tool_damage"],
+            "tool_range": config["tool_range"],
+        }
+        for index, config in enumerate(configs)
+        for game in range(args.games)
+    ]
+
+    results: List[List[Dict[str, Any]]] = [[] for _ in configs]
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(
+        args.workers, initializer=_init_worker, initargs=(args.preset,)
+    )
+    try:
+        for done, result in enumerate(pool.imap_unordered(play_game, jobs), 1):
+            results[result["config"]].append(result)
+            print(f"\r{done}/{len(jobs)} games", end="", file=sys.stderr, flush=True)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    print(f"\nFinished in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    summary = [
+        summarize(config, config_results)
+        for config, config_results in zip(configs, results)
+    ]
+    write_summary(args.output, summary)
+    print(f"Summary written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
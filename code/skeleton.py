@@ -1,12 +1,51 @@
 import pygame
 import os
 import random
-from settings import GROUND_LEVEL
+from settings import GROUND_LEVEL, HIT_FLASH_MS
 from timer_counter import Timer
+from ai_scheduler import Behaviour
 from player import Player
 from typing import Dict, List, Optional
-from utilities import RESOURCES_PATH, extract_frames_skeleton, get_current_direction
+from utilities import (
+    RESOURCES_PATH,
+    distance_squared,
+    extract_frames_skeleton,
+    get_current_action,
+    get_current_direction,
+    get_state,
+    load_sound,
+)
 from settings import EnemyStates
+import telemetry
+from assets import cached
+from tiles import BODY_SIZE, FOOT_OFFSET, Solid, flat, sweep_x
+from tints import FLASH, NORMAL, frame_variants
+
+
+def load_skeleton_frames() -> Dict[str, List[pygame.Surface]]:
+    enemy_sprite_path = os.path.join(RESOURCES_PATH, "enemies", "skeleton.png")
+    enemy_sprite_sheet = pygame.image.load(enemy_sprite_path)
+    return extract_frames_skeleton(enemy_sprite_sheet, 32, 32, 5)
+
+
+def walk(skeleton: "Skeleton", delta_time: float) -> None:
+    """
+    Like ai_scheduler.coast(), but stopped by obstacles.
+    """
+    position = skeleton.world_position
+    distance = skeleton.velocity_x * delta_time
+    if distance:
+        width, height = BODY_SIZE
+        left, _ = sweep_x(
+            position.x - width / 2,
+            position.y + FOOT_OFFSET - height,
+            width,
+            height,
+            distance,
+            skeleton.terrain,
+        )
+        position.x = left + width / 2
+    skeleton.rect.center = position  # type: ignore
 
 
 class Skeleton(pygame.sprite.Sprite):
@@ -17,12 +56,15 @@ class Skeleton(pygame.sprite.Sprite):
         group: pygame.sprite.Group,
         player_position: pygame.math.Vector2,
         speed: Optional[float] = None,
+        terrain: Solid = flat,
     ):
         super().__init__(group)
-        enemy_sprite_path = os.path.join(RESOURCES_PATH, "enemies", "skeleton.png")
-        enemy_sprite_sheet = pygame.image.load(enemy_sprite_path)
-        self.frames: Dict[str, List[pygame.Surface]] = extract_frames_skeleton(
-            enemy_sprite_sheet, 32, 32, 5
+        self.frames: Dict[str, List[pygame.Surface]] = cached(
+            "skeleton.frames", load_skeleton_frames
+        )
+        # Normal and white hit-flash tables, indexed by tints variant
+        self.frame_variants: List[Dict[str, List[pygame.Surface]]] = cached(
+            "skeleton.frame_variants", lambda: frame_variants(self.frames, (FLASH,))
         )
 
         self.channel = pygame.mixer.Channel(3)
@@ -39,6 +81,12 @@ class Skeleton(pygame.sprite.Sprite):
         )
         self.world_position = pygame.math.Vector2(position)
         self.player_position = player_position
+        # Scratch vector for the heading toward the player
+        self.heading = pygame.math.Vector2()
+        # Horizontal speed chosen by the last steer(), in px/s
+        self.velocity_x: float = 0.0
+        # Collision tiles; skeletons walk the floor and stop at obstacles
+        self.terrain = terrain
 
         self.health: int = health
         self.timers = {
@@ -51,6 +99,9 @@ class Skeleton(pygame.sprite.Sprite):
         """
         Animate player player based on delta_time.
         """
+        hit_timer = self.timers["hit_timer"]
+        flashing = hit_timer.active and hit_timer.elapsed() < HIT_FLASH_MS
+        self.frames = self.frame_variants[FLASH if flashing else NORMAL]
         number_of_sprites = len(self.frames[self.state])
 
         # Accumulative fraction value
@@ -58,13 +109,27 @@ class Skeleton(pygame.sprite.Sprite):
         if self.current_frame > number_of_sprites:
             self.current_frame = 0
         try:
-            self.image = self.frames[self.state][int(self.current_frame)]
-            # Account for the differences in surface size
-            self.rect = self.image.get_rect(center=self.rect.center)
+            image = self.frames[self.state][int(self.current_frame)]
+            if image is not self.image:
+                # Account for the differences in surface size, resizing the
+                # rect around its center instead of building a new one
+                self.image = image
+                rect = self.rect
+                centerx, centery = rect.centerx, rect.centery
+                rect.size = image.get_size()
+                rect.centerx, rect.centery = centerx, centery
         except IndexError:
-            print(f"Frame missed: {self.current_frame}\nPlayer state: {self.state}")
+            telemetry.event(
+                telemetry.DEBUG,
+                "frame_missed",
+                sprite="skeleton",
+                state=self.state,
+                frame=self.current_frame,
+            )
         except KeyError:
-            print(f"Critical error. No frame found. Missing: {self.state}")
+            telemetry.event(
+                telemetry.ERROR, "frame_table_missing", sprite="skeleton", state=self.state
+            )
 
     def change_status(self, player_position: pygame.math.Vector2) -> None:
         if not self.timers["hit_timer"].active:
@@ -72,60 +137,81 @@ class Skeleton(pygame.sprite.Sprite):
                 self.current_direction = "left"
             else:
                 self.current_direction = "right"
-            self.state = f"move_{self.current_direction}"
+            self.state = get_state("move", self.current_direction)
 
     def damage_player_if_close(self, player: Player):
-        distance = pygame.math.Vector2(self.rect.center).distance_to(player.rect.center)
-        if distance < 20: 
+        if distance_squared(self.rect, player.rect) < 20 * 20:
             if not self.timers["damage_timer"].active and not self.timers["hit_timer"].active:
                 self.channel.set_volume(0.5)
-                self.channel.play(pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", "hurt.mp3")))
+                self.channel.play(load_sound("hurt.mp3"))
                 player.health -= 20
+                telemetry.count("damage_taken", 20)
                 player.timers["shake_timer"].activate()
                 self.timers["damage_timer"].activate()
                 
-    def take_damage(self, amount: int):
+    def take_damage(self, amount: int) -> bool:
+        """
+        Apply a hit. Returns True if the hit landed.
+        """
         if self.timers["death_timer"].active:
-            return
+            return False
+        landed = False
         if not self.timers["hit_timer"].active:
-            print("take damage")
             self.health -= amount
-            print(self.health)
+            telemetry.event(
+                telemetry.DEBUG,
+                "enemy_hit",
+                enemy="skeleton",
+                damage=amount,
+                health=self.health,
+            )
             self.state = EnemyStates.HIT_RIGHT.value
             self.timers["hit_timer"].activate()
+            landed = True
         if self.health <= 0 and not self.timers["death_timer"].active:
             self.timers["death_timer"].activate()
             direction = get_current_direction(self.state)
-            self.state = f"death_{direction}"
+            self.state = get_state("death", direction)
+        return landed
 
-    def position_calculator(
-        self,
-        delta_time: float,
-        player_position: pygame.math.Vector2,
-        player_state: str,
-    ):
-        # Calculate direction vector toward the player
-        direction_vector = pygame.math.Vector2(player_position) - self.world_position
+    def steer(self, player_position: pygame.math.Vector2, player_state: str) -> bool:
+        """
+        Set velocity_x toward the player. Returns False if the skeleton
+        stands still.
+        """
+        self.velocity_x = 0.0
+        # Calculate direction vector toward the player, reusing one vector
+        direction_vector = self.heading
+        direction_vector.update(player_position)
+        direction_vector -= self.world_position
 
         distance_to_player = direction_vector.length()
         if distance_to_player < 20:
-            return
+            return False
+        if self.timers["hit_timer"].active and self.timers["death_timer"].active:
+            return False
         # Normalize the vector to ensure consistent movement speed
-        if direction_vector.length() != 0:
-            direction_vector = direction_vector.normalize()
+        direction_vector.normalize_ip()
 
         speed_multiplier = 0.5 if get_current_direction(player_state) == "left" else 1.0
+        self.velocity_x = direction_vector.x * self.speed * speed_multiplier
+        return True
 
-        # Move the enemy
-        if not self.timers["hit_timer"].active or not self.timers["death_timer"].active:
-            self.world_position.x += (
-                direction_vector.x * self.speed * delta_time * speed_multiplier
-            )
-            self.rect.center = self.world_position  # type: ignore
+    def position_calculator(
+        self,
+        delta_time: float,
+        player_position: pygame.math.Vector2,
+        player_state: str,
+    ):
+        if self.steer(player_position, player_state):
+            walk(self, delta_time)
 
     def die(self) -> None:
         self.kill()
-        pygame.event.post(pygame.event.Event(pygame.USEREVENT, {"points": 10}))
+        telemetry.count("kills")
+        pygame.event.post(
+            pygame.event.Event(pygame.USEREVENT, {"points": 10, "enemy": "skeleton"})
+        )
 
     def update_timer(self) -> None:
         for timer in self.timers.values():
@@ -144,6 +230,34 @@ class Skeleton(pygame.sprite.Sprite):
 
         if (
             not self.timers["death_timer"].active
-            and self.state.split("_")[0] == "death"
+            and get_current_action(self.state) == "death"
+        ):
+            self.die()
+
+    def update_far(self, player_state: str, delta_time: float):
+        """
+        Cheap update for a skeleton far outside the view: keep it walking
+        and its timers running, but skip animation and state changes.
+        """
+        self.position_calculator(
+            delta_time, self.player_position, player_state
+        )
+        self.update_timer()
+
+        if (
+            not self.timers["death_timer"].active
+            and get_current_action(self.state) == "death"
         ):
             self.die()
+
+
+def think_near(skeleton: Skeleton, player: Player, delta_time: float) -> None:
+    skeleton.update(player.pos, player.state, delta_time)
+    skeleton.damage_player_if_close(player)
+
+
+def think_far(skeleton: Skeleton, player: Player, delta_time: float) -> None:
+    skeleton.update_far(player.state, delta_time)
+
+
+SKELETON_BEHAVIOUR = Behaviour(think_near, think_far, walk)
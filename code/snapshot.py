@@ -0,0 +1,260 @@
+"""
+Compact snapshots of a Scene's simulation state.
+
+A snapshot is a bytes object: a fixed scene header, one struct row for the
+player and for every skeleton and bird, and the global random generator
+state. Everything drawn from that state is not stored: sprite images are
+picked again from the restored animation frames, parallax positions and
+particles are rebuilt on the next frame, and world chunks are generated
+again from the world seed.
+
+Timers are stored as the time elapsed since they were activated, so a
+restored timer resumes where it was instead of expiring immediately.
+"""
+import random
+import struct
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Tuple
+
+from bird import Bird
+from player import Player
+from skeleton import Skeleton
+from timer_counter import Timer, get_ticks
+from utilities import STATE_PARTS
+
+if TYPE_CHECKING:
+    from scene import Scene
+
+MAGIC = b"TT"
+VERSION = 2
+
+STATES: Tuple[str, ...] = tuple(STATE_PARTS)
+STATE_INDEX: Dict[str, int] = {state: index for index, state in enumerate(STATES)}
+DIRECTIONS: Tuple[str, ...] = ("left", "right")
+
+PLAYER_TIMERS = ("tool_use", "weapon_use", "item_switch", "weapon_switch", "shake_timer")
+ENEMY_TIMERS = ("hit_timer", "death_timer", "damage_timer")
+
+# magic, version, score, scroll, camera x, camera y, spawn timer, world seed,
+# waves released up to, skeletons, birds
+SCENE_ROW = struct.Struct("<2sBiddd?iIdHH")
+# pos, direction, gravity, health, state, frame, tool, on ground, shake,
+# rect, timers
+PLAYER_ROW = struct.Struct("<ddffdiHdB?ffiiii" + "?i" * len(PLAYER_TIMERS))
+# world position, rect, speed, health, state, direction, frame, timers
+ENEMY_ROW = struct.Struct("<ddiiiidiHBd" + "?i" * len(ENEMY_TIMERS))
+# generator version, has gauss_next, gauss_next; followed by the state words
+RANDOM_ROW = struct.Struct("<B?d")
+
+
+def _pack_timers(timers: Dict[str, Timer], names: Tuple[str, ...], now: int) -> List:
+    values: List = []
+    for name in names:
+        timer = timers[name]
+        values.append(timer.active)
+        values.append(now - timer.start_time if timer.active else 0)
+    return values
+
+
+def _unpack_timers(timers: Dict[str, Timer], names: Tuple[str, ...], values: tuple, now: int) -> None:
+    for index, name in enumerate(names):
+        timer = timers[name]
+        timer.active = values[index * 2]
+        timer.start_time = now - values[index * 2 + 1] if timer.active else 0
+
+
+def _pack_enemy(enemy, now: int) -> bytes:
+    rect = enemy.rect
+    return ENEMY_ROW.pack(
+        enemy.world_position.x,
+        enemy.world_position.y,
+        rect.x,
+        rect.y,
+        rect.w,
+        rect.h,
+        enemy.speed,
+        enemy.health,
+        STATE_INDEX[enemy.state],
+        DIRECTIONS.index(getattr(enemy, "current_direction", "left")),
+        enemy.current_frame,
+        *_pack_timers(enemy.timers, ENEMY_TIMERS, now),
+    )
+
+
+def _restore_enemy(enemy, row: tuple, now: int) -> None:
+    enemy.world_position.update(row[0], row[1])
+    enemy.rect.update(row[2], row[3], row[4], row[5])
+    enemy.speed = row[6]
+    enemy.health = row[7]
+    enemy.state = STATES[row[8]]
+    if hasattr(enemy, "current_direction"):
+        enemy.current_direction = DIRECTIONS[row[9]]
+    enemy.current_frame = row[10]
+    _unpack_timers(enemy.timers, ENEMY_TIMERS, row[11:], now)
+    # Show the restored frame; sprites are not updated while rewinding
+    enemy.animate(0)
+
+
+def capture(scene: "Scene") -> bytes:
+    """
+    Pack the simulation state of scene into a snapshot.
+    """
+    now = get_ticks()
+    player: Player = scene.player
+    spawn_timer = scene.enemy_spawn_timer
+    parts = [
+        SCENE_ROW.pack(
+            MAGIC,
+            VERSION,
+            scene.score,
+            scene.camera.scroll,
+            scene.camera.offset.x,
+            scene.camera.offset.y,
+            spawn_timer.active,
+            now - spawn_timer.start_time if spawn_timer.active else 0,
+            scene.world.seed,
+            scene.world.released_to,
+            len(scene.skeletons),
+            len(scene.birds),
+        ),
+        PLAYER_ROW.pack(
+            player.pos.x,
+            player.pos.y,
+            player.direction.x,
+            player.direction.y,
+            player.gravity,
+            player.health,
+            STATE_INDEX[player.state],
+            player.current_frame,
+            player.tool_index,
+            player.on_ground,
+            player.shake_offset.x,
+            player.shake_offset.y,
+            player.rect.x,
+            player.rect.y,
+            player.rect.w,
+            player.rect.h,
+            *_pack_timers(player.timers, PLAYER_TIMERS, now),
+        ),
+    ]
+    for skeleton in scene.skeletons:
+        parts.append(_pack_enemy(skeleton, now))
+    for bird in scene.birds:
+        parts.append(_pack_enemy(bird, now))
+
+    version, words, gauss_next = random.getstate()
+    parts.append(RANDOM_ROW.pack(version, gauss_next is not None, gauss_next or 0.0))
+    parts.append(array("I", words).tobytes())
+    return b"".join(parts)
+
+
+def restore(scene: "Scene", data: bytes) -> None:
+    """
+    Put scene back into the state captured in data. Existing enemy sprites
+    are reused; missing ones are created and extra ones removed.
+    """
+    now = get_ticks()
+    header = SCENE_ROW.unpack_from(data, 0)
+    if header[0] != MAGIC or header[1] != VERSION:
+        raise ValueError("Not a snapshot of this game version")
+    offset = SCENE_ROW.size
+    (_, _, score, scroll, camera_x, camera_y,
+     spawn_active, spawn_elapsed, seed, released_to, skeleton_count, bird_count) = header
+    scene.score = score
+    scene.camera.scroll = scroll
+    scene.camera.move_to(camera_x, camera_y)
+    scene.world.restore(seed, released_to, scene.camera.view)
+    scene.enemy_spawn_timer.active = spawn_active
+    scene.enemy_spawn_timer.start_time = now - spawn_elapsed if spawn_active else 0
+
+    row = PLAYER_ROW.unpack_from(data, offset)
+    offset += PLAYER_ROW.size
+    player = scene.player
+    player.pos.update(row[0], row[1])
+    player.direction.update(row[2], row[3])
+    player.gravity = row[4]
+    player.health = row[5]
+    player.state = STATES[row[6]]
+    player.current_frame = row[7]
+    # The restored frame counts as shown: its events do not fire again
+    player.shown_state = player.state
+    player.shown_frame = int(player.current_frame)
+    player.tool_index = row[8]
+    player.selected_tool = player.possible_tools[player.tool_index]
+    player.on_ground = row[9]
+    player.shake_offset.update(row[10], row[11])
+    player.rect.update(row[12], row[13], row[14], row[15])
+    _unpack_timers(player.timers, PLAYER_TIMERS, row[16:], now)
+    player.animate(0)
+
+    existing = scene.skeletons.sprites()
+    for index in range(skeleton_count):
+        row = ENEMY_ROW.unpack_from(data, offset)
+        offset += ENEMY_ROW.size
+        if index < len(existing):
+            skeleton = existing[index]
+        else:
+            skeleton = Skeleton(
+                (0, 0),
+                row[7],
+                scene.skeletons,
+                player.pos,
+                speed=row[6],
+                terrain=scene.world.is_solid,
+            )
+        _restore_enemy(skeleton, row, now)
+    for skeleton in existing[skeleton_count:]:
+        skeleton.kill()
+
+    existing = scene.birds.sprites()
+    for index in range(bird_count):
+        row = ENEMY_ROW.unpack_from(data, offset)
+        offset += ENEMY_ROW.size
+        if index < len(existing):
+            bird = existing[index]
+        else:
+            bird = Bird((0, 0), row[7], scene.birds, speed=row[6])
+        _restore_enemy(bird, row, now)
+    for bird in existing[bird_count:]:
+        bird.kill()
+
+    version, has_gauss, gauss_next = RANDOM_ROW.unpack_from(data, offset)
+    offset += RANDOM_ROW.size
+    words = array("I")
+    words.frombytes(data[offset:])
+    random.setstate((version, tuple(words), gauss_next if has_gauss else None))
+
+
+class RewindBuffer:
+    """
+    Ring buffer of the most recent snapshots, recorded at a fixed rate
+    regardless of the frame rate.
+    """
+
+    def __init__(self, seconds: float, rate: int):
+        self.interval: float = 1 / rate
+        self.snapshots: Deque[bytes] = deque(maxlen=max(1, round(seconds * rate)))
+        self.elapsed: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def record(self, scene: "Scene", delta_time: float) -> None:
+        self.elapsed += delta_time
+        if self.elapsed >= self.interval:
+            self.elapsed %= self.interval
+            self.snapshots.append(capture(scene))
+
+    def step_back(self, scene: "Scene") -> bool:
+        """
+        Restore the newest snapshot and drop it. Returns False when empty.
+        """
+        if not self.snapshots:
+            return False
+        restore(scene, self.snapshots.pop())
+        return True
+
+    def clear(self) -> None:
+        self.snapshots.clear()
+        self.elapsed = 0.0
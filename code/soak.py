@@ -0,0 +1,265 @@
+"""
+Long-running soak test.
+
+Plays bot-driven rounds back to back through the real menu -> round ->
+game over flow, in real time and without a window, and samples memory and
+frame times at intervals:
+
+    python code/soak.py --hours 8 --interval 60 --output soak.jsonl
+
+Each sample records the process RSS, allocated memory blocks, Python object
+counts by type, sprite group and buffer sizes, and frame time percentiles
+since the previous sample. At the end, every metric is compared between
+the first and last third of the samples taken after the warm-up. Any
+metric that grew by more than its tolerance is reported, and the process
+exits with status 1.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import pygame
+from config import ConfigError, load as load_config
+from settings import WINDOW_HEIGHT, WINDOW_WIDTH
+from simulate import POLICIES
+from window import to_window
+
+PLAY_BUTTON: Tuple[int, int] = (683, 350)
+BACK_BUTTON: Tuple[int, int] = (1285, 50)
+# Object types with fewer instances than this are not checked for growth
+MIN_OBJECTS: int = 200
+
+# metric prefix -> (absolute, relative) growth allowed between the first and
+# last third of the samples; the larger of the two applies
+TOLERANCES: Dict[str, Tuple[float, float]] = {
+    "rss_mb": (8.0, 0.05),
+    "blocks": (20000, 0.05),
+    "objects.": (500, 0.10),
+    "sizes.": (5, 0.50),
+    "frame_ms.": (1.0, 0.15),
+}
+
+
+def rss_mb() -> Optional[float]:
+    """
+    Resident set size of this process, or None where it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current, but a leak still shows as growth
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    return samples[int(fraction * (len(samples) - 1))] if samples else 0.0
+
+
+class SoakRunner:
+    def __init__(self, policy: str, max_round_seconds: float, seed: int):
+        import ui
+        from state_manager import StateManager
+        from window import create_window
+        from config import get_config
+
+        # Keep the player's high score untouched by bot rounds
+        ui.save_high_score = lambda high_score: None
+        screen = create_window(get_config())
+        background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.manager = StateManager(screen)
+        self.menu = ui.MainMenu(self.manager, background, 0)
+        self.manager.push(self.menu)
+        self.manager.apply_pending()
+        self.manager.running = True
+        self.policy = POLICIES[policy]
+        self.rng = random.Random(seed)
+        self.max_round_seconds = max_round_seconds
+        self.round_start: float = 0.0
+        self.rounds: int = 0
+        self.in_round: bool = False
+        self.frame_times = array("f")
+
+    def click(self, position: Tuple[int, int]) -> None:
+        """
+        Click at a frame position, as the player would in a scaled window.
+        """
+        pygame.event.post(
+            pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=to_window(position), button=1)
+        )
+
+    def step(self) -> None:
+        manager = self.manager
+        state = manager.current
+        if state is self.menu:
+            self.in_round = False
+            self.click(PLAY_BUTTON)
+        elif self.menu.gameplay is not None and state is self.menu.gameplay:
+            if not self.in_round:
+                # Only rounds that were actually entered count
+                self.in_round = True
+                self.round_start = time.perf_counter()
+                self.rounds += 1
+            self.policy(state.live_scene(), self.rng)
+            if time.perf_counter() - self.round_start > self.max_round_seconds:
+                self.click(BACK_BUTTON)
+        manager.step()
+        self.frame_times.append(manager.pacer.raw_delta * 1000)
+
+    def sample(self) -> Dict[str, Any]:
+        gc.collect()
+        objects = Counter(type(item).__name__ for item in gc.get_objects())
+        # Rare types are left out to keep samples small
+        common = {
+            name: count for name, count in objects.items() if count >= MIN_OBJECTS // 4
+        }
+        sizes: Dict[str, int] = {
+            "stack": len(self.manager.stack),
+            "pending": len(self.manager.pending),
+            "hitches": len(self.manager.pacer.hitches),
+        }
+        gameplay = self.menu.gameplay
+        if gameplay is not None:
+            scene = gameplay.live_scene()
+            sizes.update(
+                all_sprites=len(scene.all_sprites),
+                skeletons=len(scene.skeletons),
+                birds=len(scene.birds),
+                particles=scene.particles.count,
+                ai_waiting=len(scene.ai.waiting),
+                input_presses=len(scene.controls.presses),
+            )
+        samples = sorted(self.frame_times)
+        self.frame_times = array("f")
+        return {
+            "time": round(time.time(), 1),
+            "rounds": self.rounds,
+            "rss_mb": rss_mb(),
+            "blocks": sys.getallocatedblocks(),
+            "objects": common,
+            "sizes": sizes,
+            "frame_ms": {
+                "p50": round(percentile(samples, 0.50), 2),
+                "p95": round(percentile(samples, 0.95), 2),
+                "p99": round(percentile(samples, 0.99), 2),
+            },
+        }
+
+
+def flatten(sample: Dict[str, Any]) -> Dict[str, float]:
+    values: Dict[str, float] = {}
+    for key in ("rss_mb", "blocks"):
+        if sample[key] is not None:
+            values[key] = sample[key]
+    for group in ("objects", "sizes", "frame_ms"):
+        for name, value in sample[group].items():
+            values[f"{group}.{name}"] = value
+    return values
+
+
+def find_trends(samples: List[Dict[str, Any]], warmup: int) -> List[str]:
+    """
+    Return a description of every metric that grew beyond its tolerance
+    between the first and last third of the samples after warmup.
+    """
+    samples = samples[warmup:]
+    if len(samples) < 3:
+        return []
+    third = len(samples) // 3
+    first = [flatten(sample) for sample in samples[:third]]
+    last = [flatten(sample) for sample in samples[-third:]]
+    failures: List[str] = []
+    for name in sorted(set().union(*last)):
+        before = statistics.fmean(sample.get(name, 0) for sample in first)
+        after = statistics.fmean(sample.get(name, 0) for sample in last)
+        if name.startswith("objects.") and after < MIN_OBJECTS:
+            continue
+        absolute, relative = next(
+            tolerance
+            for prefix, tolerance in TOLERANCES.items()
+            if name.startswith(prefix)
+        )
+        if after - before > max(absolute, relative * before):
+            failures.append(f"{name}: {before:.1f} -> {after:.1f}")
+    return failures
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tiny Titan soak test.")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between samples.")
+    parser.add_argument("--warmup", type=int, default=3, help="Samples ignored by the trend check.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="scripted")
+    parser.add_argument("--max-round-seconds", type=float, default=180, help="Leave rounds the bot survives for longer.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="soak.jsonl", help="Samples as JSON lines.")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    try:
+        # Presets and --set overrides work as they do for the game
+        load_config(argv)
+    except ConfigError as error:
+        sys.exit(f"Invalid configuration: {error}")
+    pygame.init()
+    runner = SoakRunner(args.policy, args.max_round_seconds, args.seed)
+    samples: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    end = start + args.hours * 3600
+    next_sample = start + args.interval
+    with open(args.output, "w") as file:
+        while runner.manager.running and time.perf_counter() < end:
+            runner.step()
+            if time.perf_counter() >= next_sample:
+                sample = runner.sample()
+                samples.append(sample)
+                file.write(json.dumps(sample) + "\n")
+                file.flush()
+                print(
+                    f"\r{len(samples)} samples, {runner.rounds} rounds, "
+                    f"RSS {sample['rss_mb'] or 0:.1f} MB, "
+                    f"p95 {sample['frame_ms']['p95']:.1f} ms",
+                    end="",
+                    file=sys.stderr,
+                    flush=True,
+                )
+                # Sampling itself is slow; do not count it as a frame
+                runner.manager.pacer.last_time = None
+                next_sample = time.perf_counter() + args.interval
+
+    print(file=sys.stderr)
+    if runner.rounds == 0:
+        # Nothing was exercised; do not report a pass
+        print("No rounds were played")
+        sys.exit(1)
+    failures = find_trends(samples, args.warmup)
+    if failures:
+        print("Upward trends detected:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"No upward trends over {len(samples)} samples and {runner.rounds} rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+Live spectator stream over a local TCP socket.
+
+The game publishes what it presents to any number of viewers, e.g. a
+second instance on another display:
+
+    python code/main.py --set spectator_port=8765
+    python code/main.py --spectate 8765
+
+The game thread only copies the frame's pixels, at most SPECTATOR_FPS
+times a second, as for captures (see capture.grab). A worker thread
+compares the frame with the previous one in TILE_SIZE squares and sends
+the squares that changed, as RGB, zlib-compressed. A viewer that connects
+gets the whole frame first, or the first frame shown if it connects
+before the game has shown anything. If the worker or a viewer falls behind,
+frames are skipped; the game never waits for the stream.
+
+Every message is a 4-byte big-endian length followed by a zlib-compressed
+payload: a HELLO_ROW, or a FRAME_ROW followed by a TILE_ROW and the RGB
+rows of each tile.
+"""
+import queue
+import select
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, List, Optional, Set, Tuple
+
+import pygame
+import telemetry
+from capture import Frame, background_priority, grab
+from window import present
+
+SPECTATOR_FPS: int = 15
+TILE_SIZE: int = 64
+HOST: str = "127.0.0.1"
+COMPRESSION: int = 1
+SEND_TIMEOUT: float = 1.0  # s before a stalled viewer is dropped
+
+HELLO = 0
+FRAME = 1
+# kind, frame width, frame height, tile size
+HELLO_ROW = struct.Struct("<BHHH")
+# kind, tile count
+FRAME_ROW = struct.Struct("<BH")
+# tile column, tile row
+TILE_ROW = struct.Struct("<HH")
+LENGTH = struct.Struct(">I")
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    """
+    "PORT" or "HOST:PORT" -> (host, port).
+    """
+    host, _, port = value.rpartition(":")
+    return host or HOST, int(port)
+
+
+def tile_rgb(frame: Frame, column: int, row: int) -> bytes:
+    """
+    The pixels of one tile as packed RGB rows.
+    """
+    width, height = frame.size
+    left = column * TILE_SIZE
+    top = row * TILE_SIZE
+    tile_width = min(TILE_SIZE, width - left)
+    pixels = frame.pixels
+    pitch = frame.pitch
+    start = left * 4
+    end = start + tile_width * 4
+    rows = b"".join(
+        pixels[y * pitch + start : y * pitch + end]
+        for y in range(top, min(top + TILE_SIZE, height))
+    )
+    rgb = bytearray(len(rows) // 4 * 3)
+    for channel, offset in enumerate(frame.offsets):
+        rgb[channel::3] = rows[offset::4]
+    return bytes(rgb)
+
+
+def changed_tiles(previous: Optional[Frame], frame: Frame) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (column, row) of every tile that differs from previous, or of
+    every tile if there is no comparable previous frame.
+    """
+    width, height = frame.size
+    columns = (width + TILE_SIZE - 1) // TILE_SIZE
+    rows = (height + TILE_SIZE - 1) // TILE_SIZE
+    if (
+        previous is None
+        or previous.size != frame.size
+        or previous.pitch != frame.pitch
+    ):
+        for row in range(rows):
+            for column in range(columns):
+                yield column, row
+        return
+    old, new, pitch = previous.pixels, frame.pixels, frame.pitch
+    for row in range(rows):
+        # Whole scanlines first: most of an idle screen is unchanged
+        remaining: Set[int] = set(range(columns))
+        for y in range(row * TILE_SIZE, min((row + 1) * TILE_SIZE, height)):
+            line = y * pitch
+            if old[line : line + pitch] == new[line : line + pitch]:
+                continue
+            for column in list(remaining):
+                start = line + column * TILE_SIZE * 4
+                end = line + min((column + 1) * TILE_SIZE, width) * 4
+                if old[start:end] != new[start:end]:
+                    remaining.discard(column)
+                    yield column, row
+            if not remaining:
+                break
+
+
+def encode_frame(frame: Frame, tiles: List[Tuple[int, int]]) -> bytes:
+    parts = [FRAME_ROW.pack(FRAME, len(tiles))]
+    for column, row in tiles:
+        parts.append(TILE_ROW.pack(column, row))
+        parts.append(tile_rgb(frame, column, row))
+    return _message(b"".join(parts))
+
+
+def _message(payload: bytes) -> bytes:
+    data = zlib.compress(payload, COMPRESSION)
+    return LENGTH.pack(len(data)) + data
+
+
+class SpectatorPublisher:
+    def __init__(self, port: int, host: str = HOST):
+        self.address = (host, port)
+        self.interval: float = 1 / SPECTATOR_FPS
+        self.next_frame: float = 0.0
+        # Latest grabbed frame; None stops the worker
+        self.frames: "queue.Queue[Optional[Frame]]" = queue.Queue(1)
+        self.thread: Optional[threading.Thread] = None
+        self.server: Optional[socket.socket] = None
+        self.viewers: List[socket.socket] = []
+        # Viewers that connected before the first frame
+        self.waiting: List[socket.socket] = []
+        self.previous: Optional[Frame] = None
+        self.dropped: int = 0
+        self.sent_bytes: int = 0
+
+    def start(self) -> None:
+        if self.thread is not None:
+            return
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server.bind(self.address)
+        except OSError as error:
+            server.close()
+            telemetry.event(telemetry.ERROR, "spectator_failed", error=str(error))
+            return
+        server.listen()
+        server.setblocking(False)
+        self.server = server
+        self.thread = threading.Thread(target=self._run, name="spectator", daemon=True)
+        self.thread.start()
+        telemetry.event(telemetry.INFO, "spectator_listening", port=self.address[1])
+
+    def stop(self) -> None:
+        if self.thread is None:
+            return
+        while True:
+            try:
+                self.frames.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                except queue.Empty:
+                    pass
+        self.thread.join()
+        self.thread = None
+
+    def on_frame(self, surface: pygame.Surface) -> None:
+        """
+        Call once per presented frame.
+        """
+        if self.thread is None:
+            return
+        now = time.perf_counter()
+        if now < self.next_frame:
+            return
+        self.next_frame = max(self.next_frame + self.interval, now)
+        try:
+            self.frames.put_nowait(grab(surface))
+        except queue.Full:
+            self.dropped += 1
+            telemetry.count("spectator_dropped")
+
+    def _run(self) -> None:
+        background_priority()
+        server = self.server
+        assert server is not None
+        while True:
+            try:
+                frame = self.frames.get(timeout=0.2)
+            except queue.Empty:
+                # Nothing presented, e.g. on a menu; still let viewers in
+                self._accept(server)
+                continue
+            if frame is None:
+                break
+            self._accept(server)
+            if self.waiting:
+                # No frame was grabbed before, so nobody else is watching yet
+                self.previous = frame
+                for viewer in self.waiting:
+                    self._join(viewer, frame)
+                self.waiting.clear()
+                continue
+            if not self.viewers:
+                self.previous = frame
+                continue
+            tiles = list(changed_tiles(self.previous, frame))
+            self.previous = frame
+            if tiles:
+                self._send(encode_frame(frame, tiles))
+        for viewer in self.viewers + self.waiting:
+            viewer.close()
+        self.viewers.clear()
+        self.waiting.clear()
+        server.close()
+
+    def _accept(self, server: socket.socket) -> None:
+        while True:
+            try:
+                viewer, _ = server.accept()
+            except (BlockingIOError, OSError):
+                return
+            viewer.setblocking(True)
+            viewer.settimeout(SEND_TIMEOUT)
+            viewer.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.previous is None:
+                # Greeted once the first frame arrives
+                self.waiting.append(viewer)
+            else:
+                self._join(viewer, self.previous)
+
+    def _join(self, viewer: socket.socket, frame: Frame) -> None:
+        """
+        Send the frame size and the whole frame, then stream to viewer.
+        """
+        width, height = frame.size
+        greeting = _message(HELLO_ROW.pack(HELLO, width, height, TILE_SIZE))
+        greeting += encode_frame(frame, list(changed_tiles(None, frame)))
+        if self._send_to(viewer, greeting):
+            self.viewers.append(viewer)
+            telemetry.event(telemetry.INFO, "spectator_joined", viewers=len(self.viewers))
+
+    def _send(self, data: bytes) -> None:
+        for viewer in list(self.viewers):
+            if not self._send_to(viewer, data):
+                self.viewers.remove(viewer)
+                telemetry.event(telemetry.INFO, "spectator_left", viewers=len(self.viewers))
+
+    def _send_to(self, viewer: socket.socket, data: bytes) -> bool:
+        try:
+            viewer.sendall(data)
+        except OSError:
+            viewer.close()
+            return False
+        self.sent_bytes += len(data)
+        telemetry.count("spectator_bytes", len(data))
+        return True
+
+
+class SpectatorViewer:
+    """
+    Receives a stream and keeps the latest frame in self.frame.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.address = (host, port)
+        self.connection: Optional[socket.socket] = None
+        self.buffer = bytearray()
+        self.frame: Optional[pygame.Surface] = None
+        self.tile_size: int = TILE_SIZE
+
+    def connect(self) -> bool:
+        try:
+            self.connection = socket.create_connection(self.address, timeout=1.0)
+        except OSError:
+            self.connection = None
+            return False
+        self.buffer.clear()
+        return True
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def poll(self, timeout: float) -> bool:
+        """
+        Read what has arrived within timeout and apply it. Returns True if
+        the frame changed; closes the connection if the game went away.
+        """
+        connection = self.connection
+        if connection is None:
+            return False
+        readable, _, _ = select.select([connection], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = connection.recv(1 << 20)
+        except OSError:
+            data = b""
+        if not data:
+            self.close()
+            return False
+        buffer = self.buffer
+        buffer += data
+        changed = False
+        while len(buffer) >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer)
+            if len(buffer) < LENGTH.size + length:
+                break
+            payload = zlib.decompress(bytes(buffer[LENGTH.size : LENGTH.size + length]))
+            del buffer[: LENGTH.size + length]
+            changed = self._apply(payload) or changed
+        return changed
+
+    def _apply(self, payload: bytes) -> bool:
+        if payload[0] == HELLO:
+            _, width, height, self.tile_size = HELLO_ROW.unpack_from(payload)
+            self.frame = pygame.Surface((width, height))
+            return False
+        frame = self.frame
+        if frame is None:
+            return False
+        _, count = FRAME_ROW.unpack_from(payload)
+        offset = FRAME_ROW.size
+        size = self.tile_size
+        width, height = frame.get_size()
+        blits = []
+        for _ in range(count):
+            column, row = TILE_ROW.unpack_from(payload, offset)
+            offset += TILE_ROW.size
+            tile_width = min(size, width - column * size)
+            tile_height = min(size, height - row * size)
+            end = offset + tile_width * tile_height * 3
+            tile = pygame.image.frombytes(
+                payload[offset:end], (tile_width, tile_height), "RGB"
+            )
+            offset = end
+            blits.append((tile, (column * size, row * size)))
+        frame.blits(blits, doreturn=False)
+        return True
+
+
+def watch(screen: pygame.Surface, address: str) -> None:
+    """
+    Viewer mode: show the stream of the game at address until closed.
+    Reconnects whenever the game restarts.
+    """
+    host, port = parse_address(address)
+    viewer = SpectatorViewer(host, port)
+    pygame.display.set_caption("Tiny Titan - Spectator")
+    font = pygame.font.Font(None, 48)
+    waiting = font.render(f"Waiting for the game on {host}:{port}...", True, "White")
+    dirty = True
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (
+                event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
+            ):
+                running = False
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+                dirty = True
+        if viewer.connection is None and not viewer.connect():
+            screen.fill("black")
+            screen.blit(waiting, waiting.get_rect(center=screen.get_rect().center))
+            present()
+            time.sleep(1)
+            continue
+        # Blocks for at most a frame, so the window stays responsive
+        if viewer.poll(1 / SPECTATOR_FPS) or dirty:
+            if viewer.frame is not None:
+                screen.blit(viewer.frame, (0, 0))
+                present()
+            dirty = False
+    viewer.close()
@@ -0,0 +1,262 @@
+import pygame
+import time
+import assets
+import gc_policy
+import telemetry
+from typing import Callable, List, Optional
+from alloc_profiler import AllocationProfiler
+from capture import CLIP_KEY, SCREENSHOT_KEY, FrameCapture
+from config import get_config
+from frame_pacer import FramePacer
+from settings import BACKGROUND_FRAME_RATE, IDLE_WAIT_MS, MAX_FRAME_RATE
+from spectator import SpectatorPublisher
+from window import has_vsync, present
+
+# Window events after which the window content has to be drawn again
+REDRAW_EVENTS = frozenset(
+    (
+        pygame.WINDOWEXPOSED,
+        pygame.WINDOWRESTORED,
+        pygame.WINDOWSHOWN,
+        pygame.WINDOWSIZECHANGED,
+        pygame.WINDOWFOCUSGAINED,
+    )
+)
+WINDOW_EVENTS = REDRAW_EVENTS | {
+    pygame.WINDOWFOCUSLOST,
+    pygame.WINDOWMINIMIZED,
+    pygame.WINDOWHIDDEN,
+}
+
+
+class GameState:
+    """
+    A screen driven by the StateManager (menu, gameplay, ...).
+
+    States are created once and kept alive, so entering a state again does
+    not reload its assets.
+
+    An event_driven state (e.g. a menu) only changes in response to input.
+    While it is on top, the manager blocks on the event queue instead of
+    running frames, and draws and presents only when the state is dirty.
+    """
+
+    def __init__(self, manager: "StateManager"):
+        self.manager = manager
+        self.event_driven: bool = False
+        self.dirty: bool = True
+
+    def enter(self) -> None:
+        """
+        Called when the state becomes the top of the stack.
+        """
+
+    def exit(self) -> None:
+        """
+        Called when the state stops being the top of the stack.
+        """
+
+    def handle_events(self, events: List[pygame.event.Event]) -> None:
+        pass
+
+    def update(self, delta_time: float) -> None:
+        pass
+
+    def draw(self, screen: pygame.Surface) -> None:
+        pass
+
+    def after_present(self) -> None:
+        """
+        Called right after the frame was flipped to the display.
+        """
+
+
+class StateManager:
+    """
+    Runs a flat main loop over a stack of game states.
+
+    Transitions requested while a frame is running are applied once the
+    frame has been presented, so a state never tears itself down mid-update.
+    """
+
+    def __init__(
+        self,
+        screen: pygame.Surface,
+        frame_rate: Optional[int] = None,
+        profiler: Optional[AllocationProfiler] = None,
+    ):
+        self.screen = screen
+        config = get_config()
+        self.frame_rate = config.frame_cap if frame_rate is None else frame_rate
+        strategy = config.frame_pacing
+        if strategy == "vsync" and not has_vsync():
+            # Flips would not block and the loop would run uncapped
+            strategy = "sleep"
+            if self.frame_rate == 0:
+                # Uncapped presets rely on the display refresh instead
+                self.frame_rate = MAX_FRAME_RATE
+            telemetry.event(
+                telemetry.WARNING,
+                "vsync_unavailable",
+                fallback=strategy,
+                frame_cap=self.frame_rate,
+            )
+        self.pacer = FramePacer(self.frame_rate, strategy, config.hitch_ms)
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.start()
+            # Every traced frame is slow; do not report them all as hitches
+            self.pacer.hitch_ms = float("inf")
+        gc_policy.install(self.pacer)
+        assets.set_budget(config.asset_budget_mb)
+        self.capture = FrameCapture(
+            clip_seconds=config.clip_seconds, budget_mb=config.capture_budget_mb
+        )
+        self.spectator: Optional[SpectatorPublisher] = None
+        if config.spectator_port > 0:
+            self.spectator = SpectatorPublisher(config.spectator_port)
+            self.spectator.start()
+        self.stack: List[GameState] = []
+        self.pending: List[Callable[[], None]] = []
+        self.running: bool = False
+        self.focused: bool = True
+        self.minimized: bool = False
+        # perf_counter time the current frame's events were dequeued
+        self.events_time: float = 0.0
+
+    @property
+    def current(self) -> Optional[GameState]:
+        return self.stack[-1] if self.stack else None
+
+    def push(self, state: GameState) -> None:
+        self.pending.append(lambda: self._push(state))
+
+    def pop(self) -> None:
+        self.pending.append(self._pop)
+
+    def replace(self, state: GameState) -> None:
+        self.pending.append(lambda: self._replace(state))
+
+    def quit(self) -> None:
+        self.running = False
+
+    def _push(self, state: GameState) -> None:
+        if self.stack:
+            self.stack[-1].exit()
+        self.stack.append(state)
+        state.enter()
+
+    def _pop(self) -> None:
+        if self.stack:
+            self.stack.pop().exit()
+        if self.stack:
+            self.stack[-1].enter()
+        else:
+            self.running = False
+
+    def _replace(self, state: GameState) -> None:
+        if self.stack:
+            self.stack.pop().exit()
+        self.stack.append(state)
+        state.enter()
+
+    def apply_pending(self) -> None:
+        if not self.pending:
+            return
+        while self.pending:
+            self.pending.pop(0)()
+        # Drop what the states just left no longer use, if over budget
+        assets.trim()
+
+    def wait_events(self) -> List[pygame.event.Event]:
+        """
+        Block until there is input, or IDLE_WAIT_MS passed, and return it.
+        """
+        first = pygame.event.wait(IDLE_WAIT_MS)
+        events = pygame.event.get()
+        if first.type != pygame.NOEVENT:
+            events.insert(0, first)
+        # The time spent blocked is not a frame
+        self.pacer.last_time = None
+        return events
+
+    def handle_window_event(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.WINDOWFOCUSLOST:
+            self.focused = False
+        elif event.type == pygame.WINDOWFOCUSGAINED:
+            self.focused = True
+        elif event.type in (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN):
+            self.minimized = True
+        elif event.type in (pygame.WINDOWRESTORED, pygame.WINDOWSHOWN):
+            self.minimized = False
+        else:
+            return
+        background = self.minimized or not self.focused
+        self.pacer.throttle(BACKGROUND_FRAME_RATE if background else 0)
+
+    def step(self) -> None:
+        """
+        Run a single frame of the current state.
+        """
+        pacer = self.pacer
+        state = self.current
+        if state is None:
+            self.running = False
+            return
+        if state.event_driven:
+            events = self.wait_events()
+            delta_time = 0.0
+        else:
+            delta_time = pacer.tick()
+            events = pygame.event.get()
+        self.events_time = time.perf_counter()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_frame()
+        with pacer.measure("input"):
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.quit()
+                elif event.type in WINDOW_EVENTS:
+                    self.handle_window_event(event)
+                    if event.type in REDRAW_EVENTS:
+                        state.dirty = True
+                elif event.type == pygame.KEYDOWN:
+                    # The screen still holds the frame the player just saw
+                    if event.key == SCREENSHOT_KEY:
+                        self.capture.screenshot(self.screen)
+                    elif event.key == CLIP_KEY:
+                        self.capture.save_clip()
+            state.handle_events(events)
+        with pacer.measure("update"):
+            state.update(delta_time)
+        # Nothing to show while minimized, nor from an unchanged idle screen
+        if not self.minimized and (state.dirty or not state.event_driven):
+            with pacer.measure("draw"):
+                state.draw(self.screen)
+            with pacer.measure("present"):
+                present()
+            state.dirty = False
+            state.after_present()
+            with pacer.measure("capture"):
+                self.capture.on_frame(self.screen)
+            if self.spectator is not None:
+                with pacer.measure("spectator"):
+                    self.spectator.on_frame(self.screen)
+        with pacer.measure("transition"):
+            self.apply_pending()
+        if profiler is not None:
+            profiler.end_frame()
+
+    def run(self) -> None:
+        self.apply_pending()
+        self.running = True
+        while self.running:
+            self.step()
+        self.capture.stop()
+        if self.spectator is not None:
+            self.spectator.stop()
+        assets.get_registry().log_report()
+        if self.profiler is not None:
+            self.profiler.log_report()
+            self.profiler.stop()
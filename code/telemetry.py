@@ -0,0 +1,227 @@
+"""
+Buffered, rate-limited telemetry.
+
+Game code records events, counters and gauges without doing any I/O:
+
+    telemetry.event(telemetry.DEBUG, "enemy_spawned", enemy="bird")
+    telemetry.count("kills")
+    telemetry.gauge("enemies", 4)
+
+Events go into a ring buffer that a background thread drains every
+flush_interval seconds. The thread writes them as JSON lines, followed by
+a metrics line with the counters, their rate per second and the latest
+gauges, and echoes events at echo_level and above to the logging module.
+Until start() is called, or for events below the level, every call
+returns right away.
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, TextIO, Tuple
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+DISABLED = logging.CRITICAL + 10
+
+LEVEL_NAMES: Dict[str, int] = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR,
+    "off": DISABLED,
+}
+
+logger = logging.getLogger("tiny_titan")
+
+# (wall time, level, name, fields)
+Record = Tuple[float, int, str, Dict[str, Any]]
+
+
+class Telemetry:
+    """
+    The game thread only appends to a deque and updates dicts, which are
+    atomic under the GIL, so recording never waits on a lock or the disk.
+    When the buffer is full the oldest events are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 4096,
+        flush_interval: float = 1.0,
+        rate_limit: float = 20.0,
+    ):
+        self.level: int = DISABLED
+        self.echo_level: int = WARNING
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        # Events per second allowed for each event name, with an equal burst
+        self.rate_limit = rate_limit
+        self.rate_limits: Dict[str, float] = {}
+        self.buffer: Deque[Record] = deque(maxlen=capacity)
+        # name -> [tokens, last refill time, suppressed since last event]
+        self.buckets: Dict[str, List[float]] = {}
+        self.dropped: int = 0
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.last_counters: Dict[str, int] = {}
+        self.last_metrics_time: float = 0.0
+        self.path: Optional[str] = None
+        self.file: Optional[TextIO] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None
+
+    def set_rate_limit(self, name: str, per_second: float) -> None:
+        self.rate_limits[name] = per_second
+
+    def event(self, level: int, name: str, fields: Dict[str, Any]) -> None:
+        if level < self.level:
+            return
+        now = time.monotonic()
+        bucket = self.buckets.get(name)
+        limit = self.rate_limits.get(name, self.rate_limit)
+        if bucket is None:
+            bucket = self.buckets[name] = [limit, now, 0]
+        else:
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return
+        bucket[0] -= 1
+        if bucket[2]:
+            fields["suppressed"] = bucket[2]
+            bucket[2] = 0
+        if len(self.buffer) == self.capacity:
+            self.dropped += 1
+        self.buffer.append((time.time(), level, name, fields))
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.thread is not None:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, value: float) -> None:
+        if self.thread is not None:
+            self.gauges[name] = value
+
+    def start(
+        self,
+        level: int = WARNING,
+        path: Optional[str] = None,
+        echo_level: int = WARNING,
+    ) -> None:
+        if self.thread is not None:
+            self.stop()
+        self.level = level
+        self.echo_level = echo_level
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8") if path else None
+        self.last_metrics_time = time.monotonic()
+        self.stopping.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="telemetry", daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """
+        Stop recording, flush everything buffered and close the file.
+        """
+        if self.thread is None:
+            return
+        self.level = DISABLED
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        atexit.unregister(self.stop)
+
+    def _run(self) -> None:
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        lines: List[str] = []
+        buffer = self.buffer
+        while buffer:
+            timestamp, level, name, fields = buffer.popleft()
+            if level >= self.echo_level:
+                logger.log(level, "%s %s", name, fields)
+            if self.file is not None:
+                record = {
+                    "time": round(timestamp, 3),
+                    "level": logging.getLevelName(level),
+                    "event": name,
+                }
+                record.update(fields)
+                lines.append(json.dumps(record, default=str))
+        if self.file is not None:
+            lines.append(json.dumps(self._metrics(), default=str))
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+
+    def _metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = max(now - self.last_metrics_time, 1e-9)
+        self.last_metrics_time = now
+        counters = dict(self.counters)
+        rates = {
+            name: round((value - self.last_counters.get(name, 0)) / elapsed, 3)
+            for name, value in counters.items()
+        }
+        self.last_counters = counters
+        return {
+            "time": round(time.time(), 3),
+            "event": "metrics",
+            "counters": counters,
+            "rates": rates,
+            "gauges": dict(self.gauges),
+            "dropped": self.dropped,
+        }
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def enabled(level: int) -> bool:
+    """
+    Guard for call sites that would do work just to build an event.
+    """
+    return level >= _telemetry.level
+
+
+def event(level: int, name: str, **fields: Any) -> None:
+    if level >= _telemetry.level:
+        _telemetry.event(level, name, fields)
+
+
+def count(name: str, amount: int = 1) -> None:
+    _telemetry.count(name, amount)
+
+
+def gauge(name: str, value: float) -> None:
+    _telemetry.gauge(name, value)
+
+
+def start(level: int = WARNING, path: Optional[str] = None, echo_level: int = WARNING) -> None:
+    _telemetry.start(level, path, echo_level)
+
+
+def stop() -> None:
+    _telemetry.stop()
@@ -0,0 +1,119 @@
+"""
+Static collision tiles and swept box movement.
+
+The world above the floor is a grid of TILE_SIZE cells, TILE_ROWS high,
+whose bottom edge is the floor the player walks on. Each world chunk
+stores its part of the grid as one byte per cell (see world.py); every
+row at or below the floor counts as solid, so the floor needs no tiles.
+
+Bodies move one axis at a time. A move only checks the cells between
+where the body's leading edge is and where it would end up, so the cost
+of a move depends on its length, never on the size of the level.
+"""
+import math
+from typing import Callable, Tuple
+
+import pygame
+from settings import COLOR_PALETTE, GROUND_LEVEL
+
+TILE_SIZE: int = 32
+TILE_ROWS: int = 6
+# Feet of the player and skeletons are this far below their center
+FOOT_OFFSET: int = 45
+FLOOR_Y: int = GROUND_LEVEL + FOOT_OFFSET
+GRID_TOP: int = FLOOR_Y - TILE_ROWS * TILE_SIZE
+# Collision box of the player and skeletons, narrower and shorter than the
+# sprite so that bodies fit under ledges
+BODY_SIZE: Tuple[int, int] = (40, 64)
+
+EMPTY = 0
+BLOCK = 1  # obstacle standing on the floor
+LEDGE = 2  # floating platform
+
+# (column, row) -> whether the cell is solid
+Solid = Callable[[int, int], bool]
+
+
+def flat(column: int, row: int) -> bool:
+    """
+    Terrain with nothing but the floor.
+    """
+    return row >= TILE_ROWS
+
+
+def load_tiles() -> Tuple[pygame.Surface, ...]:
+    """
+    Tile images indexed by cell value; EMPTY has none.
+    """
+    block = pygame.Surface((TILE_SIZE, TILE_SIZE))
+    block.fill(COLOR_PALETTE[2])
+    pygame.draw.rect(block, COLOR_PALETTE[1], (2, 2, TILE_SIZE - 4, TILE_SIZE - 4))
+    pygame.draw.line(block, COLOR_PALETTE[4], (2, 2), (TILE_SIZE - 3, 2), 2)
+
+    ledge = pygame.Surface((TILE_SIZE, TILE_SIZE))
+    ledge.fill(COLOR_PALETTE[2])
+    pygame.draw.rect(ledge, COLOR_PALETTE[4], (0, 0, TILE_SIZE, 8))
+    pygame.draw.rect(ledge, COLOR_PALETTE[1], (2, 10, TILE_SIZE - 4, TILE_SIZE - 12))
+    return (pygame.Surface((0, 0)), block, ledge)
+
+
+def _rows(top: float, height: float) -> range:
+    return range(
+        math.floor((top - GRID_TOP) / TILE_SIZE),
+        math.ceil((top + height - GRID_TOP) / TILE_SIZE),
+    )
+
+
+def _columns(left: float, width: float) -> range:
+    return range(
+        math.floor(left / TILE_SIZE), math.ceil((left + width) / TILE_SIZE)
+    )
+
+
+def sweep_x(
+    left: float, top: float, width: float, height: float, dx: float, solid: Solid
+) -> Tuple[float, bool]:
+    """
+    Move a box horizontally by dx. Returns its new left edge and whether a
+    solid cell stopped it.
+    """
+    if dx == 0:
+        return left, False
+    rows = _rows(top, height)
+    if dx > 0:
+        edge = left + width
+        for column in range(math.floor(edge / TILE_SIZE), math.ceil((edge + dx) / TILE_SIZE)):
+            for row in rows:
+                if solid(column, row):
+                    return column * TILE_SIZE - width, True
+    else:
+        for column in range(math.ceil(left / TILE_SIZE) - 1, math.floor((left + dx) / TILE_SIZE) - 1, -1):
+            for row in rows:
+                if solid(column, row):
+                    return (column + 1) * TILE_SIZE, True
+    return left + dx, False
+
+
+def sweep_y(
+    left: float, top: float, width: float, height: float, dy: float, solid: Solid
+) -> Tuple[float, bool]:
+    """
+    Move a box vertically by dy. Returns its new top edge and whether a
+    solid cell (or the floor) stopped it.
+    """
+    if dy == 0:
+        return top, False
+    columns = _columns(left, width)
+    if dy > 0:
+        edge = top + height - GRID_TOP
+        for row in range(math.floor(edge / TILE_SIZE), math.ceil((edge + dy) / TILE_SIZE)):
+            for column in columns:
+                if solid(column, row):
+                    return GRID_TOP + row * TILE_SIZE - height, True
+    else:
+        edge = top - GRID_TOP
+        for row in range(math.ceil(edge / TILE_SIZE) - 1, math.floor((edge + dy) / TILE_SIZE) - 1, -1):
+            for column in columns:
+                if solid(column, row):
+                    return GRID_TOP + (row + 1) * TILE_SIZE, True
+    return top + dy, False
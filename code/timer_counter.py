@@ -1,4 +1,19 @@
 import pygame
+from typing import Callable
+
+# Source of the current time in milliseconds. Headless simulations swap it
+# for a virtual clock so rounds can run faster than real time.
+_clock: Callable[[], int] = pygame.time.get_ticks
+
+
+def set_clock(clock: Callable[[], int]) -> None:
+    global _clock
+    _clock = clock
+
+
+def get_ticks() -> int:
+    return _clock()
+
 
 class Timer:
     def __init__(self, duration, func=None):
@@ -9,15 +24,23 @@ class Timer:
 
     def activate(self):
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = get_ticks()
     
     def deactivate(self):
         self.active = False
         self.start_time = 0
+
+    def elapsed(self) -> int:
+        """
+        Milliseconds since the timer was activated, 0 if it is not running.
+        """
+        return get_ticks() - self.start_time if self.active else 0
         
     def update(self):
-        current_time = pygame.time.get_ticks()
+        if not self.active:
+            return
+        current_time = get_ticks()
         if current_time - self.start_time >= self.duration:
             self.deactivate()
             if self.func:
-                self.func()
\ No newline at end of file
+                self.func()
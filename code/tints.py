@@ -0,0 +1,77 @@
+"""
+Tinted variants of animation frames for hit and damage feedback.
+
+Each variant of a frame table is built once, when the table is loaded, with
+one BLEND_RGB fill per frame. Sprites then switch tables by variant index,
+so showing an effect costs no copying or filling while the game runs.
+With the tint_effects setting off, every variant is the normal table.
+"""
+from typing import Dict, Iterable, List
+
+import pygame
+from config import get_config
+
+NORMAL = 0
+FLASH = 1  # white, on the first moments of a hit
+DAMAGE = 2  # red, while the player is shaken by a hit
+LOW_HEALTH = 3  # pale red, pulsing while the player is close to dying
+
+# variant -> (fill color, blend flag). RGB blends leave alpha untouched.
+TINTS: Dict[int, tuple] = {
+    FLASH: ((255, 255, 255), pygame.BLEND_RGB_MAX),
+    DAMAGE: ((255, 90, 90), pygame.BLEND_RGB_MULT),
+    LOW_HEALTH: ((255, 170, 170), pygame.BLEND_RGB_MULT),
+}
+
+FrameTable = Dict[str, List[pygame.Surface]]
+
+
+def tint(surface: pygame.Surface, variant: int) -> pygame.Surface:
+    tinted = surface.copy()
+    color, flag = TINTS[variant]
+    tinted.fill(color, special_flags=flag)
+    return tinted
+
+
+def _tint_list(
+    frames: List[pygame.Surface], variant: int, done: Dict[int, pygame.Surface]
+) -> List[pygame.Surface]:
+    tinted: List[pygame.Surface] = []
+    for frame in frames:
+        # A frame repeated in the table (e.g. the jump frame) is tinted once
+        copy = done.get(id(frame))
+        if copy is None:
+            copy = done[id(frame)] = tint(frame, variant)
+        tinted.append(copy)
+    return tinted
+
+
+def frame_variants(frames: FrameTable, variants: Iterable[int]) -> List[FrameTable]:
+    """
+    Return frame tables indexed by variant. Variants that were not asked
+    for share the normal table.
+    """
+    tables: List[FrameTable] = [frames] * (max(TINTS) + 1)
+    if not get_config().tint_effects:
+        return tables
+    for variant in variants:
+        done: Dict[int, pygame.Surface] = {}
+        tables[variant] = {
+            state: _tint_list(state_frames, variant, done)
+            for state, state_frames in frames.items()
+        }
+    return tables
+
+
+def list_variants(
+    frames: List[pygame.Surface], variants: Iterable[int]
+) -> List[List[pygame.Surface]]:
+    """
+    frame_variants() for a plain list of frames.
+    """
+    tables: List[List[pygame.Surface]] = [frames] * (max(TINTS) + 1)
+    if not get_config().tint_effects:
+        return tables
+    for variant in variants:
+        tables[variant] = _tint_list(frames, variant, {})
+    return tables
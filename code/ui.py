@@ -1,72 +1,220 @@
 import pygame
 import os
 import sys
+import time
+import assets
+import gc_policy
+import round_metrics
+from typing import Any, Dict, List, Optional, Tuple
+from alloc_profiler import AllocationProfiler
+from assets import cached
 from button import Button
-from settings import CENTER_SCREEN, COLOR_PALETTE, MAX_FRAME_RATE, WINDOW_HEIGHT
-from utilities import get_font, load_high_score, save_high_score, RESOURCES_PATH
-from scene import Scene
-from player import Player
+from config import get_config
+from pipeline import SimulationPipeline
+from settings import CENTER_SCREEN, COLOR_PALETTE
+from utilities import CachedText, get_font, load_high_score, save_high_score, RESOURCES_PATH
+from scene import RenderFrame, Scene
+from state_manager import GameState, StateManager
+from window import mouse_position, to_frame
 
 button_background: pygame.Surface = pygame.image.load(
 os.path.join(RESOURCES_PATH, "button", "button_background.png")
 )
 button_background = pygame.transform.scale_by(button_background, 0.4)
 
-def play(screen: pygame.Surface, background: pygame.Surface, score: int) -> None:
-    clock = pygame.time.Clock()
-    scene = Scene(score)
-    while True:
-        delta_time = clock.tick(MAX_FRAME_RATE) / 1000
-        mouse_pos = pygame.mouse.get_pos()
-        pygame.display.set_caption("Tiny Titan")
-        screen.fill("black")
 
+def load_menu_background() -> pygame.Surface:
+    return pygame.image.load(
+        os.path.join(RESOURCES_PATH, "background", "background_misty_rocks.png")
+    ).convert()
 
-        scene.run(delta_time)
-        button_background: pygame.Surface = pygame.image.load(
-            os.path.join(RESOURCES_PATH, "button", "button_background.png")
-        )
-        button_background = pygame.transform.scale_by(button_background, 0.2)
-        play_back = Button(
-            button_background, (1285, 50), "BACK", get_font(40), "White", "Red", False
+
+class Gameplay(GameState):
+    """
+    A round of the game. The Scene is built once and reset for every round.
+
+    With the pipelined setting, the scene is simulated on a worker thread
+    one tick ahead and drawn from its RenderFrame snapshots. Code outside
+    the state's own methods gets the scene through live_scene().
+    """
+
+    def __init__(self, manager: StateManager):
+        super().__init__(manager)
+        self.scene = Scene(0)
+        self.scene.pacer = manager.pacer
+        # Freeze the freshly loaded assets out of future collections
+        gc_policy.settle()
+        self.round_over: bool = False
+        self.round_start: float = 0.0
+        # Asset cache lookups before the round, to report the round's own
+        self.asset_lookups: Tuple[int, int] = (0, 0)
+        self.events: List[pygame.event.Event] = []
+        self.events_time: float = 0.0
+        self.pipeline: Optional[SimulationPipeline] = None
+        if get_config().pipelined:
+            self.pipeline = SimulationPipeline(self.simulate, self.scene.render_frame())
+        back_background = pygame.transform.scale_by(button_background, 0.5)
+        self.play_back = Button(
+            back_background, (1285, 50), "BACK", get_font(40), "White", "Red", False
         )
-        play_back.changeColor(mouse_pos)
-        play_back.update(screen)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+    def enter(self) -> None:
+        pygame.display.set_caption("Tiny Titan")
+        if self.pipeline is not None:
+            self.pipeline.sync()
+        self.scene.reset()
+        if self.pipeline is not None:
+            self.pipeline.reset(self.scene.render_frame())
+            self.pipeline.start()
+        self.manager.pacer.reset_stats()
+        gc_policy.gameplay()
+        self.round_over = False
+        self.round_start = time.perf_counter()
+        registry = assets.get_registry()
+        self.asset_lookups = (registry.hits, registry.misses)
+
+    def exit(self) -> None:
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def live_scene(self) -> Scene:
+        """
+        The scene, once no pipelined tick is changing it.
+        """
+        if self.pipeline is not None:
+            self.pipeline.sync()
+        return self.scene
+
+    def end_round(self) -> None:
+        if self.round_over:
+            return
+        self.round_over = True
+        if self.pipeline is not None:
+            # The worker may still be scoring the last tick
+            self.pipeline.sync()
+        save_high_score(self.scene.high_score)
+        round_metrics.append(self.round_record())
+        self.manager.pop()
+
+    def round_record(self) -> Dict[str, Any]:
+        """
+        The metrics of the round that just ended, see round_metrics.py.
+        """
+        config = get_config()
+        pacer = self.manager.pacer
+        frame_ms = pacer.percentiles()
+        collections, total, longest = gc_policy.get_policy().round_pauses
+        registry = assets.get_registry()
+        hits = registry.hits - self.asset_lookups[0]
+        misses = registry.misses - self.asset_lookups[1]
+        return {
+            "time": round(time.time(), 3),
+            "preset": config.preset,
+            "max_enemies": config.max_enemies,
+            "seconds": round(time.perf_counter() - self.round_start, 2),
+            "died": self.scene.player.health <= 0,
+            "score": self.scene.score,
+            "frame_ms": {
+                key: round(frame_ms[key], 2) for key in ("p50", "p95", "p99", "max")
+            },
+            "fps": round(frame_ms["fps"], 1),
+            "hitches": len(pacer.hitches),
+            **self.scene.metrics.counts(),
+            "gc": {
+                "collections": collections,
+                "total_ms": round(total * 1000, 2),
+                "longest_ms": round(longest * 1000, 2),
+            },
+            "assets": {"hits": hits, "misses": misses},
+        }
+
+    def handle_events(self, events: List[pygame.event.Event]) -> None:
+        for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if play_back.check_input(mouse_pos):
-                    save_high_score(scene.high_score)
-                    main_menu(screen, background, scene.score)
+                if self.play_back.check_input(to_frame(event.pos)):
+                    self.end_round()
+        if self.pipeline is not None:
+            # Handed to the worker with the next tick
+            self.events = events
+            self.events_time = self.manager.events_time
+            return
+        self.apply_events(events, self.manager.events_time)
+
+    def apply_events(self, events: List[pygame.event.Event], events_time: float) -> None:
+        # Feed input before simulating so this frame already reacts to it
+        self.scene.controls.process_events(events, events_time)
+        for event in events:
             if event.type == pygame.USEREVENT:
-                scene.score += event.points
-        if scene.player.health <= 0:
-            save_high_score(scene.high_score)
-            main_menu(screen, background, scene.score)
-        pygame.display.update()
+                self.scene.score += event.points
+                self.scene.metrics.killed(event.enemy)
 
+    def simulate(
+        self, delta_time: float, events: List[pygame.event.Event], events_time: float
+    ) -> RenderFrame:
+        """
+        One pipelined tick, run on the worker thread.
+        """
+        # The tick before this one has been presented by now, give or take
+        # a frame, so input latency is approximate in pipelined mode
+        self.scene.controls.mark_presented()
+        self.apply_events(events, events_time)
+        self.scene.run(delta_time, draw=False)
+        return self.scene.render_frame()
 
-def main_menu(screen: pygame.Surface, background: pygame.Surface, score: int) -> None:
-    high_score = load_high_score()
-    high_score = max(high_score, score)  # Update high score if the current score is higher
-    while True:
-        pygame.display.set_caption("Tiny Titan")
-        screen.blit(background, (0, 0))
-        mouse_pos = pygame.mouse.get_pos()
+    def update(self, delta_time: float) -> None:
+        if self.pipeline is not None:
+            if self.round_over:
+                return
+            self.pipeline.submit(delta_time, self.events, self.events_time)
+            if self.pipeline.latest().health <= 0:
+                self.end_round()
+            return
+        self.manager.screen.fill("black")
+        self.scene.run(delta_time)
+        if self.scene.player.health <= 0:
+            self.end_round()
+
+    def draw(self, screen: pygame.Surface) -> None:
+        if self.pipeline is not None:
+            screen.fill("black")
+            self.scene.render(self.pipeline.latest())
+        self.play_back.changeColor(mouse_position())
+        self.play_back.update(screen)
+
+    def after_present(self) -> None:
+        if self.pipeline is None:
+            self.scene.controls.mark_presented()
+
+
+class MainMenu(GameState):
+    """
+    Title screen. It is redrawn only when the hovered button changes, on
+    clicks and when the window needs it, so an idle menu uses no CPU.
+
+    Without a background of its own, the menu art is looked up in the asset
+    cache on every draw, so it can be dropped during play when over budget.
+    """
+
+    def __init__(
+        self,
+        manager: StateManager,
+        background: Optional[pygame.Surface] = None,
+        score: int = 0,
+    ):
+        super().__init__(manager)
+        self.event_driven = True
+        self.background = background
+        self.gameplay: Optional[Gameplay] = None
+        self.high_score: int = max(load_high_score(), score)
         menu_font = pygame.font.Font(
             os.path.join(RESOURCES_PATH, "fonts", "gumball.ttf"), 100
         )
-        menu_text = menu_font.render("TINY TITAN", False, COLOR_PALETTE[5])
-        menu_rect = menu_text.get_rect(center=(CENTER_SCREEN[0], 100))
-        
-        score_text = get_font(50).render(f"High Score: {high_score}", False, COLOR_PALETTE[4])
-        score_rect = score_text.get_rect(center=(CENTER_SCREEN[0], 200))
-
-
-        play_button = Button(
+        self.menu_text = menu_font.render("TINY TITAN", False, COLOR_PALETTE[5])
+        self.menu_rect = self.menu_text.get_rect(center=(CENTER_SCREEN[0], 100))
+        self.score_text = CachedText(
+            50, "High Score: {}", False, COLOR_PALETTE[4], center=(CENTER_SCREEN[0], 200)
+        )
+        self.play_button = Button(
             button_background,
             (683, 350),
             "PLAY",
@@ -75,8 +223,7 @@ def main_menu(screen: pygame.Surface, background: pygame.Surface, score: int) ->
             COLOR_PALETTE[4],
             False,
         )
-
-        quit_button = Button(
+        self.quit_button = Button(
             button_background,
             (683, 520),
             "QUIT",
@@ -85,23 +232,65 @@ def main_menu(screen: pygame.Surface, background: pygame.Surface, score: int) ->
             COLOR_PALETTE[4],
             False,
         )
+        self.hovered: Optional[Button] = None
 
-        screen.blit(menu_text, menu_rect)
-        screen.blit(score_text, score_rect)
+    def enter(self) -> None:
+        pygame.display.set_caption("Tiny Titan")
+        self.dirty = True
+        # Nobody notices a pause on the menu
+        gc_policy.idle()
+        if self.gameplay is not None:
+            # Update high score if the last round beat it
+            self.high_score = max(
+                load_high_score(), self.high_score, self.gameplay.scene.score
+            )
+
+    def hovered_button(self, position: Tuple[int, int]) -> Optional[Button]:
+        for button in (self.play_button, self.quit_button):
+            if button.check_input(position):
+                return button
+        return None
+
+    def handle_events(self, events: List[pygame.event.Event]) -> None:
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                hovered = self.hovered_button(to_frame(event.pos))
+                if hovered is not self.hovered:
+                    self.hovered = hovered
+                    self.dirty = True
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.dirty = True
+                if self.play_button.check_input(to_frame(event.pos)):
+                    if self.gameplay is None:
+                        self.gameplay = Gameplay(self.manager)
+                    self.manager.push(self.gameplay)
+                if self.quit_button.check_input(to_frame(event.pos)):
+                    self.manager.quit()
 
-        for button in [play_button, quit_button]:
+    def draw(self, screen: pygame.Surface) -> None:
+        background = self.background
+        if background is None:
+            background = cached("menu.background", load_menu_background)
+        screen.blit(background, (0, 0))
+        mouse_pos = mouse_position()
+        score_text = self.score_text.update(self.high_score)
+
+        screen.blit(self.menu_text, self.menu_rect)
+        screen.blit(score_text, self.score_text.rect)
+
+        for button in (self.play_button, self.quit_button):
             button.changeColor(mouse_pos)
             button.update(screen)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if play_button.check_input(mouse_pos):
-                    play(screen, background, score)
-                if quit_button.check_input(mouse_pos):
-                    pygame.quit()
-                    sys.exit()
 
-        pygame.display.update()
+def main_menu(
+    screen: pygame.Surface,
+    background: Optional[pygame.Surface],
+    score: int,
+    profiler: Optional[AllocationProfiler] = None,
+) -> None:
+    manager = StateManager(screen, profiler=profiler)
+    manager.push(MainMenu(manager, background, score))
+    manager.run()
+    pygame.quit()
+    sys.exit()
@@ -1,9 +1,11 @@
+import math
 import os
 import sys
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import pygame
-from settings import GROUND_LEVEL
+from assets import cached
+from settings import GROUND_LEVEL, EnemyStates, PlayerStates
 
 
 def _get_base_paths():
@@ -27,19 +29,206 @@ def _get_base_paths():
 BASE_GAME_PATH, RESOURCES_PATH = _get_base_paths()
 
 
+_fonts: Dict[int, pygame.font.Font] = {}
+
+
 def get_font(size: int) -> pygame.font.Font:
-    return pygame.font.Font(
-        os.path.join(RESOURCES_PATH, "fonts", "VCR_OSD_MONO_1.ttf"), size
+    font = _fonts.get(size)
+    if font is None:
+        font = _fonts[size] = pygame.font.Font(
+            os.path.join(RESOURCES_PATH, "fonts", "VCR_OSD_MONO_1.ttf"), size
+        )
+    return font
+
+
+class CachedText:
+    """
+    Text rendered from a template, only re-rendered when its value changes.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        template: str,
+        antialias: bool,
+        color,
+        center: Optional[Tuple[int, int]] = None,
+    ):
+        self.size = size
+        self.template = template
+        self.antialias = antialias
+        self.color = color
+        self.center = center
+        self.value: Any = None
+        self.surface: pygame.Surface = pygame.Surface((0, 0))
+        self.rect: pygame.Rect = self.surface.get_rect()
+
+    def update(self, value: Any) -> pygame.Surface:
+        if value != self.value or self.value is None:
+            self.value = value
+            self.surface = get_font(self.size).render(
+                self.template.format(value), self.antialias, self.color
+            )
+            if self.center is None:
+                self.rect = self.surface.get_rect()
+            else:
+                self.rect = self.surface.get_rect(center=self.center)
+        return self.surface
+
+
+def load_sound(name: str) -> pygame.mixer.Sound:
+    """
+    Load a sound from resources/audio once and share it afterwards.
+    """
+    return cached(
+        f"audio/{name}",
+        lambda: pygame.mixer.Sound(os.path.join(RESOURCES_PATH, "audio", name)),
+    )
+
+
+def _converted(surface: pygame.Surface) -> pygame.Surface:
+    """
+    Match the display's pixel format, when there is a display, so blits
+    take the fast path.
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert_alpha()
+
+
+def _centered(left: float, right: float, size: int) -> Tuple[int, int]:
+    """
+    The span around the middle of size that holds left to right.
+    """
+    margin = max(0, min(math.floor(left), size - math.ceil(right)))
+    return margin, size - 2 * margin
+
+
+def trim_box(frames: List[pygame.Surface], scale: float = 1) -> pygame.Rect:
+    """
+    The smallest box that holds the visible pixels of every frame and has
+    the same center as the frames, so a sprite placed by its rect center
+    stays where it was when its frames are cut to it. With scale, the
+    frames are measured unscaled and the box is for frames scaled by it,
+    which is much cheaper than measuring the scaled frames.
+    """
+    width, height = frames[0].get_size()
+    bounds: Optional[pygame.Rect] = None
+    for frame in frames:
+        visible = frame.get_bounding_rect()
+        if visible.width and visible.height:
+            bounds = visible if bounds is None else bounds.union(visible)
+    width, height = int(width * scale), int(height * scale)
+    if bounds is None:
+        return pygame.Rect(0, 0, width, height)
+    # A pixel of slack for the rounding of edges scaled by a fraction
+    slack = 0 if scale == int(scale) else 1
+    x, box_width = _centered(
+        bounds.left * scale - slack, bounds.right * scale + slack, width
     )
+    y, box_height = _centered(
+        bounds.top * scale - slack, bounds.bottom * scale + slack, height
+    )
+    return pygame.Rect(x, y, box_width, box_height)
 
 
-def flip_helper_vertical(
-    frames: List[pygame.Surface], range: tuple[int, int]
+def trim_clip(
+    frames: List[pygame.Surface], box: Optional[pygame.Rect] = None
 ) -> List[pygame.Surface]:
-    return [
-        pygame.transform.flip(frame, True, False)
-        for frame in frames[range[0]: range[1]]
-    ]
+    """
+    Copies of frames cut to box, by default their trim_box().
+    """
+    if box is None:
+        box = trim_box(frames)
+    return [frame.subsurface(box).copy() for frame in frames]
+
+
+class SpriteSheet:
+    """
+    A grid of frames, numbered row by row. Each row of the sheet is scaled
+    as one strip, once, the first time a frame of it is needed, and that
+    strip is mirrored once for left-facing clips: mirroring a strip mirrors
+    every cell in place and reverses the order of the columns.
+    """
+
+    def __init__(
+        self,
+        sheet: pygame.Surface,
+        frame_width: int,
+        frame_height: int,
+        resize_factor: float = 1,
+    ):
+        self.columns: int = sheet.get_width() // frame_width
+        self.rows: int = sheet.get_height() // frame_height
+        self.source: pygame.Surface = _converted(sheet)
+        self.source_size: Tuple[int, int] = (frame_width, frame_height)
+        self.resized: bool = resize_factor > 1
+        if self.resized:
+            frame_width = int(frame_width * resize_factor)
+            frame_height = int(frame_height * resize_factor)
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        # (row, mirrored) -> strip of scaled cells
+        self.strips: Dict[Tuple[int, bool], pygame.Surface] = {}
+        # (start, end) -> trim box of the clip, the same for both directions
+        self.boxes: Dict[Tuple[int, int], pygame.Rect] = {}
+
+    @property
+    def count(self) -> int:
+        return self.columns * self.rows
+
+    def strip(self, row: int, mirrored: bool = False) -> pygame.Surface:
+        strip = self.strips.get((row, mirrored))
+        if strip is None:
+            if mirrored:
+                strip = pygame.transform.flip(self.strip(row), True, False)
+            else:
+                width, height = self.source_size
+                # Only whole cells, so scaling maps every cell onto whole pixels
+                strip = self.source.subsurface(
+                    (0, row * height, self.columns * width, height)
+                )
+                if self.resized:
+                    strip = pygame.transform.scale(
+                        strip, (self.columns * self.frame_width, self.frame_height)
+                    )
+            self.strips[(row, mirrored)] = strip
+        return strip
+
+    def frame(self, index: int, mirrored: bool = False) -> pygame.Surface:
+        row, column = divmod(index, self.columns)
+        if mirrored:
+            column = self.columns - 1 - column
+        return self.strip(row, mirrored).subsurface(
+            (column * self.frame_width, 0, self.frame_width, self.frame_height)
+        )
+
+    def frames(self, start: int = 0, end: Optional[int] = None) -> List[pygame.Surface]:
+        """
+        Frames start to end (exclusive) as they are on the sheet.
+        """
+        end = self.count if end is None else end
+        return [self.frame(index) for index in range(start, end)]
+
+    def clip(self, start: int, end: int, mirrored: bool = False) -> List[pygame.Surface]:
+        """
+        Frames start to end (exclusive), facing left if mirrored, cut to
+        their trim_box().
+        """
+        box = self.boxes.get((start, end))
+        if box is None:
+            width, height = self.source_size
+            # Measured on the unscaled cells
+            cells = []
+            for index in range(start, end):
+                row, column = divmod(index, self.columns)
+                cells.append(
+                    self.source.subsurface((column * width, row * height, width, height))
+                )
+            box = self.boxes[(start, end)] = trim_box(
+                cells, self.frame_width / width if self.resized else 1
+            )
+        return trim_clip([self.frame(index, mirrored) for index in range(start, end)], box)
 
 
 def extract_frames(
@@ -48,20 +237,16 @@ def extract_frames(
     frame_height: int,
     resize_factor: float = 1,
 ) -> List[pygame.Surface]:
-    sheet_width, sheet_height = sprite_sheet.get_size()
-    frames: List[pygame.Surface] = []
-    temp = sheet_width // frame_width
-    for row in range(sheet_height // frame_height):
-        for col in range(sheet_width // frame_width):
-            x = col * frame_width
-            y = row * frame_height
-            frame = sprite_sheet.subsurface(
-                pygame.Rect(x, y, frame_width, frame_height)
-            )
-            if resize_factor > 1:
-                frame = pygame.transform.scale_by(frame, resize_factor)
-            frames.append(frame)
-    return frames
+    return SpriteSheet(sprite_sheet, frame_width, frame_height, resize_factor).frames()
+
+
+def load_jump_frames(resize_factor: float) -> Tuple[pygame.Surface, pygame.Surface]:
+    """
+    The player's single jump frame, facing right and left.
+    """
+    jump = pygame.image.load(os.path.join(RESOURCES_PATH, "player", "jump.png"))
+    jump = trim_clip([_converted(pygame.transform.scale_by(jump, resize_factor))])[0]
+    return jump, pygame.transform.flip(jump, True, False)
 
 
 def get_high_score_path():
@@ -118,22 +303,19 @@ def extract_frames_character(
     """
     This function will extract the individual sprite from an asset of multiple sprites.
     """
-    frames: List[pygame.Surface] = extract_frames(
-        sprite_sheet, frame_width, frame_height, resize_factor
-    )
-    jump = pygame.image.load(os.path.join(RESOURCES_PATH, "player", "jump.png"))
-    jump = pygame.transform.scale_by(jump, resize_factor)
+    sheet = SpriteSheet(sprite_sheet, frame_width, frame_height, resize_factor)
+    jump_right, jump_left = load_jump_frames(resize_factor)
     animation_frames: Dict[str, List[pygame.Surface]] = {
-        "idle_right": frames[6:12],
-        "idle_left": flip_helper_vertical(frames, (6, 12)),
-        "move_right": frames[24:30],
-        "move_left": flip_helper_vertical(frames, (24, 30)),
-        "sword_right": frames[42:46],
-        "sword_left": flip_helper_vertical(frames, (42, 46)),
-        "jump_right": [jump] * 6,
-        "jump_left": flip_helper_vertical([jump] * 6, (0, 5)),
-        "fall_down_right": frames[54:58],
-        "fall_down_left": flip_helper_vertical(frames, (54, 58)),
+        "idle_right": sheet.clip(6, 12),
+        "idle_left": sheet.clip(6, 12, mirrored=True),
+        "move_right": sheet.clip(24, 30),
+        "move_left": sheet.clip(24, 30, mirrored=True),
+        "sword_right": sheet.clip(42, 46),
+        "sword_left": sheet.clip(42, 46, mirrored=True),
+        "jump_right": [jump_right] * 6,
+        "jump_left": [jump_left] * 5,
+        "fall_down_right": sheet.clip(54, 58),
+        "fall_down_left": sheet.clip(54, 58, mirrored=True),
     }
 
     return animation_frames
@@ -148,31 +330,72 @@ def extract_frames_skeleton(
     """
     This function will extract the individual sprite from an asset of multiple sprites.
     """
-    frames: List[pygame.Surface] = extract_frames(
-        sprite_sheet, frame_width, frame_height, resize_factor
-    )
-    jump = pygame.image.load(os.path.join(RESOURCES_PATH, "player", "jump.png"))
-    jump = pygame.transform.scale_by(jump, resize_factor)
+    sheet = SpriteSheet(sprite_sheet, frame_width, frame_height, resize_factor)
     animation_frames: Dict[str, List[pygame.Surface]] = {
-        "idle_right": frames[6:12],
-        "idle_left": flip_helper_vertical(frames, (6, 12)),
-        "move_right": frames[24:30],
-        "move_left": flip_helper_vertical(frames, (24, 30)),
-        "death_right": frames[36:40],
-        "death_left": flip_helper_vertical(frames, (36, 42)),
-        "hit_right": frames[48:52],
-        "hit_left": flip_helper_vertical(frames, (48, 52)),
+        "idle_right": sheet.clip(6, 12),
+        "idle_left": sheet.clip(6, 12, mirrored=True),
+        "move_right": sheet.clip(24, 30),
+        "move_left": sheet.clip(24, 30, mirrored=True),
+        "death_right": sheet.clip(36, 40),
+        "death_left": sheet.clip(36, 42, mirrored=True),
+        "hit_right": sheet.clip(48, 52),
+        "hit_left": sheet.clip(48, 52, mirrored=True),
     }
 
     return animation_frames
 
 
+# Every known state name split once into (action, direction), and the
+# reverse lookup, so per-frame code neither splits nor joins strings.
+STATE_PARTS: Dict[str, Tuple[str, str]] = {
+    state.value: tuple(state.value.split("_"))  # type: ignore
+    for states in (PlayerStates, EnemyStates)
+    for state in states
+}
+STATE_NAMES: Dict[str, Dict[str, str]] = {}
+for _name, (_action, _direction) in STATE_PARTS.items():
+    STATE_NAMES.setdefault(_action, {})[_direction] = _name
+
+
 def get_current_direction(status: str) -> str:
     """
     This function return the current direction of a character:
     up, down, left, right.
     """
-    return status.split("_")[1]
+    parts = STATE_PARTS.get(status)
+    if parts is None:
+        return status.split("_")[1]
+    return parts[1]
+
+
+def get_current_action(status: str) -> str:
+    """
+    Return the action part of a state, e.g. "sword" for "sword_left".
+    """
+    parts = STATE_PARTS.get(status)
+    if parts is None:
+        return status.split("_")[0]
+    return parts[0]
+
+
+def get_state(action: str, direction: str) -> str:
+    """
+    Return the state name for an action and direction, e.g. "move_left".
+    """
+    name = STATE_NAMES.get(action, {}).get(direction)
+    if name is None:
+        return f"{action}_{direction}"
+    return name
+
+
+def distance_squared(first: pygame.Rect, second: pygame.Rect) -> int:
+    """
+    Squared distance between the centers of two rects, without building
+    vectors. Compare it against a squared range.
+    """
+    dx = first.centerx - second.centerx
+    dy = first.centery - second.centery
+    return dx * dx + dy * dy
 
 
 def extract_frames_tool(
@@ -184,17 +407,14 @@ def extract_frames_tool(
     """
     This function will extract the individual sprite from an asset of multiple sprites.
     """
-    frames: List[pygame.Surface] = extract_frames(
-        sprite_sheet, frame_width, frame_height, resize_factor
-    )
-
+    sheet = SpriteSheet(sprite_sheet, frame_width, frame_height, resize_factor)
     animation_frames: Dict[str, List[pygame.Surface]] = {
-        "pickaxe_right": frames[0:6],
-        "pickaxe_left": flip_helper_vertical(frames, (0, 6)),
-        "axe_right": frames[18:24],
-        "axe_left": flip_helper_vertical(frames, (18, 24)),
-        "shovel_right": frames[36:42],
-        "shovel_left": flip_helper_vertical(frames, (36, 42)),
+        "pickaxe_right": sheet.clip(0, 6),
+        "pickaxe_left": sheet.clip(0, 6, mirrored=True),
+        "axe_right": sheet.clip(18, 24),
+        "axe_left": sheet.clip(18, 24, mirrored=True),
+        "shovel_right": sheet.clip(36, 42),
+        "shovel_left": sheet.clip(36, 42, mirrored=True),
     }
 
     return animation_frames
@@ -0,0 +1,105 @@
+import pygame
+import time
+from typing import Optional, Tuple
+from config import RuntimeConfig
+from settings import WINDOW_HEIGHT, WINDOW_WIDTH
+
+# The surface the game draws on: the display surface itself, or an
+# offscreen frame of the logical size when the window is scaled.
+_screen: Optional[pygame.Surface] = None
+# Whether presenting a frame waits for the display refresh
+_vsync: bool = False
+
+# Back-to-back flips that average less than this did not wait for a
+# refresh: just under the 4.2 ms period of a 240 Hz display, and above
+# what copying a full frame to a software window costs
+VSYNC_MIN_FLIP: float = 0.0035
+VSYNC_PROBE_FLIPS: int = 5
+
+
+def create_window(config: RuntimeConfig) -> pygame.Surface:
+    """
+    Open the game window for config and return the surface to draw on.
+    The game always draws a WINDOW_WIDTH x WINDOW_HEIGHT frame; with a
+    render_scale other than 1 the frame is scaled into the window on present.
+    """
+    global _screen, _vsync
+    flags = 0
+    if config.vsync:
+        # SDL only honours vsync for renderer-backed windows
+        flags |= pygame.SCALED
+    window_size = (
+        round(WINDOW_WIDTH * config.render_scale),
+        round(WINDOW_HEIGHT * config.render_scale),
+    )
+    if config.render_scale == 1:
+        _screen = pygame.display.set_mode(
+            (WINDOW_WIDTH, WINDOW_HEIGHT), flags, vsync=int(config.vsync)
+        )
+    else:
+        window = pygame.display.set_mode(window_size, flags, vsync=int(config.vsync))
+        _screen = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert(window)
+    _vsync = config.vsync and _flip_blocks()
+    return _screen
+
+
+def _flip_blocks() -> bool:
+    """
+    Some drivers accept vsync and ignore it; time a few flips to find out.
+    """
+    pygame.display.flip()
+    start = time.perf_counter()
+    for _ in range(VSYNC_PROBE_FLIPS):
+        pygame.display.flip()
+    return (time.perf_counter() - start) / VSYNC_PROBE_FLIPS >= VSYNC_MIN_FLIP
+
+
+def has_vsync() -> bool:
+    """
+    Whether the window created by create_window waits for vsync.
+    """
+    return _vsync
+
+
+def get_screen() -> pygame.Surface:
+    """
+    Return the surface the game draws on.
+    """
+    if _screen is None:
+        return pygame.display.get_surface()
+    return _screen
+
+
+def present() -> None:
+    window = pygame.display.get_surface()
+    if _screen is not None and _screen is not window:
+        pygame.transform.scale(_screen, window.get_size(), window)
+    pygame.display.update()
+
+
+def to_frame(position: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Convert a window position (e.g. a mouse event) to frame coordinates.
+    """
+    window = pygame.display.get_surface()
+    if _screen is None or _screen is window:
+        return position
+    scale_x = _screen.get_width() / window.get_width()
+    scale_y = _screen.get_height() / window.get_height()
+    return int(position[0] * scale_x), int(position[1] * scale_y)
+
+
+def to_window(position: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Convert a frame position to window coordinates, the inverse of to_frame.
+    """
+    window = pygame.display.get_surface()
+    if _screen is None or _screen is window:
+        return position
+    scale_x = window.get_width() / _screen.get_width()
+    scale_y = window.get_height() / _screen.get_height()
+    return round(position[0] * scale_x), round(position[1] * scale_y)
+
+
+def mouse_position() -> Tuple[int, int]:
+    return to_frame(pygame.mouse.get_pos())
@@ -0,0 +1,297 @@
+"""
+Endless world streamed in fixed-width chunks.
+
+A chunk is generated from the round's seed and its index alone, so the
+same seed always builds the same world and an evicted chunk can be built
+again exactly. Each chunk carries its collision tiles (see tiles.py),
+ground decorations, the spawn points used by timed spawns and the enemy
+waves released when the view reaches them.
+
+Only the chunks around the view are kept: CHUNKS_AHEAD are generated
+ahead of it and chunks more than CHUNKS_BEHIND behind it are dropped, so
+memory and per-frame work do not grow with the distance travelled. The
+tiles and decorations of a chunk are drawn once into a surface of their
+own the first time the chunk is in view.
+"""
+import random
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import pygame
+from assets import cached
+from settings import COLOR_PALETTE, GROUND_LEVEL
+from tiles import BLOCK, EMPTY, GRID_TOP, LEDGE, TILE_ROWS, TILE_SIZE, load_tiles
+
+CHUNK_WIDTH: int = 1024
+COLUMNS: int = CHUNK_WIDTH // TILE_SIZE
+CHUNKS_AHEAD: int = 2
+CHUNKS_BEHIND: int = 1
+# Enemies this far behind the view are removed without scoring
+DESPAWN_DISTANCE: int = CHUNK_WIDTH
+# Waves are released this far before they scroll into view
+WAVE_LEAD: int = 100
+# Chunk surfaces reach down to the lowest decoration
+SURFACE_HEIGHT: int = GROUND_LEVEL + 120 - GRID_TOP
+
+Blit = Tuple[pygame.Surface, Tuple[int, int]]
+
+
+class Decoration(NamedTuple):
+    kind: int  # index into load_decorations()
+    x: int  # world position of the top-left corner
+    y: int
+
+
+class Wave(NamedTuple):
+    x: int  # world x of the first enemy
+    skeletons: int
+    birds: int
+
+
+class Chunk(NamedTuple):
+    index: int
+    tiles: bytes  # TILE_ROWS x COLUMNS cells, row by row from the top
+    decorations: Tuple[Decoration, ...]
+    spawn_points: Tuple[int, ...]  # world x, ascending
+    waves: Tuple[Wave, ...]  # ascending x
+
+
+def load_decorations() -> List[pygame.Surface]:
+    """
+    Small ground props drawn from the palette: a rock, a grass tuft and a
+    bone.
+    """
+    rock = pygame.Surface((36, 20), pygame.SRCALPHA)
+    pygame.draw.ellipse(rock, COLOR_PALETTE[2], rock.get_rect())
+    pygame.draw.ellipse(rock, COLOR_PALETTE[1], (4, 2, 22, 10))
+
+    tuft = pygame.Surface((24, 18), pygame.SRCALPHA)
+    for x, lean in ((4, -3), (9, 0), (13, 2), (18, 4)):
+        pygame.draw.line(tuft, COLOR_PALETTE[0], (x, 17), (x + lean, 3), 2)
+    pygame.draw.line(tuft, COLOR_PALETTE[3], (11, 17), (11, 0), 2)
+
+    bone = pygame.Surface((30, 10), pygame.SRCALPHA)
+    pygame.draw.line(bone, "#E8E0C8", (4, 5), (26, 5), 3)
+    for x in (3, 27):
+        pygame.draw.circle(bone, "#E8E0C8", (x, 3), 3)
+        pygame.draw.circle(bone, "#E8E0C8", (x, 7), 3)
+    return [rock, tuft, bone]
+
+
+def generate_tiles(rng: random.Random, index: int) -> Tuple[bytearray, Set[int]]:
+    """
+    Lay out obstacles and ledges. Returns the cells and the columns where
+    enemies can spawn on the floor.
+    """
+    tiles = bytearray(TILE_ROWS * COLUMNS)
+    free = set(range(COLUMNS))
+    # Ledges float at 3 tiles, within a jump of the floor, sometimes with
+    # a second tier 3 tiles higher reachable from the first
+    if index > 0 and rng.random() < 0.7:
+        start = rng.randrange(2, COLUMNS - 10)
+        width = rng.randint(3, 7)
+        for column in range(start, start + width):
+            tiles[(TILE_ROWS - 3) * COLUMNS + column] = LEDGE
+        if rng.random() < 0.4:
+            upper = start + rng.randint(1, width - 1)
+            for column in range(upper, min(upper + rng.randint(2, 4), COLUMNS)):
+                tiles[column] = LEDGE
+        # No obstacle under or beside a ledge, or it would wall it off
+        free -= set(range(start - 2, start + width + 2))
+    # Obstacles of one or two tiles, each with 3 free columns around it
+    # inside the chunk, so neighbouring chunks never make a wider wall
+    for _ in range(rng.randint(0, 2) if index > 0 else 0):
+        column = rng.randrange(1, COLUMNS - 2)
+        width = rng.randint(1, 2)
+        if not free.issuperset(range(column - 3, column + width + 3)):
+            continue
+        height = rng.randint(1, 2)
+        for row in range(TILE_ROWS - height, TILE_ROWS):
+            for cell in range(column, column + width):
+                tiles[row * COLUMNS + cell] = BLOCK
+        free -= set(range(column - 3, column + width + 3))
+    spawnable = {
+        column
+        for column in free
+        if column - 1 in free and column + 1 in free
+    }
+    return tiles, spawnable
+
+
+def generate_chunk(seed: int, index: int) -> Chunk:
+    rng = random.Random((seed << 32) | index)
+    left = index * CHUNK_WIDTH
+    tiles, spawnable = generate_tiles(rng, index)
+    # Enemies appear in the middle of a free column
+    columns = sorted(spawnable) or [COLUMNS // 2]
+    kinds = len(cached("world.decorations", load_decorations))
+    decorations = tuple(
+        sorted(
+            (
+                Decoration(
+                    rng.randrange(kinds),
+                    left + rng.randrange(CHUNK_WIDTH),
+                    GROUND_LEVEL + 40 + rng.randrange(60),
+                )
+                for _ in range(rng.randint(4, 10))
+            ),
+            key=lambda decoration: decoration.x,
+        )
+    )
+    spawn_points = tuple(
+        sorted(
+            left + rng.choice(columns) * TILE_SIZE + TILE_SIZE // 2 for _ in range(3)
+        )
+    )
+    waves: Tuple[Wave, ...] = ()
+    # The first chunk is where the player starts
+    if index > 0:
+        # Waves grow further in, up to what the enemy caps allow anyway
+        waves = tuple(
+            sorted(
+                Wave(
+                    left + rng.choice(columns) * TILE_SIZE + TILE_SIZE // 2,
+                    rng.randint(1, min(1 + index // 4, 4)),
+                    rng.randint(0, min(index // 6, 2)),
+                )
+                for _ in range(1 if index < 8 else 2)
+            )
+        )
+    return Chunk(index, bytes(tiles), decorations, spawn_points, waves)
+
+
+def draw_chunk(chunk: Chunk) -> pygame.Surface:
+    """
+    Pre-render the tiles and decorations of chunk. The surface's top-left
+    corner is at (chunk.index * CHUNK_WIDTH, GRID_TOP) in the world.
+    """
+    surface = pygame.Surface((CHUNK_WIDTH, SURFACE_HEIGHT), pygame.SRCALPHA)
+    tiles = chunk.tiles
+    images = cached("world.tiles", load_tiles)
+    surface.blits(
+        [
+            (images[tiles[cell]], ((cell % COLUMNS) * TILE_SIZE, (cell // COLUMNS) * TILE_SIZE))
+            for cell in range(len(tiles))
+            if tiles[cell] != EMPTY
+        ],
+        doreturn=False,
+    )
+    decorations = cached("world.decorations", load_decorations)
+    left = chunk.index * CHUNK_WIDTH
+    # Decorations may hang over the chunk's right edge; they are cut there
+    surface.blits(
+        [(decorations[kind], (x - left, y - GRID_TOP)) for kind, x, y in chunk.decorations],
+        doreturn=False,
+    )
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert_alpha()
+    return surface
+
+
+class World:
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self.chunks: Deque[Chunk] = deque()
+        # Chunk index -> pre-rendered chunk, for the chunks kept
+        self.surfaces: Dict[int, pygame.Surface] = {}
+        # Waves up to this world x have been released
+        self.released_to: float = 0.0
+
+    def reset(self, seed: int, view: pygame.Rect) -> None:
+        self.restore(seed, view.right, view)
+
+    def restore(self, seed: int, released_to: float, view: pygame.Rect) -> None:
+        """
+        Bring the chunks in line with view, e.g. after a snapshot was
+        restored. Chunks of the same seed are kept.
+        """
+        if seed != self.seed:
+            self.seed = seed
+            self.chunks.clear()
+            self.surfaces.clear()
+        self.released_to = released_to
+        self.stream(view)
+
+    def stream(self, view: pygame.Rect) -> None:
+        """
+        Generate the chunks ahead of view and drop the ones far behind it.
+        """
+        first = max(0, view.left // CHUNK_WIDTH - CHUNKS_BEHIND)
+        last = view.right // CHUNK_WIDTH + CHUNKS_AHEAD
+        chunks = self.chunks
+        surfaces = self.surfaces
+        while chunks and chunks[0].index < first:
+            surfaces.pop(chunks.popleft().index, None)
+        # Only a restored snapshot moves the view back
+        while chunks and chunks[-1].index > last:
+            surfaces.pop(chunks.pop().index, None)
+        while chunks and chunks[0].index > first:
+            chunks.appendleft(generate_chunk(self.seed, chunks[0].index - 1))
+        next_index = chunks[-1].index + 1 if chunks else first
+        while next_index <= last:
+            chunks.append(generate_chunk(self.seed, next_index))
+            next_index += 1
+
+    def due_waves(self, view: pygame.Rect) -> List[Wave]:
+        """
+        Return the waves the view has just reached. Each wave is returned
+        once, even if the view moves back and forth.
+        """
+        reach = view.right + WAVE_LEAD
+        if reach <= self.released_to:
+            return []
+        released_to = self.released_to
+        self.released_to = reach
+        return [
+            wave
+            for chunk in self.chunks
+            for wave in chunk.waves
+            if released_to < wave.x <= reach
+        ]
+
+    def is_solid(self, column: int, row: int) -> bool:
+        """
+        Whether a grid cell is solid, in world columns; see tiles.Solid.
+        """
+        if row >= TILE_ROWS:
+            return True
+        chunks = self.chunks
+        if row < 0 or not chunks:
+            return False
+        position = column // COLUMNS - chunks[0].index
+        if not 0 <= position < len(chunks):
+            return False
+        return chunks[position].tiles[row * COLUMNS + column % COLUMNS] != EMPTY
+
+    def spawn_point(self, x: float) -> Optional[int]:
+        """
+        First spawn point at or after x in the generated chunks.
+        """
+        for chunk in self.chunks:
+            for point in chunk.spawn_points:
+                if point >= x:
+                    return point
+        return None
+
+    def collect(
+        self, view: pygame.Rect, batch: Optional[List[Blit]] = None
+    ) -> List[Blit]:
+        """
+        Append (surface, screen position) for every chunk in view to batch,
+        a new list if None, and return it.
+        """
+        if batch is None:
+            batch = []
+        surfaces = self.surfaces
+        left, right = view.left, view.right
+        for chunk in self.chunks:
+            chunk_left = chunk.index * CHUNK_WIDTH
+            if chunk_left + CHUNK_WIDTH <= left:
+                continue
+            if chunk_left >= right:
+                break
+            surface = surfaces.get(chunk.index)
+            if surface is None:
+                surface = surfaces[chunk.index] = draw_chunk(chunk)
+            batch.append((surface, (chunk_left - left, GRID_TOP - view.top)))
+        return batch